@@ -0,0 +1,6 @@
+"""
+Offline micro-benchmarks for the CPU-bound parts of the character creator.
+
+Run with `python -m benchmarks` (or `make bench`). Network clients are
+replaced with in-process stubs, so no credentials or network are needed.
+"""
@@ -0,0 +1,131 @@
+"""
+In-process stand-ins for the S3, OpenAI and HTTP clients.
+
+They implement just the calls the pipeline makes and answer instantly, so
+benchmarks measure local code only.
+"""
+import io
+import json
+import random
+from types import SimpleNamespace
+from PIL import Image
+
+
+def make_png(size: int = 1024, seed: int = 0) -> bytes:
+    """
+    Make a noisy PNG about the size of a DALL·E portrait.
+
+    Args:
+        size (int, optional): The width and height in pixels. Defaults to 1024.
+        seed (int, optional): Seed for the noise, so runs are repeatable. Defaults to 0.
+
+    Returns:
+        bytes: The encoded PNG.
+    """
+    rng = random.Random(seed)
+    image = Image.frombytes("RGB", (size, size), rng.randbytes(size * size * 3))
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
+
+
+class StubS3Client:
+    """
+    Accepts uploads and keeps them in memory.
+    """
+
+    def __init__(self):
+        self.objects = {}
+
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None, Config=None):
+        self.objects[key] = fileobj.read()
+
+    def put_object(self, Bucket=None, Key=None, Body=None, **kwargs):
+        self.objects[Key] = Body
+
+    def head_bucket(self, Bucket=None):
+        return {}
+
+    def close(self):
+        pass
+
+
+class StubOpenAIClient:
+    """
+    Answers chat completions with canned character sheets and images with a fixed URL.
+    """
+
+    def __init__(self, sheets: list):
+        self.sheets = sheets
+        self.usage = SimpleNamespace(prompt_tokens=0, completion_tokens=0, total_tokens=0)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create_chat_completion))
+        self.images = SimpleNamespace(generate=self.generate_image)
+        self.models = SimpleNamespace(retrieve=lambda model: SimpleNamespace(id=model))
+
+    def create_chat_completion(self, **kwargs):
+        content = json.dumps(random.choice(self.sheets))
+        if kwargs.get("stream"):
+            chunks = [content[idx:idx + 16] for idx in range(0, len(content), 16)]
+            return iter(
+                [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=chunk))], usage=None) for chunk in chunks]
+                + [SimpleNamespace(choices=[], usage=self.usage)]
+            )
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=self.usage)
+
+    def generate_image(self, **kwargs):
+        return SimpleNamespace(data=[SimpleNamespace(url="https://stub.invalid/portrait.png")])
+
+    def close(self):
+        pass
+
+
+class StubHTTPResponse:
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+class StubHTTPSession:
+    """
+    Serves the same image for every GET.
+    """
+
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def get(self, url, **kwargs):
+        return StubHTTPResponse(self.content)
+
+    def close(self):
+        pass
+
+
+def install_stub_clients(sheets: list, image: bytes) -> StubS3Client:
+    """
+    Swap the shared client registry's clients for stubs and lift the OpenAI request budgets.
+
+    Args:
+        sheets (list): Character sheets for chat completions to answer with.
+        image (bytes): The image every portrait download returns.
+
+    Returns:
+        StubS3Client: The S3 stub, so callers can inspect the uploads.
+    """
+    from character_creator.clients import client_registry
+    from character_creator.ratelimit import TokenBucket, chat_limiter, image_limiter
+
+    s3_client = StubS3Client()
+    client_registry.builders.update({
+        "s3": lambda: s3_client,
+        "openai": lambda: StubOpenAIClient(sheets),
+        "http": lambda: StubHTTPSession(image),
+    })
+    client_registry.health_checks = {}
+    for name in client_registry.builders:
+        client_registry.rebuild(name)
+    # The stubs answer instantly, so the request budgets would only time the pacing
+    for limiter in [chat_limiter, image_limiter]:
+        limiter.requests, limiter.tokens = TokenBucket(0), TokenBucket(0)
+    return s3_client
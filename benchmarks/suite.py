@@ -0,0 +1,291 @@
+"""
+Micro-benchmarks for the local hot paths, compared against a stored baseline.
+
+Examples:
+    python -m benchmarks
+    python -m benchmarks --filter pdf --repeat 10
+    python -m benchmarks --update-baseline
+"""
+import io
+import os
+import sys
+import json
+import random
+import argparse
+import tempfile
+import timeit
+import itertools
+import tracemalloc
+import contextlib
+from statistics import median
+from typing import NamedTuple
+
+# Keep the response cache and any other data files out of the working tree
+os.environ.setdefault("DATA_DIRECTORY", tempfile.mkdtemp(prefix="character_creator_bench_"))
+
+from character_creator.config import PAGES_DIRECTORY
+from character_creator.images import derivative_cache
+from character_creator.validation import validate_and_fix_character_sheet
+from character_creator.audit import sheets_frame, check_character_frame
+from character_creator.pdf import render_pdf_character_sheet, create_pdf_character_sheet, render_party_packet
+from character_creator.pipeline import (
+    Portrait, get_character_examples, default_character, get_prompt_assembler, get_character_templates,
+    generate_character
+)
+from character_creator.sheet import CharacterSheet
+from benchmarks.stubs import make_png, install_stub_clients
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baseline.json")
+REGRESSION_THRESHOLD = 1.25
+CHARACTER_PAGE = os.path.join(PAGES_DIRECTORY, "1_D&D_Character_Creator.py")
+
+
+class Benchmark(NamedTuple):
+    name: str
+    func: object
+
+
+class BenchmarkResult(NamedTuple):
+    name: str
+    seconds: float
+    peak_bytes: int
+    loops: int
+
+
+def synthetic_sheets(count: int = 50, seed: int = 0) -> list:
+    """
+    Build character sheets with the kinds of mistakes the model makes.
+
+    Each sheet starts from one of the example characters; some get an
+    out-of-range level, wrong proficiency bonus, mistyped stats or blank
+    fields so every branch of the validator is exercised.
+
+    Args:
+        count (int, optional): How many sheets to build. Defaults to 50.
+        seed (int, optional): Seed for the perturbations. Defaults to 0.
+
+    Returns:
+        list: The character sheets.
+    """
+    rng = random.Random(seed)
+    examples = [dict(example) for example in get_character_examples()[1:]]
+    sheets = []
+    for idx in range(count):
+        sheet = dict(examples[idx % len(examples)])
+        sheet["level"] = str(rng.randint(1, 20))
+        mistake = idx % 5
+        if mistake == 1:
+            sheet["proficiency_bonus"] = "+9"
+        elif mistake == 2:
+            sheet["strength"] = rng.choice(["31", "-2", "strong"])
+        elif mistake == 3:
+            sheet["experience_points"] = ""
+            sheet["spell_save_dc"] = ""
+        elif mistake == 4:
+            sheet["level"] = "25"
+        sheets.append(sheet)
+    return sheets
+
+
+def build_benchmarks() -> list:
+    """
+    Set up the fixtures and stub clients, and list the benchmarks.
+
+    Returns:
+        list: The Benchmark tuples, in the order they run.
+    """
+    from streamlit.testing.v1 import AppTest
+    from character_creator.form_sections import FORM_SECTIONS
+
+    sheets = synthetic_sheets()
+    examples = [dict(example) for example in get_character_examples()[1:]]
+    image = make_png()
+    portrait = Portrait("https://stub.invalid/portrait_1.png", image)
+    install_stub_clients(examples, image)
+
+    next_sheet = itertools.cycle(sheets).__next__
+    partial = {**default_character(), "name": "Benchmark", "class": "Wizard", "race": "Elf", "level": "5"}
+    sheet = CharacterSheet.from_dict(partial)
+    sheet_frame = sheets_frame(synthetic_sheets(1000))
+
+    def render_pdf_with_portrait():
+        # A new portrait always misses the derivative cache
+        derivative_cache.clear()
+        render_pdf_character_sheet(examples[0], [portrait])
+
+    def form_app(open_sections):
+        app = AppTest.from_file(CHARACTER_PAGE, default_timeout=60)
+        app.session_state["open_sections"] = open_sections
+        return app.run
+
+    return [
+        Benchmark("get_character_examples", get_character_examples),
+        Benchmark("default_character", default_character),
+        Benchmark("validate_and_fix_character_sheet", lambda: validate_and_fix_character_sheet(dict(next_sheet()))),
+        Benchmark("check_character_frame_1000", lambda: check_character_frame(sheet_frame)),
+        Benchmark("sheet_edit_and_diff", lambda: sheet.replace({"name": "Edited", "level": "6"}).diff(sheet)),
+        Benchmark("build_messages", lambda: get_prompt_assembler(get_character_templates().digest).build_messages(partial)),
+        Benchmark("render_pdf_character_sheet", lambda: render_pdf_character_sheet(examples[0], [])),
+        Benchmark("render_pdf_with_portrait", render_pdf_with_portrait),
+        Benchmark("create_pdf_character_sheet", lambda: create_pdf_character_sheet("benchmark", examples[0], [portrait])),
+        Benchmark("render_party_packet_10", lambda: render_party_packet(sheets[:10], [[portrait]] * 10, output=io.BytesIO())),
+        Benchmark("build_form_collapsed", form_app([])),
+        Benchmark("build_form_all_sections", form_app([section.title for section in FORM_SECTIONS])),
+        Benchmark("generate_character", lambda: generate_character(dict(partial), num_portraits=1, use_cache=False)),
+    ]
+
+
+def measure(benchmark: Benchmark, repeat: int) -> BenchmarkResult:
+    """
+    Time a benchmark and measure its peak memory.
+
+    The loop count is picked so each sample takes at least 0.2s; the reported
+    time is the median per-call time over `repeat` samples. Peak memory is
+    measured separately with tracemalloc on a single call, so tracing doesn't
+    skew the timings.
+
+    Args:
+        benchmark (Benchmark): The benchmark to run.
+        repeat (int): How many timing samples to take.
+
+    Returns:
+        BenchmarkResult: Median seconds per call and peak traced bytes.
+    """
+    timer = timeit.Timer(benchmark.func)
+    loops, _ = timer.autorange()
+    samples = timer.repeat(repeat=repeat, number=loops)
+
+    tracemalloc.start()
+    try:
+        benchmark.func()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return BenchmarkResult(benchmark.name, median(samples) / loops, peak_bytes, loops)
+
+
+def load_baseline(path: str) -> dict:
+    """
+    Load the stored baseline results.
+
+    Args:
+        path (str): The baseline JSON file.
+
+    Returns:
+        dict: Benchmark name to {"seconds", "peak_bytes"}, empty if there is no baseline yet.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, results: list, baseline: dict) -> None:
+    """
+    Store results as the new baseline, keeping entries for benchmarks that weren't run.
+
+    Args:
+        path (str): The baseline JSON file.
+        results (list): The BenchmarkResult tuples.
+        baseline (dict): The previous baseline.
+    """
+    baseline = dict(baseline)
+    for result in results:
+        baseline[result.name] = {"seconds": result.seconds, "peak_bytes": result.peak_bytes}
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare(result: BenchmarkResult, baseline: dict, threshold: float) -> tuple:
+    """
+    Compare a result with its baseline.
+
+    Args:
+        result (BenchmarkResult): The new result.
+        baseline (dict): The full baseline.
+        threshold (float): The ratio over the baseline that counts as a regression.
+
+    Returns:
+        Tuple[float, float, bool]: The time ratio, the memory ratio (None without a baseline) and whether either regressed.
+    """
+    previous = baseline.get(result.name)
+    if not previous:
+        return None, None, False
+    time_ratio = result.seconds / previous["seconds"]
+    memory_ratio = result.peak_bytes / previous["peak_bytes"] if previous["peak_bytes"] else 1.0
+    return time_ratio, memory_ratio, time_ratio > threshold or memory_ratio > threshold
+
+
+def format_seconds(seconds: float) -> str:
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f}us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds:.2f}s"
+
+
+def parse_args(argv: list = None) -> argparse.Namespace:
+    """
+    Parse the command line arguments.
+
+    Args:
+        argv (list, optional): The arguments to parse. Defaults to sys.argv[1:].
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark the local hot paths.")
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing samples per benchmark (default: 5).")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help=f"Slowdown or memory growth ratio that fails the run (default: {REGRESSION_THRESHOLD}).")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline JSON file to compare against.")
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the new baseline.")
+    return parser.parse_args(argv)
+
+
+def main(argv: list = None) -> int:
+    """
+    Entry point for the benchmark suite.
+
+    Args:
+        argv (list, optional): The arguments to parse. Defaults to sys.argv[1:].
+
+    Returns:
+        int: The process exit code, non-zero if any benchmark regressed.
+    """
+    args = parse_args(argv)
+    baseline = load_baseline(args.baseline)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        benchmarks = [benchmark for benchmark in build_benchmarks() if args.filter in benchmark.name]
+
+    print(f"{'benchmark':<34} {'time':>10} {'vs base':>8} {'peak mem':>10} {'vs base':>8}")
+    results = []
+    regressions = []
+    for benchmark in benchmarks:
+        # The pipeline logs to stdout; keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = measure(benchmark, args.repeat)
+        results.append(result)
+        time_ratio, memory_ratio, regressed = compare(result, baseline, args.threshold)
+        if regressed:
+            regressions.append(result.name)
+        print(
+            f"{result.name:<34} {format_seconds(result.seconds):>10} "
+            f"{f'{time_ratio:.2f}x' if time_ratio else '-':>8} "
+            f"{result.peak_bytes / 1024:>8.0f}KB "
+            f"{f'{memory_ratio:.2f}x' if memory_ratio else '-':>8}"
+            f"{'  REGRESSION' if regressed else ''}"
+        )
+
+    if args.update_baseline:
+        save_baseline(args.baseline, results, baseline)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed more than {args.threshold:.2f}x: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
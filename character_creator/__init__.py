@@ -0,0 +1,6 @@
+"""
+Shared building blocks for the PlotPixie D&D Character Creator.
+
+The Streamlit pages import from here so that anything expensive (caches,
+clients, indexes) lives once per process instead of once per rerun.
+"""
@@ -0,0 +1,4 @@
+import sys
+from character_creator.cli import main
+
+sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+Batched S3 writes for one character.
+
+A generation produces several objects: the unprocessed and final JSON, the
+portraits and the PDF. An artifact writer starts each upload in the
+background as soon as its body is ready and hands back the object's URL
+straight away, so the pipeline never waits on S3 until the very end. Then
+`finish()` waits for all of the uploads at once and writes one manifest
+listing every object, so readers can fetch that instead of probing keys.
+"""
+import time
+import json
+import asyncio
+import threading
+from typing import NamedTuple
+from concurrent.futures import ThreadPoolExecutor
+from character_creator.config import ARTIFACT_UPLOAD_WORKERS
+from character_creator.storage import upload_bytes_to_s3, compress_body, manifest_s3_key, s3_url
+
+artifact_executor = ThreadPoolExecutor(max_workers=ARTIFACT_UPLOAD_WORKERS, thread_name_prefix="artifact-upload")
+
+
+class Artifact(NamedTuple):
+    """
+    An object written for a character, as listed in its manifest.
+    """
+    key: str
+    url: str
+    content_type: str
+    content_encoding: str
+    size: int  # Stored bytes, after any compression
+
+
+def manifest_bytes(character_id: str, artifacts: list) -> bytes:
+    """
+    Serialize a character's manifest.
+
+    Args:
+        character_id (str): The character ID.
+        artifacts (list): The Artifact tuples that were written.
+
+    Returns:
+        bytes: The UTF-8 encoded JSON.
+    """
+    return json.dumps({
+        "character_id": character_id,
+        "created": time.time(),
+        "artifacts": [artifact._asdict() for artifact in artifacts],
+    }).encode("utf8")
+
+
+class BaseArtifactWriter:
+    """
+    Bookkeeping shared by the thread and asyncio artifact writers.
+    """
+
+    def __init__(self, character_id: str):
+        self.character_id = character_id
+        self._uploads = {}
+        self._lock = threading.Lock()
+
+    def put(self, s3_key: str, data: bytes, content_type: str, compress: bool = False) -> str:
+        """
+        Start uploading an object.
+
+        Args:
+            s3_key (str): The object's key.
+            data (bytes): The object body.
+            content_type (str): The MIME type of the object.
+            compress (bool, optional): Whether to store the body gzip-encoded. Defaults to False.
+
+        Returns:
+            str: The URL the object will be served from once `finish()` confirms it was written.
+        """
+        content_encoding = None
+        if compress:
+            data = compress_body(data)
+            content_encoding = "gzip"
+        artifact = Artifact(s3_key, s3_url(s3_key), content_type, content_encoding, len(data))
+        upload = self._start_upload(data, s3_key, content_type, content_encoding)
+        with self._lock:
+            # A key written twice is listed once, with its last body
+            self._uploads[s3_key] = (artifact, upload)
+        return artifact.url
+
+    def _start_upload(self, data: bytes, s3_key: str, content_type: str, content_encoding: str):
+        raise NotImplementedError
+
+    def _manifest(self, written: list) -> bytes:
+        return compress_body(manifest_bytes(self.character_id, written))
+
+    def _pending(self) -> list:
+        with self._lock:
+            return list(self._uploads.values())
+
+
+class ArtifactWriter(BaseArtifactWriter):
+    """
+    Uploads one character's objects in parallel on a shared thread pool.
+
+    Uploads are retried by the S3 client's retry policy; anything that
+    still fails is reported by `finish()`.
+    """
+
+    def __init__(self, character_id: str, executor: ThreadPoolExecutor = None):
+        super().__init__(character_id)
+        self._executor = executor or artifact_executor
+
+    def _start_upload(self, data: bytes, s3_key: str, content_type: str, content_encoding: str):
+        return self._executor.submit(upload_bytes_to_s3, data, s3_key, content_type, content_encoding)
+
+    def finish(self) -> tuple:
+        """
+        Wait for every upload, then write the manifest of the ones that succeeded.
+
+        Returns:
+            Tuple[str, dict]: The manifest's URL (None if it couldn't be written),
+                              and the S3 key of every failed upload mapped to its exception.
+        """
+        written, failures = [], {}
+        for artifact, future in self._pending():
+            try:
+                future.result()
+                written.append(artifact)
+            except Exception as e:
+                failures[artifact.key] = e
+
+        s3_key = manifest_s3_key(self.character_id)
+        try:
+            return upload_bytes_to_s3(self._manifest(written), s3_key, "application/json", "gzip"), failures
+        except Exception as e:
+            failures[s3_key] = e
+            return None, failures
+
+
+class AsyncArtifactWriter(BaseArtifactWriter):
+    """
+    Uploads one character's objects concurrently from an event loop.
+    """
+
+    def __init__(self, character_id: str, upload):
+        """
+        Args:
+            character_id (str): The character ID.
+            upload (callable): Coroutine function taking (data, s3_key, content_type, content_encoding) that uploads an object.
+        """
+        super().__init__(character_id)
+        self._upload = upload
+
+    def _start_upload(self, data: bytes, s3_key: str, content_type: str, content_encoding: str):
+        return asyncio.ensure_future(self._upload(data, s3_key, content_type, content_encoding))
+
+    async def finish(self) -> tuple:
+        """
+        Wait for every upload, then write the manifest of the ones that succeeded.
+
+        Returns:
+            Tuple[str, dict]: The manifest's URL (None if it couldn't be written),
+                              and the S3 key of every failed upload mapped to its exception.
+        """
+        pending = self._pending()
+        results = await asyncio.gather(*(task for _, task in pending), return_exceptions=True)
+        written = [artifact for (artifact, _), result in zip(pending, results) if not isinstance(result, BaseException)]
+        failures = {artifact.key: result for (artifact, _), result in zip(pending, results) if isinstance(result, BaseException)}
+
+        s3_key = manifest_s3_key(self.character_id)
+        try:
+            return await self._upload(self._manifest(written), s3_key, "application/json", "gzip"), failures
+        except Exception as e:
+            failures[s3_key] = e
+            return None, failures
@@ -0,0 +1,492 @@
+"""
+Asyncio version of the generation pipeline.
+
+One event loop can drive many generations at once: OpenAI calls go through
+the async client, image downloads through httpx and S3 through aioboto3, all
+sharing pooled connections. Independent stages (portraits, PDF layout and
+the JSON saves) run concurrently. Results are the same GenerationResult the
+synchronous pipeline returns.
+
+Example:
+    async with AsyncPipeline() as pipeline:
+        results = await asyncio.gather(*(pipeline.generate_character(c) for c in characters))
+"""
+import io
+import copy
+import json
+import asyncio
+import concurrent.futures
+import httpx
+import aioboto3
+from openai import AsyncOpenAI
+from character_creator.config import (
+    AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION_NAME, S3_BUCKET_NAME, S3_MULTIPART_THRESHOLD,
+    CHAT_MODEL, MAX_TOKENS, REPAIR_ATTEMPTS, REPAIR_TOKENS_PER_FIELD, DEBUG
+)
+from character_creator.clients import s3_transfer_config, s3_client_config
+from character_creator.metrics import metrics
+from character_creator.ratelimit import chat_limiter, image_limiter
+from character_creator.hedging import chat_hedge_policy, hedged_call_async
+from character_creator.singleflight import AsyncSingleFlight
+from character_creator.sheet import CharacterSheet
+from character_creator.streaming import IncrementalJSONObjectParser
+from character_creator.storage import (
+    character_json_s3_key, character_json_bytes, portrait_s3_key, portrait_display_s3_key, pdf_s3_key, s3_url
+)
+from character_creator.images import display_derivative, display_content_type, display_cache
+from character_creator.artifacts import AsyncArtifactWriter
+from character_creator.index import character_index
+from character_creator.validation import check_character_sheet
+from character_creator.pdf import render_pdf_character_sheet
+from character_creator.pipeline import (
+    Portrait, GenerationError, GenerationResult, response_cache, get_prompt_assembler,
+    character_cache_key, character_name_to_id, fill_random_defaults, get_character_templates,
+    apply_upload_failures, passes_validation
+)
+
+
+def as_concurrent_future(task: asyncio.Task) -> concurrent.futures.Future:
+    """
+    Mirror an asyncio task into a concurrent future that a worker thread can block on.
+
+    Args:
+        task (asyncio.Task): The task to mirror.
+
+    Returns:
+        concurrent.futures.Future: A future resolved with the task's outcome.
+    """
+    future = concurrent.futures.Future()
+
+    def copy_outcome(task):
+        if task.cancelled():
+            future.cancel()
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+
+    task.add_done_callback(copy_outcome)
+    return future
+
+
+class AsyncPipeline:
+    """
+    Async character generation pipeline with shared, pooled clients.
+
+    Use as an async context manager so the HTTP and S3 connection pools are
+    opened once and closed cleanly.
+    """
+
+    def __init__(self, max_connections: int = 100):
+        self.max_connections = max_connections
+        self.openai_client = None
+        self.http_client = None
+        self.s3_client = None
+        self._s3_context = None
+        self.character_flight = AsyncSingleFlight("character_data")
+        self.portrait_flight = AsyncSingleFlight("portrait")
+
+    async def __aenter__(self):
+        limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+        # The shared rate limiters do the retrying
+        self.openai_client = AsyncOpenAI(
+            http_client=httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(600, connect=10)), max_retries=0
+        )
+        self.http_client = httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(60, connect=10))
+        session = aioboto3.Session(
+            aws_access_key_id=AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+            region_name=AWS_REGION_NAME
+        )
+        self._s3_context = session.client('s3', config=s3_client_config(self.max_connections))
+        self.s3_client = await self._s3_context.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._s3_context.__aexit__(exc_type, exc, tb)
+        await self.http_client.aclose()
+        await self.openai_client.close()
+
+    async def upload_bytes_to_s3(self, data: bytes, s3_key: str, content_type: str, content_encoding: str = None) -> str:
+        """
+        Uploads an in-memory object to S3, in a single PUT below the multipart threshold.
+
+        Args:
+            data (bytes): The object body.
+            s3_key (str): The desired S3 key (path) for the uploaded file.
+            content_type (str): The MIME type of the object.
+            content_encoding (str, optional): The body's Content-Encoding, e.g. "gzip". Defaults to None.
+
+        Returns:
+            str: The CloudFront URL of the file.
+        """
+        extra_args = {"ContentEncoding": content_encoding} if content_encoding else {}
+        with metrics.span("s3_upload"):
+            if len(data) < S3_MULTIPART_THRESHOLD:
+                await self.s3_client.put_object(Bucket=S3_BUCKET_NAME, Key=s3_key, Body=data, ContentType=content_type, **extra_args)
+            else:
+                await self.s3_client.upload_fileobj(
+                    io.BytesIO(data), S3_BUCKET_NAME, s3_key,
+                    ExtraArgs={"ContentType": content_type, **extra_args},
+                    Config=s3_transfer_config
+                )
+        return s3_url(s3_key)
+
+    async def get_character_data(self, character: dict, use_cache: bool = True, on_field=None, cache_key: str = None) -> dict:
+        """
+        Query the ChatGPT API to fill out missing character data based on provided data.
+
+        Identical requests that arrive while one is already in flight share its completion.
+
+        Args:
+            character (dict): Dictionary containing character attributes.
+            use_cache (bool, optional): Whether to serve a previously generated sheet for the same input. Defaults to True.
+            on_field (callable, optional): Callback for each completed field, enables streaming. Defaults to None.
+            cache_key (str, optional): The response cache key. Defaults to the key of `character`; pass the key of
+                the sheet as submitted when random defaults have been rolled into it.
+
+        Returns:
+            dict: The generated character sheet.
+        """
+        cache_key = cache_key or character_cache_key(character)
+        if use_cache:
+            # The cache reads and writes files, so keep it off the event loop
+            cached = await asyncio.to_thread(response_cache.get, cache_key)
+            metrics.increment("response_cache_lookups_total", result="miss" if cached is None else "hit")
+            if cached is not None:
+                if on_field:
+                    for key, value in cached.items():
+                        on_field(key, value)
+                return cached
+
+        requested = []
+
+        async def request():
+            requested.append(True)
+            result = await self.request_character_data(character, on_field)
+            await asyncio.to_thread(response_cache.set, cache_key, result)
+            return result
+
+        # A request that skips the cache mustn't be handed a completion meant for one that didn't
+        result = await self.character_flight.do((cache_key, use_cache), request)
+        if on_field and not requested:
+            for key, value in result.items():
+                on_field(key, value)
+        return copy.deepcopy(result)
+
+    async def request_character_data(self, character: dict, on_field=None) -> dict:
+        """
+        Make the ChatGPT request that fills out a character sheet.
+
+        Args:
+            character (dict): Dictionary containing character attributes.
+            on_field (callable, optional): Callback for each completed field, enables streaming. Defaults to None.
+
+        Returns:
+            dict: The generated character sheet.
+        """
+        with metrics.span("prompt_build"):
+            prompt_assembler = get_prompt_assembler(get_character_templates().digest)
+            messages = prompt_assembler.build_messages(character)
+        prompt_tokens = prompt_assembler.count_tokens(messages)
+        if DEBUG:
+            print(f"Prompt input tokens: {prompt_tokens}")
+
+        if chat_hedge_policy.enabled:
+            # Stream both requests so the loser can be stopped part way; only the first reports fields as they close
+            hedge_results = []
+
+            async def attempt(model, hedge):
+                result = await self.stream_character_data(messages, None if hedge else on_field, prompt_tokens + MAX_TOKENS, model)
+                if hedge:
+                    hedge_results.append(result)
+                return result
+
+            result = await hedged_call_async(attempt, passes_validation)
+            if on_field and any(result is hedge_result for hedge_result in hedge_results):
+                for key, value in result.items():
+                    on_field(key, value)
+        elif on_field:
+            result = await self.stream_character_data(messages, on_field, prompt_tokens + MAX_TOKENS)
+        else:
+            async def request():
+                with metrics.span("chat_completion"):
+                    return await self.openai_client.chat.completions.create(
+                        model=CHAT_MODEL,
+                        messages=messages,
+                        max_tokens=MAX_TOKENS,
+                        response_format={ "type": "json_object" }
+                    )
+
+            response = await chat_limiter.call_async(request, tokens=prompt_tokens + MAX_TOKENS)
+            metrics.record_usage("chat_completion", response.usage)
+            result = json.loads(response.choices[0].message.content)
+        if DEBUG:
+            print(f"Result: {json.dumps(result)}")
+        return result
+
+    async def stream_character_data(self, messages: list, on_field=None, tokens: int = MAX_TOKENS, model: str = CHAT_MODEL) -> dict:
+        """
+        Stream a character sheet completion, reporting each field as soon as it closes.
+
+        Args:
+            messages (list): The chat messages to send.
+            on_field (callable, optional): Called with (key, value) for each completed top-level field. Defaults to None.
+            tokens (int, optional): The most tokens the completion can use, prompt included. Defaults to MAX_TOKENS.
+            model (str, optional): The chat model. Defaults to CHAT_MODEL.
+
+        Returns:
+            dict: The complete character sheet, parsed from the full response text.
+        """
+        async def request():
+            parser, usage = IncrementalJSONObjectParser(), None
+            with metrics.span("chat_completion"):
+                stream = await self.openai_client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=MAX_TOKENS,
+                    response_format={ "type": "json_object" },
+                    stream=True,
+                    stream_options={"include_usage": True}
+                )
+                try:
+                    async for chunk in stream:
+                        if getattr(chunk, "usage", None):
+                            usage = chunk.usage
+                        if not chunk.choices or not chunk.choices[0].delta.content:
+                            continue
+                        for key, value in parser.feed(chunk.choices[0].delta.content):
+                            if on_field:
+                                on_field(key, value)
+                except asyncio.CancelledError:
+                    # Closing the connection stops the completion, so no more of it is billed
+                    await stream.close()
+                    raise
+            return parser, usage
+
+        parser, usage = await chat_limiter.call_async(request, tokens=tokens, usage=lambda outcome: outcome[1])
+        metrics.record_usage("chat_completion", usage)
+        return parser.result()
+
+    async def repair_character_data(self, character: dict, errors: list) -> dict:
+        """
+        Ask ChatGPT to regenerate only the fields that failed validation.
+
+        Args:
+            character (dict): The character sheet with some invalid fields.
+            errors (list): FieldError tuples for the offending fields.
+
+        Returns:
+            dict: The character sheet with the regenerated fields merged in.
+        """
+        prompt_assembler = get_prompt_assembler(get_character_templates().digest)
+        messages = prompt_assembler.build_repair_messages(character, errors)
+        invalid_keys = {error.key for error in errors}
+        max_tokens = min(MAX_TOKENS, REPAIR_TOKENS_PER_FIELD * len(invalid_keys))
+
+        async def request():
+            with metrics.span("repair"):
+                return await self.openai_client.chat.completions.create(
+                    model=CHAT_MODEL,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    response_format={ "type": "json_object" }
+                )
+
+        response = await chat_limiter.call_async(request, tokens=prompt_assembler.count_tokens(messages) + max_tokens)
+        metrics.record_usage("repair", response.usage)
+        repaired = json.loads(response.choices[0].message.content)
+
+        # Only accept the fields we asked for
+        character = character.copy()
+        character.update({key: value for key, value in repaired.items() if key in invalid_keys})
+        return character
+
+    async def complete_character(self, character: dict, use_cache: bool = True, on_field=None, cache_key: str = None) -> dict:
+        """
+        Fill out a character sheet, then validate it and repair any broken fields.
+
+        Args:
+            character (dict): The (possibly partial) character sheet.
+            use_cache (bool, optional): Whether to serve a previously generated sheet for the same input. Defaults to True.
+            on_field (callable, optional): Callback for each completed field, enables streaming. Defaults to None.
+            cache_key (str, optional): The response cache key. Defaults to the key of `character`; pass the key of
+                the sheet as submitted when random defaults have been rolled into it.
+
+        Returns:
+            dict: The validated character sheet.
+
+        Raises:
+            GenerationError: If the sheet is still invalid after the repair attempts.
+        """
+        cache_key = cache_key or character_cache_key(character)
+        character = await self.get_character_data(character, use_cache=use_cache, on_field=on_field, cache_key=cache_key)
+        with metrics.span("validation"):
+            errors, character = check_character_sheet(character)
+
+        repairs = 0
+        for idx in range(REPAIR_ATTEMPTS):
+            if not errors:
+                break
+            metrics.increment("repair_attempts_total")
+            repairs += 1
+            character = await self.repair_character_data(character, errors)
+            with metrics.span("validation"):
+                errors, character = check_character_sheet(character)
+
+        if errors:
+            metrics.increment("character_sheets_total", outcome="invalid")
+            await asyncio.to_thread(response_cache.discard, cache_key)
+            raise GenerationError(f"Error validating character sheet: {errors[0].message}")
+        metrics.increment("character_sheets_total", outcome="repaired" if repairs else "valid")
+        await asyncio.to_thread(response_cache.set, cache_key, character)
+        return character
+
+    async def generate_portrait(self, prompt: str, character_id: str, portrait_num: int, writer: AsyncArtifactWriter) -> Portrait:
+        """
+        Generate a portrait with DALL-E and save it to S3.
+
+        Args:
+            prompt (str): The prompt for DALL-E to generate an image.
+            character_id (str): The ID of the character for filename generation.
+            portrait_num (int): The number of the portrait for this character.
+            writer (AsyncArtifactWriter): Batches the upload with the character's other objects.
+
+        Returns:
+            Portrait: The URL where the portrait is saved and the image bytes.
+        """
+        async def request():
+            with metrics.span("image_generation"):
+                return await self.openai_client.images.generate(
+                    model="dall-e-3",
+                    prompt=prompt,
+                    size="1024x1024",
+                    quality="hd",
+                    n=1,
+                )
+
+        response = await self.portrait_flight.do((prompt, portrait_num), lambda: image_limiter.call_async(request))
+        with metrics.span("image_download"):
+            image = await self.http_client.get(response.data[0].url)
+            image.raise_for_status()
+
+        with metrics.span("display_derivative"):
+            display_image = await asyncio.to_thread(display_derivative, image.content)
+        cloudfront_url = writer.put(portrait_s3_key(character_id, portrait_num), image.content, "image/png")
+        display_url = writer.put(portrait_display_s3_key(character_id, portrait_num), display_image, display_content_type())
+        display_cache.put(display_url, display_image)
+        return Portrait(cloudfront_url, image.content, display_url)
+
+    async def create_pdf_character_sheet(self, character_id: str, character: dict, portrait_tasks: list,
+                                         writer: AsyncArtifactWriter) -> str:
+        """
+        Render the PDF in a worker thread while the portraits finish, then upload it.
+
+        Args:
+            character_id (str): The ID of the character for filename generation.
+            character (dict): The character data to be used in the character sheet.
+            portrait_tasks (list): Tasks resolving to the character's Portrait tuples.
+            writer (AsyncArtifactWriter): Batches the upload with the character's other objects.
+
+        Returns:
+            str: The URL for the uploaded file.
+        """
+        portraits = [as_concurrent_future(task) for task in portrait_tasks]
+        with metrics.span("pdf_render"):
+            pdf_bytes = await asyncio.to_thread(render_pdf_character_sheet, character, portraits)
+        return writer.put(pdf_s3_key(character_id, character), pdf_bytes, "application/pdf")
+
+    async def generate_character(self, character: dict, num_portraits: int = 1, use_cache: bool = True,
+                                 previous: dict = None, on_field=None, on_progress=None) -> GenerationResult:
+        """
+        Run the whole generation pipeline for one character: sheet, portraits, PDF and saves.
+
+        Args:
+            character (dict): The (possibly partial) character sheet.
+            num_portraits (int, optional): How many portraits to generate. Defaults to 1.
+            use_cache (bool, optional): Whether to serve a previously generated sheet for the same input. Defaults to True.
+            previous (dict, optional): The last generated sheet; a complete sheet is only regenerated if it differs. Defaults to None.
+            on_field (callable, optional): Callback for each completed field, enables streaming. Defaults to None.
+            on_progress (callable, optional): Called with a short description of each stage as it starts. Defaults to None.
+
+        Returns:
+            GenerationResult: The generated character and its artifacts.
+
+        Raises:
+            GenerationError: If the character sheet or the PDF can't be generated.
+        """
+        with metrics.span("generate_character"):
+            def progress(stage):
+                if on_progress:
+                    on_progress(stage)
+
+            errors = []
+            sheet = CharacterSheet.from_dict(character)
+            character_sheet_changed = previous is not None and bool(sheet.diff(previous))
+            # Key the cache on the sheet as submitted, before the random roll
+            cache_key = character_cache_key(sheet.to_dict())
+            character = fill_random_defaults(sheet.to_dict())
+
+            progress('Generating character data...')
+            some_values_missing = any(value == "" for value in character.values())
+            unprocessed = character
+            if some_values_missing or character_sheet_changed:
+                try:
+                    character = await self.complete_character(character, use_cache=use_cache, on_field=on_field, cache_key=cache_key)
+                except GenerationError:
+                    raise
+                except Exception as e:
+                    raise GenerationError(f"Error generating character data: {str(e)}") from e
+
+            character_id = character_name_to_id(character['name'])
+            # Every object goes up in the background; nothing waits on S3 until the end
+            writer = AsyncArtifactWriter(character_id, self.upload_bytes_to_s3)
+            writer.put(character_json_s3_key(character_id, unprocessed, unprocessed=True),
+                       character_json_bytes(character_id, unprocessed), "application/json", compress=True)
+
+            progress('Generating PDF character sheet...')
+            portrait_tasks = []
+            portrait_prompt = character.get("portrait_prompt", "")
+            if not portrait_prompt:
+                errors.append("No portrait prompt provided. Skipping portrait generation.")
+            else:
+                portrait_tasks = [
+                    asyncio.create_task(self.generate_portrait(portrait_prompt, character_id, portrait_num, writer))
+                    for portrait_num in range(1, num_portraits + 1)
+                ]
+
+            pdf_result, *portrait_results = await asyncio.gather(
+                self.create_pdf_character_sheet(character_id, character, portrait_tasks, writer),
+                *portrait_tasks,
+                return_exceptions=True
+            )
+            if isinstance(pdf_result, BaseException):
+                raise GenerationError(f"Error generating PDF: {str(pdf_result)}") from pdf_result
+            pdf_url = pdf_result.replace(" ", "%20")
+
+            portraits = []
+            for portrait in portrait_results:
+                if isinstance(portrait, BaseException):
+                    errors.append(f"Error generating portrait: {str(portrait)}")
+                else:
+                    portraits.append(portrait)
+
+            # The PDF has been queued by now, so only the uploads are left to wait on
+            sheet_key = character_json_s3_key(character_id, character)
+            writer.put(sheet_key, character_json_bytes(character_id, character), "application/json", compress=True)
+            with metrics.span("character_save"):
+                manifest_url, failures = await writer.finish()
+            sheet_url, portraits, pdf_url = apply_upload_failures(failures, sheet_key, portraits, pdf_url, errors)
+            portrait_urls = [portrait.url for portrait in portraits]
+            display_urls = [portrait.display_url for portrait in portraits]
+
+            # Record it in the local index for the gallery, off the event loop
+            try:
+                await asyncio.to_thread(
+                    character_index.upsert, character_id, character, sheet_url=sheet_url, pdf_url=pdf_url,
+                    portrait_urls=portrait_urls, display_urls=display_urls
+                )
+            except Exception as e:
+                errors.append(f"Error indexing character: {str(e)}")
+
+            return GenerationResult(character_id, character, portrait_urls, display_urls, pdf_url, errors, manifest_url, sheet_url)
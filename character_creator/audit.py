@@ -0,0 +1,384 @@
+"""
+Bulk validation of saved character sheets.
+
+`check_character_frame` applies the rules of `check_character_sheet` to a
+whole DataFrame of sheets at once, one vectorized pass per rule, so the
+sheets already saved to S3 can be audited (and repaired) in seconds.
+
+Examples:
+    python -m character_creator.audit --output audit.jsonl
+    python -m character_creator.audit --input sheets.jsonl --summary-only
+    python -m character_creator.audit --repair
+"""
+import sys
+import json
+import time
+import argparse
+import contextlib
+from collections import Counter
+from typing import NamedTuple
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from character_creator.config import S3_BUCKET_NAME
+from character_creator.clients import get_s3_client
+from character_creator.storage import upload_bytes_to_s3, compress_body, decode_json_body, is_character_sheet_key
+from character_creator.validation import (
+    FieldError, parse_int, EXPERIENCE_THRESHOLDS, MAX_LEVEL, PROFICIENCY_BONUSES, ESSENTIAL_KEYS,
+    ABILITY_KEYS, SPELL_STAT_KEYS, SPELL_LEVELS, LOWEST_NINTH_LEVEL_SPELLCASTER
+)
+
+# The lookup tables as arrays, indexed by level - 1
+EXPERIENCE_LOWER = np.array(EXPERIENCE_THRESHOLDS, dtype=object)
+EXPERIENCE_UPPER = np.array(EXPERIENCE_THRESHOLDS[1:] + (np.inf,), dtype=float)
+PROFICIENCY_BY_LEVEL = np.array(PROFICIENCY_BONUSES)
+
+
+class FrameCheck(NamedTuple):
+    """
+    The result of validating a DataFrame of character sheets.
+
+    All three share the index of the checked frame.
+    """
+    sheets: pd.DataFrame  # The fixed sheets, NaN where a sheet has no such field
+    errors: pd.Series     # A list of FieldError per sheet, in check_character_sheet's order
+    fixes: pd.Series      # A dict per sheet of the fields that were fixed, and their new values
+
+
+def sheets_frame(sheets: list) -> pd.DataFrame:
+    """
+    Build a DataFrame of character sheets, one row per sheet.
+
+    Values are kept as the original Python objects; letting pandas infer
+    numeric columns would turn e.g. an int 300 into 300.0, which doesn't
+    validate the same way.
+
+    Args:
+        sheets (list): The character sheet dicts.
+
+    Returns:
+        pd.DataFrame: An object-dtype frame, NaN where a sheet doesn't have a field.
+    """
+    return pd.DataFrame(sheets, dtype=object)
+
+
+def present_mask(values: np.ndarray) -> np.ndarray:
+    """
+    Find which values of a column are set.
+
+    NaN marks a missing field; it's the only value not equal to itself, so
+    unlike `notna` this keeps a JSON null, which the validator treats as a
+    present but invalid value.
+
+    Args:
+        values (np.ndarray): The column's values.
+
+    Returns:
+        np.ndarray: Boolean mask, True where the sheet has the field.
+    """
+    return np.asarray(values == values, dtype=bool)
+
+
+def frame_records(frame: pd.DataFrame) -> list:
+    """
+    Turn a DataFrame of character sheets back into dicts.
+
+    Args:
+        frame (pd.DataFrame): The sheets, e.g. FrameCheck.sheets.
+
+    Returns:
+        list: One dict per row, without the fields the sheet doesn't have.
+    """
+    present = np.column_stack([present_mask(frame[key].to_numpy()) for key in frame.columns]) if len(frame.columns) else None
+    columns = list(frame.columns)
+    return [
+        {columns[idx]: value for idx, value in enumerate(row) if row_present[idx]}
+        for row, row_present in zip(frame.to_numpy(), present)
+    ]
+
+
+def parse_column(column: pd.Series, ignore: str = None) -> np.ndarray:
+    """
+    Parse a column of sheet values as integers.
+
+    Each distinct value is parsed once, with the same parser as the single
+    sheet validator, and the results are broadcast back over the rows.
+
+    Args:
+        column (pd.Series): The values, NaN where the field is missing.
+        ignore (str, optional): Passed on to parse_int. Defaults to None.
+
+    Returns:
+        np.ndarray: Float array of the integers, NaN where missing or invalid.
+    """
+    # factorize treats 1, 1.0 and True as one value; their text differs, so parse that when it matters
+    codes, uniques = pd.factorize(column.astype(str) if ignore is not None else column)
+    parsed = [parse_int(value, ignore) for value in uniques]
+    # Clamp so huge ints don't overflow the float array; they're outside every range either way.
+    # Code -1 marks a missing value and picks the trailing NaN.
+    parsed = [np.nan if value is None else float(min(max(value, -10 ** 18), 10 ** 18)) for value in parsed]
+    return np.array(parsed + [np.nan], dtype=float)[codes]
+
+
+def check_character_frame(frame: pd.DataFrame) -> FrameCheck:
+    """
+    Validate and fix a DataFrame of character sheets.
+
+    Gives the same fixes and errors, in the same order, as running
+    `check_character_sheet` on each row, as long as the frame holds the
+    original values (see `sheets_frame`) and each sheet's fields are in
+    column order.
+
+    Args:
+        frame (pd.DataFrame): One character sheet per row, NaN for missing fields.
+
+    Returns:
+        FrameCheck: The fixed sheets, and each sheet's errors and fixes.
+    """
+    sheets = frame.astype(object)
+    count = len(sheets)
+    errors = [[] for _ in range(count)]
+    invalid = {}
+    fixed_keys = []
+
+    def column(key):
+        return sheets[key] if key in sheets else pd.Series(np.nan, index=sheets.index, dtype=object)
+
+    def present(key):
+        return present_mask(column(key).to_numpy())
+
+    def report(key, mask, code, message):
+        if not mask.any():
+            return
+        values = column(key).to_numpy()
+        has_value = present_mask(values)
+        for row in np.flatnonzero(mask):
+            errors[row].append(FieldError(key, message(values[row] if has_value[row] else None), code))
+        invalid[key] = invalid.get(key, np.zeros(count, dtype=bool)) | mask
+
+    def fix(key, mask, value):
+        if mask.any():
+            # An explicit object Series, or pandas would turn None values into NaN
+            sheets[key] = pd.Series(np.where(mask, value, column(key).to_numpy()), index=sheets.index, dtype=object)
+            fixed_keys.append(key)
+
+    # Validate level
+    level = parse_column(column('level'))
+    has_level = ~np.isnan(level)
+    report('level', ~has_level, "invalid_level", lambda value: f"Character level is not a valid integer: {value}")
+    fix('level', has_level & (level < 1), "1")
+    level_index = np.clip(np.nan_to_num(level, nan=1), 1, MAX_LEVEL).astype(int) - 1
+
+    # Blank spells and spell stats
+    for key in sheets.columns:
+        if str(key).endswith("_level_spells"):
+            fix(key, (sheets[key] == "").to_numpy(), "N/A")
+    for key in SPELL_STAT_KEYS:
+        fix(key, ~present(key) | (column(key) == "").to_numpy(), "N/A")
+
+    # Verify experience points
+    experience_points = parse_column(column('experience_points'), ",")
+    report('experience_points', has_level & np.isnan(experience_points), "invalid_experience_points",
+           lambda value: f"Experience points are not a valid integer: {value}")
+    with np.errstate(invalid="ignore"):
+        lower = EXPERIENCE_LOWER[level_index]
+        out_of_range = (experience_points <= lower.astype(float)) | (experience_points > EXPERIENCE_UPPER[level_index])
+    fix('experience_points', has_level & (level >= 1) & out_of_range, lower)
+
+    # Clear all spells above the character's level
+    for spell_level in SPELL_LEVELS:
+        spell_key = f"{spell_level}_level_spells"
+        fix(spell_key, has_level & present(spell_key) & (level < spell_level), "N/A")
+    fix("9_level_spells", has_level & (level < LOWEST_NINTH_LEVEL_SPELLCASTER) & (column("9_level_spells") != "N/A").to_numpy(), "N/A")
+
+    # Proficiency bonus is worked out now but fixed in check_character_sheet's order below
+    expected = PROFICIENCY_BY_LEVEL[level_index]
+    proficiency_wrong = has_level & ~(parse_column(column('proficiency_bonus'), "+") == expected)
+
+    # 1. Missing essential keys; a missing proficiency bonus is fixed when the level is valid
+    for key in ESSENTIAL_KEYS:
+        missing = ~present(key)
+        if key == 'proficiency_bonus':
+            missing &= ~proficiency_wrong
+        report(key, missing, "missing_key", lambda value, key=key: f"Missing essential key: {key}")
+
+    # 2. Core stats between 1 and 30
+    for key in ABILITY_KEYS:
+        scores = parse_column(column(key))
+        with np.errstate(invalid="ignore"):
+            valid_score = (scores >= 1) & (scores <= 30)
+        report(key, present(key) & ~valid_score, "invalid_score", lambda value, key=key: f"Invalid value for {key}: {value}")
+
+    # 3. Proficiency bonus consistent with the level
+    fix('proficiency_bonus', proficiency_wrong, np.array([f"+{bonus}" for bonus in expected], dtype=object))
+
+    # 4. Armor Class
+    armor_class = parse_column(column('armor_class'))
+    with np.errstate(invalid="ignore"):
+        valid_armor_class = (armor_class >= 10) & (armor_class <= 30)
+    report('armor_class', present('armor_class') & ~valid_armor_class, "invalid_armor_class",
+           lambda value: f"Invalid Armor Class: {value}")
+
+    # Flag any fields that have empty values
+    empty = (sheets == "").to_numpy()
+    for idx, key in enumerate(sheets.columns):
+        mask = empty[:, idx] & ~invalid.get(key, np.zeros(count, dtype=bool))
+        report(key, mask, "empty_value", lambda value, key=key: f"Empty value for {key}")
+
+    return FrameCheck(sheets, pd.Series(errors, index=sheets.index, dtype=object), frame_fixes(frame, sheets, dict.fromkeys(fixed_keys)))
+
+
+def frame_fixes(original: pd.DataFrame, fixed: pd.DataFrame, keys) -> pd.Series:
+    """
+    Collect the fields that changed between two DataFrames of sheets.
+
+    Args:
+        original (pd.DataFrame): The sheets before fixing.
+        fixed (pd.DataFrame): The sheets after fixing, with the same index and possibly extra columns.
+        keys (iterable): The columns that may have changed.
+
+    Returns:
+        pd.Series: A dict per row of changed fields and their new values.
+    """
+    fixes = [{} for _ in range(len(fixed))]
+    for key in keys:
+        new = fixed[key].to_numpy()
+        old = original[key].to_numpy() if key in original else np.full(len(fixed), np.nan, dtype=object)
+        # Object arrays compare with Python's `!=`, so "0" and 0 count as different
+        changed = np.asarray(old != new, dtype=bool) & present_mask(new)
+        for row in np.flatnonzero(changed):
+            fixes[row][key] = new[row]
+    return pd.Series(fixes, index=fixed.index, dtype=object)
+
+
+def list_sheet_keys(prefix: str = "sheets/") -> list:
+    """
+    List the S3 keys of every saved character sheet.
+
+    Args:
+        prefix (str, optional): The S3 prefix to look under. Defaults to "sheets/".
+
+    Returns:
+        list: The keys of the processed sheets' JSON.
+    """
+    keys = []
+    for page in get_s3_client().get_paginator("list_objects_v2").paginate(Bucket=S3_BUCKET_NAME, Prefix=prefix):
+        for item in page.get("Contents", []):
+            key = item["Key"]
+            if is_character_sheet_key(key):
+                keys.append(key)
+    return keys
+
+
+def load_sheet(s3_key: str) -> dict:
+    """
+    Download and parse one saved character sheet.
+
+    Args:
+        s3_key (str): The sheet's S3 key.
+
+    Returns:
+        dict: The character data.
+    """
+    response = get_s3_client().get_object(Bucket=S3_BUCKET_NAME, Key=s3_key)
+    return decode_json_body(response["Body"].read())
+
+
+def parse_args(argv: list = None) -> argparse.Namespace:
+    """
+    Parse the command line arguments.
+
+    Args:
+        argv (list, optional): The arguments to parse. Defaults to sys.argv[1:].
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(prog="python -m character_creator.audit", description="Validate saved D&D character sheets in bulk.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--prefix", default="sheets/", help="S3 prefix of the sheets to audit (default: sheets/).")
+    source.add_argument("--input", help="JSONL file of character sheets to audit instead ('-' for stdin).")
+    parser.add_argument("--concurrency", type=int, default=32, help="Sheets downloaded at once (default: 32).")
+    parser.add_argument("--output", default="-", help="JSONL file to write one record per sheet to (default: stdout).")
+    parser.add_argument("--summary-only", action="store_true", help="Only print the summary, not the per-sheet records.")
+    parser.add_argument("--repair", action="store_true", help="Upload the fixed version of every S3 sheet that needed fixes.")
+    return parser.parse_args(argv)
+
+
+def load_sheets(args: argparse.Namespace) -> tuple:
+    """
+    Load the sheets to audit.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+
+    Returns:
+        Tuple[list, list]: The sheets' sources (S3 keys or line numbers), and the sheets.
+    """
+    if args.input is not None:
+        with (contextlib.nullcontext(sys.stdin) if args.input == "-" else open(args.input)) as f:
+            lines = [(idx, line) for idx, line in enumerate(f, start=1) if line.strip()]
+        return [idx for idx, _ in lines], [json.loads(line) for _, line in lines]
+
+    keys = list_sheet_keys(args.prefix)
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        return keys, list(executor.map(load_sheet, keys))
+
+
+def main(argv: list = None) -> int:
+    """
+    Entry point for the audit CLI.
+
+    Args:
+        argv (list, optional): The arguments to parse. Defaults to sys.argv[1:].
+
+    Returns:
+        int: The process exit code, non-zero if any sheet has errors.
+    """
+    args = parse_args(argv)
+    if args.repair and args.input is not None:
+        print("--repair only applies to sheets loaded from S3", file=sys.stderr)
+        return 2
+
+    start = time.perf_counter()
+    sources, sheets = load_sheets(args)
+    loaded = time.perf_counter()
+    check = check_character_frame(sheets_frame(sheets))
+    checked = time.perf_counter()
+
+    codes = Counter(error.code for sheet_errors in check.errors for error in sheet_errors)
+    invalid = int((check.errors.str.len() > 0).sum())
+    fixed = int((check.fixes.str.len() > 0).sum())
+
+    if not args.summary_only:
+        with (contextlib.nullcontext(sys.stdout) if args.output == "-" else open(args.output, "w")) as output:
+            for source, sheet_errors, sheet_fixes in zip(sources, check.errors, check.fixes):
+                output.write(json.dumps({
+                    "source": source,
+                    "valid": not sheet_errors,
+                    "error_codes": [error.code for error in sheet_errors],
+                    "errors": [error.message for error in sheet_errors],
+                    "fixes": sheet_fixes,
+                }) + "\n")
+
+    if args.repair:
+        repairs = [
+            (source, record) for source, record, sheet_fixes in zip(sources, frame_records(check.sheets), check.fixes)
+            if sheet_fixes
+        ]
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(lambda repair: upload_bytes_to_s3(compress_body(json.dumps(repair[1]).encode("utf8")), repair[0], "application/json", "gzip"), repairs))
+        print(f"Repaired {len(repairs)} sheets", file=sys.stderr)
+
+    print(
+        f"Audited {len(sheets)} sheets (loaded in {loaded - start:.1f}s, checked in {checked - loaded:.2f}s): "
+        f"{invalid} with errors, {fixed} with fixable fields",
+        file=sys.stderr
+    )
+    for code, count in codes.most_common():
+        print(f"  {code}: {count}", file=sys.stderr)
+    return 1 if invalid else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
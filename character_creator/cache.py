@@ -0,0 +1,254 @@
+import os
+import copy
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Writes between full scans of the disk tier, which also clear out expired files
+DISK_EVICTION_INTERVAL = 256
+# An over-size disk tier is trimmed to this fraction of its limit, so the next write doesn't scan again
+DISK_EVICTION_HEADROOM = 0.9
+
+
+def normalize_character(character: dict) -> dict:
+    """
+    Normalize a character so that equivalent sheets hash the same.
+
+    Every value is stringified and stripped, which makes `7` and `"7 "` the
+    same input as far as the model is concerned.
+
+    Args:
+        character (dict): The (possibly partial) character sheet.
+
+    Returns:
+        dict: The normalized character sheet.
+    """
+    return {str(key): str(value).strip() for key, value in character.items()}
+
+
+def make_cache_key(character: dict, examples_digest: str, model: str, max_tokens: int) -> str:
+    """
+    Build a content-addressed cache key for a character generation request.
+
+    Args:
+        character (dict): The input character sheet.
+        examples_digest (str): Hash of the character examples file used in the prompt.
+        model (str): The chat model name.
+        max_tokens (int): The completion token limit.
+
+    Returns:
+        str: The hex SHA-256 digest identifying the request.
+    """
+    payload = {
+        "character": normalize_character(character),
+        "examples": examples_digest,
+        "model": model,
+        "max_tokens": max_tokens,
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache for generated character sheets.
+
+    An in-memory LRU sits in front of a directory of JSON files. Entries
+    expire after `ttl_seconds` in both tiers, the memory tier holds at most
+    `max_memory_entries` items and the disk tier is trimmed (least recently
+    used first) once it grows past `max_disk_bytes`. The disk tier's size is
+    tracked as entries are written, so the directory is only scanned when
+    it's over the limit or every DISK_EVICTION_INTERVAL writes. All methods
+    are thread-safe so a single instance can be shared across Streamlit
+    sessions.
+    """
+
+    def __init__(self, directory: str, max_memory_entries: int = 256,
+                 max_disk_bytes: int = 64 * 1024 * 1024, ttl_seconds: int = 7 * 24 * 60 * 60):
+        self.directory = directory
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        # Unknown until the first scan
+        self._disk_bytes = None
+        self._writes_since_eviction = 0
+        self._lock = threading.Lock()
+        self._eviction_lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _expired(self, created: float) -> bool:
+        return time.time() - created > self.ttl_seconds
+
+    def _remember(self, key: str, created: float, value: dict) -> None:
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _read_disk(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self._expired(entry["created"]):
+            self._remove_disk(key)
+            return None
+        # Touch the file so disk eviction is least-recently-used
+        os.utime(path)
+        return entry["created"], entry["value"]
+
+    def _file_size(self, path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    def _remove_disk(self, key: str) -> None:
+        size = self._file_size(self._path(key))
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            return
+        if self._disk_bytes is not None:
+            self._disk_bytes -= size
+
+    def _needs_eviction(self) -> bool:
+        return (self._disk_bytes is None or self._disk_bytes > self.max_disk_bytes
+                or self._writes_since_eviction >= DISK_EVICTION_INTERVAL)
+
+    def _evict_disk(self) -> None:
+        # Scans without holding the cache lock; a write racing it is at worst evicted early
+        if not self._eviction_lock.acquire(blocking=False):
+            return
+        try:
+            entries = []
+            total_bytes = 0
+            now = time.time()
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    stat = entry.stat()
+                    if now - stat.st_mtime > self.ttl_seconds:
+                        os.remove(entry.path)
+                        continue
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_bytes += stat.st_size
+            if total_bytes > self.max_disk_bytes:
+                entries.sort()
+                for _, size, path in entries:
+                    if total_bytes <= self.max_disk_bytes * DISK_EVICTION_HEADROOM:
+                        break
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    total_bytes -= size
+            with self._lock:
+                self._disk_bytes = total_bytes
+                self._writes_since_eviction = 0
+        finally:
+            self._eviction_lock.release()
+
+    def get(self, key: str):
+        """
+        Look up a cached response.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            dict: A copy of the cached value, or None on a miss.
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and self._expired(entry[0]):
+                del self._memory[key]
+                entry = None
+            if entry is None:
+                entry = self._read_disk(key)
+                if entry is not None:
+                    self._remember(key, *entry)
+            else:
+                self._memory.move_to_end(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return copy.deepcopy(entry[1])
+
+    def set(self, key: str, value: dict) -> None:
+        """
+        Store a response in both tiers.
+
+        Args:
+            key (str): The cache key.
+            value (dict): The response to cache.
+        """
+        created = time.time()
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._remember(key, created, value)
+            tmp_path = f"{self._path(key)}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"created": created, "value": value}, f)
+            replaced_bytes = self._file_size(self._path(key))
+            os.replace(tmp_path, self._path(key))
+            if self._disk_bytes is not None:
+                self._disk_bytes += self._file_size(self._path(key)) - replaced_bytes
+            self._writes_since_eviction += 1
+            needs_eviction = self._needs_eviction()
+        if needs_eviction:
+            self._evict_disk()
+
+    def discard(self, key: str) -> None:
+        """
+        Drop a response from both tiers, e.g. when it failed validation.
+
+        Args:
+            key (str): The cache key.
+        """
+        with self._lock:
+            self._memory.pop(key, None)
+            self._remove_disk(key)
+
+    def clear(self) -> None:
+        """
+        Drop every cached response and reset the counters.
+        """
+        with self._lock:
+            self._memory.clear()
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".json"):
+                    os.remove(entry.path)
+            self._disk_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """
+        Report cache counters.
+
+        Returns:
+            dict: Hits, misses, hit rate and the number of in-memory entries.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
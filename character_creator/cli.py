@@ -0,0 +1,248 @@
+"""
+Headless batch generation of D&D characters.
+
+Examples:
+    python -m character_creator --count 200 --concurrency 8 --output npcs.jsonl
+    python -m character_creator --input partial_sheets.jsonl --portraits 0
+    python -m character_creator --count 500 --concurrency 64 --async
+    python -m character_creator --input party.jsonl --packet party.pdf
+"""
+import sys
+import asyncio
+import json
+import time
+import argparse
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from character_creator.metrics import metrics
+from character_creator.clients import get_http_session
+from character_creator.pipeline import Portrait, default_character, generate_character
+from character_creator.pdf import render_party_packet
+
+
+def parse_args(argv: list = None) -> argparse.Namespace:
+    """
+    Parse the command line arguments.
+
+    Args:
+        argv (list, optional): The arguments to parse. Defaults to sys.argv[1:].
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(prog="python -m character_creator", description="Generate D&D characters in bulk.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--count", type=int, help="Number of fully random characters to generate.")
+    source.add_argument("--input", help="JSONL file of partial character sheets, one per line ('-' for stdin).")
+    parser.add_argument("--concurrency", type=int, default=4, help="Characters generated at once (default: 4).")
+    parser.add_argument("--portraits", type=int, default=1, help="Portraits per character (default: 1).")
+    parser.add_argument("--no-cache", action="store_true", help="Always generate new sheets instead of reusing cached ones.")
+    parser.add_argument("--output", default="-", help="JSONL file to write results to (default: stdout).")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Drive all generations from one event loop instead of a thread each.")
+    parser.add_argument("--metrics", help="File to write per-stage timings and token usage to, in Prometheus text format.")
+    parser.add_argument("--packet", help="Also render every generated character into this one PDF, in input order.")
+    return parser.parse_args(argv)
+
+
+def load_characters(args: argparse.Namespace) -> list:
+    """
+    Build the list of partial character sheets to generate.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+
+    Returns:
+        list: Character sheets with every key present.
+    """
+    if args.count is not None:
+        return [default_character() for _ in range(args.count)]
+
+    characters = []
+    with (contextlib.nullcontext(sys.stdin) if args.input == "-" else open(args.input)) as f:
+        for line in f:
+            if line.strip():
+                character = default_character()
+                character.update(json.loads(line))
+                characters.append(character)
+    return characters
+
+
+def result_record(index: int, start: float, result=None, error: Exception = None) -> dict:
+    """
+    Describe the outcome of one generation as a JSON-serializable record.
+
+    Args:
+        index (int): The position of the character in the input.
+        start (float): When the generation started, from time.perf_counter().
+        result (GenerationResult, optional): The generated character. Defaults to None.
+        error (Exception, optional): Why the generation failed. Defaults to None.
+
+    Returns:
+        dict: The result record, including timings and any error.
+    """
+    if error is not None:
+        return {"index": index, "ok": False, "seconds": round(time.perf_counter() - start, 3), "error": str(error)}
+    return {
+        "index": index,
+        "ok": True,
+        "seconds": round(time.perf_counter() - start, 3),
+        "character_id": result.character_id,
+        "name": result.character.get("name"),
+        "pdf_url": result.pdf_url,
+        "portrait_urls": result.portrait_urls,
+        "display_urls": result.display_urls,
+        "manifest_url": result.manifest_url,
+        "errors": result.errors,
+        "character": result.character,
+    }
+
+
+def generate_one(index: int, character: dict, args: argparse.Namespace) -> dict:
+    """
+    Generate one character on the calling thread.
+
+    Args:
+        index (int): The position of the character in the input.
+        character (dict): The partial character sheet.
+        args (argparse.Namespace): The parsed arguments.
+
+    Returns:
+        dict: The result record.
+    """
+    start = time.perf_counter()
+    try:
+        result = generate_character(character, num_portraits=args.portraits, use_cache=not args.no_cache)
+    except Exception as e:
+        return result_record(index, start, error=e)
+    return result_record(index, start, result)
+
+
+def run_batch(characters: list, args: argparse.Namespace, output, records: list = None) -> int:
+    """
+    Generate characters on a thread pool, writing each record as it completes.
+
+    Args:
+        characters (list): The partial character sheets.
+        args (argparse.Namespace): The parsed arguments.
+        output: The text stream to write JSONL records to.
+        records (list, optional): Appended with the record of each generated character. Defaults to None.
+
+    Returns:
+        int: The number of failed characters.
+    """
+    failures = 0
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [executor.submit(generate_one, idx, character, args) for idx, character in enumerate(characters)]
+        for future in as_completed(futures):
+            record = future.result()
+            failures += not record["ok"]
+            if records is not None and record["ok"]:
+                records.append(record)
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+    return failures
+
+
+async def run_async_batch(characters: list, args: argparse.Namespace, output, records: list = None) -> int:
+    """
+    Generate characters from a single event loop, writing each record as it completes.
+
+    Args:
+        characters (list): The partial character sheets.
+        args (argparse.Namespace): The parsed arguments.
+        output: The text stream to write JSONL records to.
+        records (list, optional): Appended with the record of each generated character. Defaults to None.
+
+    Returns:
+        int: The number of failed characters.
+    """
+    from character_creator.async_pipeline import AsyncPipeline
+
+    failures = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with AsyncPipeline(max_connections=args.concurrency * (args.portraits + 2)) as pipeline:
+        async def generate(index, character):
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    result = await pipeline.generate_character(character, num_portraits=args.portraits, use_cache=not args.no_cache)
+                except Exception as e:
+                    return result_record(index, start, error=e)
+                return result_record(index, start, result)
+
+        for next_record in asyncio.as_completed([generate(idx, character) for idx, character in enumerate(characters)]):
+            record = await next_record
+            failures += not record["ok"]
+            if records is not None and record["ok"]:
+                records.append(record)
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+    return failures
+
+
+def download_portrait(url: str) -> Portrait:
+    """
+    Fetch a saved portrait for embedding in a PDF.
+
+    Args:
+        url (str): The portrait's URL.
+
+    Returns:
+        Portrait: The URL and the image bytes.
+    """
+    response = get_http_session().get(url)
+    response.raise_for_status()
+    return Portrait(url, response.content)
+
+
+def write_packet(records: list, path: str, concurrency: int) -> None:
+    """
+    Render generated characters into one PDF packet.
+
+    Portraits are downloaded in parallel while the sheets are laid out.
+
+    Args:
+        records (list): The result records of the generated characters.
+        path (str): The PDF file to write.
+        concurrency (int): How many portraits to download at once.
+    """
+    records = sorted(records, key=lambda record: record["index"])
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        portraits = [[executor.submit(download_portrait, url) for url in record["portrait_urls"]] for record in records]
+        with open(path, "wb") as f:
+            render_party_packet([record["character"] for record in records], portraits, output=f)
+
+
+def main(argv: list = None) -> int:
+    """
+    Entry point for the batch generation CLI.
+
+    Results are written as JSONL in completion order while the batch runs.
+    Pipeline logging is sent to stderr so it can't corrupt the output.
+
+    Args:
+        argv (list, optional): The arguments to parse. Defaults to sys.argv[1:].
+
+    Returns:
+        int: The process exit code, non-zero if any character failed.
+    """
+    args = parse_args(argv)
+    characters = load_characters(args)
+    start = time.perf_counter()
+
+    records = [] if args.packet else None
+    with (contextlib.nullcontext(sys.stdout) if args.output == "-" else open(args.output, "w")) as output:
+        with contextlib.redirect_stdout(sys.stderr):
+            if args.use_async:
+                failures = asyncio.run(run_async_batch(characters, args, output, records))
+            else:
+                failures = run_batch(characters, args, output, records)
+            if args.packet:
+                write_packet(records, args.packet, args.concurrency)
+
+    print(f"Generated {len(characters) - failures}/{len(characters)} characters in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    if args.metrics:
+        with open(args.metrics, "w") as f:
+            f.write(metrics.export_prometheus())
+    return 1 if failures else 0
@@ -0,0 +1,275 @@
+import os
+import time
+import threading
+import boto3
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from botocore.config import Config
+from boto3.s3.transfer import TransferConfig
+from openai import OpenAI
+from character_creator.config import (
+    AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION_NAME, S3_BUCKET_NAME,
+    S3_MULTIPART_THRESHOLD, S3_MULTIPART_CHUNKSIZE, S3_MAX_CONCURRENCY, S3_MAX_ATTEMPTS,
+    S3_CONNECT_TIMEOUT, S3_READ_TIMEOUT, CHAT_MODEL
+)
+
+CLIENT_POOL_SIZE = int(os.environ.get('CLIENT_POOL_SIZE', 50))
+CLIENT_KEEPALIVE_SECONDS = 60
+CLIENT_HEALTH_CHECK_INTERVAL = int(os.environ.get('CLIENT_HEALTH_CHECK_INTERVAL', 300))
+CLIENT_HEALTH_CHECK_ATTEMPTS = 2  # Tries per probe before it counts as failed
+CLIENT_HEALTH_CHECK_RETRY_SECONDS = 5
+CLIENT_REBUILD_AFTER_FAILURES = int(os.environ.get('CLIENT_REBUILD_AFTER_FAILURES', 3))  # Consecutive failed probes
+
+s3_transfer_config = TransferConfig(
+    multipart_threshold=S3_MULTIPART_THRESHOLD,
+    multipart_chunksize=S3_MULTIPART_CHUNKSIZE,
+    max_concurrency=S3_MAX_CONCURRENCY
+)
+
+
+def s3_client_config(max_pool_connections: int = CLIENT_POOL_SIZE) -> Config:
+    """
+    Build the botocore config shared by the sync and async S3 clients.
+
+    Throttling, 5xx responses and dropped connections are retried with
+    exponential backoff and jitter, up to S3_MAX_ATTEMPTS attempts.
+
+    Args:
+        max_pool_connections (int, optional): The connection pool size. Defaults to CLIENT_POOL_SIZE.
+
+    Returns:
+        Config: The client config.
+    """
+    return Config(
+        max_pool_connections=max_pool_connections,
+        tcp_keepalive=True,
+        connect_timeout=S3_CONNECT_TIMEOUT,
+        read_timeout=S3_READ_TIMEOUT,
+        retries={"mode": "standard", "max_attempts": S3_MAX_ATTEMPTS}
+    )
+
+
+def build_s3_client():
+    """
+    Build an S3 client with a keep-alive connection pool.
+
+    Returns:
+        botocore.client.S3: The S3 client.
+    """
+    return boto3.client(
+        's3',
+        aws_access_key_id=AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+        region_name=AWS_REGION_NAME,
+        config=s3_client_config()
+    )
+
+
+def build_openai_client() -> OpenAI:
+    """
+    Build an OpenAI client with a keep-alive connection pool.
+
+    The client doesn't retry by itself; the shared rate limiters retry
+    instead, so a 429 slows every caller down rather than just the one
+    that hit it.
+
+    Returns:
+        OpenAI: The OpenAI client.
+    """
+    limits = httpx.Limits(
+        max_connections=CLIENT_POOL_SIZE,
+        max_keepalive_connections=CLIENT_POOL_SIZE,
+        keepalive_expiry=CLIENT_KEEPALIVE_SECONDS
+    )
+    return OpenAI(http_client=httpx.Client(limits=limits, timeout=httpx.Timeout(600, connect=10)), max_retries=0)
+
+
+def build_http_session() -> requests.Session:
+    """
+    Build a requests session with a keep-alive connection pool.
+
+    Returns:
+        requests.Session: The HTTP session.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=CLIENT_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def check_s3_client(client) -> None:
+    """
+    Health check for the S3 client: the bucket must be reachable.
+
+    Args:
+        client: The S3 client.
+    """
+    client.head_bucket(Bucket=S3_BUCKET_NAME)
+
+
+def check_openai_client(client) -> None:
+    """
+    Health check for the OpenAI client: the chat model must be retrievable.
+
+    Args:
+        client (OpenAI): The OpenAI client.
+    """
+    client.models.retrieve(CHAT_MODEL)
+
+
+class ClientRegistry:
+    """
+    Process-wide registry of pooled clients.
+
+    Each client is built on first use and then shared by every Streamlit
+    session and worker thread, so reruns reuse warm connections. When health
+    checking is enabled a daemon thread periodically probes each client and
+    rebuilds any that fail CLIENT_REBUILD_AFTER_FAILURES probes in a row.
+    """
+
+    def __init__(self, builders: dict, health_checks: dict = None, health_check_interval: int = CLIENT_HEALTH_CHECK_INTERVAL):
+        self.builders = builders
+        self.health_checks = health_checks or {}
+        self.health_check_interval = health_check_interval
+        self.health = {}
+        self._failures = {}
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._health_thread = None
+
+    def get(self, name: str):
+        """
+        Get a shared client, building it on first use.
+
+        Args:
+            name (str): The client name, e.g. "s3".
+
+        Returns:
+            The client.
+        """
+        client = self._clients.get(name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(name)
+                if client is None:
+                    client = self._clients[name] = self.builders[name]()
+                self._start_health_checks()
+        return client
+
+    def rebuild(self, name: str) -> None:
+        """
+        Replace a client with a freshly built one.
+
+        The old client isn't closed: other sessions may be part way through
+        a call on it, such as a long chat stream. It's closed when the last
+        of them lets go of it and it's garbage collected.
+
+        Args:
+            name (str): The client name.
+        """
+        with self._lock:
+            self._clients[name] = self.builders[name]()
+
+    def probe(self, name: str, client) -> float:
+        """
+        Run a client's health check, retrying once so a single blip doesn't count as a failure.
+
+        Args:
+            name (str): The client name.
+            client: The client to probe.
+
+        Returns:
+            float: How long the successful check took, in seconds.
+        """
+        for attempt in range(CLIENT_HEALTH_CHECK_ATTEMPTS):
+            start = time.perf_counter()
+            try:
+                self.health_checks[name](client)
+                return time.perf_counter() - start
+            except Exception:
+                if attempt + 1 == CLIENT_HEALTH_CHECK_ATTEMPTS:
+                    raise
+                time.sleep(CLIENT_HEALTH_CHECK_RETRY_SECONDS)
+
+    def check_health(self) -> dict:
+        """
+        Probe every built client, and rebuild the ones that keep failing.
+
+        Returns:
+            dict: Client name to whether it passed its health check.
+        """
+        for name in self.health_checks:
+            client = self._clients.get(name)
+            if client is None:
+                continue
+            try:
+                seconds = self.probe(name, client)
+                self._failures[name] = 0
+                self.health[name] = {"healthy": True, "seconds": seconds, "checked": time.time()}
+            except Exception as e:
+                failures = self._failures[name] = self._failures.get(name, 0) + 1
+                self.health[name] = {"healthy": False, "error": str(e), "failures": failures, "checked": time.time()}
+                if failures < CLIENT_REBUILD_AFTER_FAILURES:
+                    print(f"Health check failed for {name} client ({failures} in a row): {e}")
+                    continue
+                print(f"Health check failed for {name} client {failures} times in a row, rebuilding: {e}")
+                self._failures[name] = 0
+                self.rebuild(name)
+        return {name: status["healthy"] for name, status in self.health.items()}
+
+    def _start_health_checks(self) -> None:
+        if self._health_thread is not None or not self.health_check_interval or not self.health_checks:
+            return
+
+        def run():
+            while True:
+                time.sleep(self.health_check_interval)
+                self.check_health()
+
+        self._health_thread = threading.Thread(target=run, name="client-health", daemon=True)
+        self._health_thread.start()
+
+
+client_registry = ClientRegistry(
+    builders={
+        "s3": build_s3_client,
+        "openai": build_openai_client,
+        "http": build_http_session,
+    },
+    health_checks={
+        "s3": check_s3_client,
+        "openai": check_openai_client,
+    }
+)
+
+
+def get_s3_client():
+    """
+    Get the shared S3 client.
+
+    Returns:
+        botocore.client.S3: The S3 client.
+    """
+    return client_registry.get("s3")
+
+
+def get_openai_client() -> OpenAI:
+    """
+    Get the shared OpenAI client.
+
+    Returns:
+        OpenAI: The OpenAI client.
+    """
+    return client_registry.get("openai")
+
+
+def get_http_session() -> requests.Session:
+    """
+    Get the shared HTTP session.
+
+    Returns:
+        requests.Session: The HTTP session.
+    """
+    return client_registry.get("http")
@@ -0,0 +1,126 @@
+"""
+Configuration for the D&D Character Creator, read from the environment.
+"""
+import os
+
+# Set configuration variables
+OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
+AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID')
+AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY')
+AWS_REGION_NAME = os.environ.get('AWS_REGION_NAME')
+S3_BUCKET_NAME = os.environ.get('S3_BUCKET_NAME')
+CLOUDFRONT_URL = os.environ.get('CLOUDFRONT_URL')
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')  # Opens the metrics page with ?token=...; unset keeps it closed
+
+# Constants
+PROJECT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CURRENT_DIRECTORY = os.getcwd()
+DATA_DIRECTORY = os.environ.get('DATA_DIRECTORY', os.path.join(CURRENT_DIRECTORY, "data"))
+PAGES_DIRECTORY = os.path.join(PROJECT_DIRECTORY, "pages")
+RESPONSE_CACHE_DIRECTORY = os.path.join(DATA_DIRECTORY, "response_cache")
+CHARACTER_INDEX_FILE = os.environ.get('CHARACTER_INDEX_FILE', os.path.join(DATA_DIRECTORY, "characters.sqlite3"))
+CHARACTER_EXAMPLES_FILE = os.path.join(PAGES_DIRECTORY, "character_examples.json")
+CHAT_MODEL = "gpt-4-turbo-preview"
+MAX_TOKENS = 1500
+PROMPT_EXAMPLES = int(os.environ.get('PROMPT_EXAMPLES', 2))
+REPAIR_ATTEMPTS = 2
+REPAIR_TOKENS_PER_FIELD = 150
+RESPONSE_CACHE_TTL_SECONDS = int(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', 7 * 24 * 60 * 60))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+STREAM_CHARACTER_DATA = os.environ.get('STREAM_CHARACTER_DATA', 'true').lower() == 'true'
+MAX_PORTRAITS = 5
+PORTRAIT_WORKERS = int(os.environ.get('PORTRAIT_WORKERS', 8))
+PORTRAIT_WIDTH = 90  # mm, DALL·E portraits are square
+PORTRAIT_DISPLAY_PX = 640  # The form is at most ~700 CSS px wide
+PORTRAIT_DISPLAY_FORMAT = os.environ.get('PORTRAIT_DISPLAY_FORMAT', 'webp').lower()  # webp or jpg
+PORTRAIT_DISPLAY_QUALITY = 80
+DISPLAY_CACHE_MAX_BYTES = int(os.environ.get('DISPLAY_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))
+JOB_POLL_SECONDS = 1.0
+JOB_RETENTION_SECONDS = int(os.environ.get('JOB_RETENTION_SECONDS', 60 * 60))  # How long finished jobs can be collected
+WARM_POOL_SIZE = int(os.environ.get('WARM_POOL_SIZE', 0))  # 0 disables the warm pool
+WARM_POOL_LOW_WATERMARK = int(os.environ.get('WARM_POOL_LOW_WATERMARK', WARM_POOL_SIZE // 2))
+WARM_POOL_WORKERS = int(os.environ.get('WARM_POOL_WORKERS', 2))
+WARM_POOL_STRATIFY = [key for key in os.environ.get('WARM_POOL_STRATIFY', 'class,race').split(',') if key]
+WARM_POOL_RETRY_SECONDS = 30  # Doubles with each failed refill in a row
+WARM_POOL_MAX_RETRY_SECONDS = 10 * 60
+GALLERY_PAGE_SIZE = 24
+# Per-minute budgets from the account's rate limits page; 0 turns a budget off
+OPENAI_CHAT_RPM = int(os.environ.get('OPENAI_CHAT_RPM', 500))
+OPENAI_CHAT_TPM = int(os.environ.get('OPENAI_CHAT_TPM', 300000))
+OPENAI_IMAGE_RPM = int(os.environ.get('OPENAI_IMAGE_RPM', 50))
+OPENAI_MAX_CONCURRENCY = int(os.environ.get('OPENAI_MAX_CONCURRENCY', 32))  # Per endpoint, across the process
+OPENAI_MAX_RETRIES = int(os.environ.get('OPENAI_MAX_RETRIES', 6))  # For 429s, dropped connections and 5xx responses
+HEDGE_CHAT_REQUESTS = os.environ.get('HEDGE_CHAT_REQUESTS', 'false').lower() == 'true'
+HEDGE_PERCENTILE = float(os.environ.get('HEDGE_PERCENTILE', 95))  # Of recent chat completion latency
+HEDGE_FALLBACK_MODEL = os.environ.get('HEDGE_FALLBACK_MODEL')  # Unset to hedge with CHAT_MODEL
+HEDGE_MAX_RATIO = float(os.environ.get('HEDGE_MAX_RATIO', 0.1))  # Most hedges per request
+HEDGE_MIN_SAMPLES = 20
+HEDGE_WINDOW = 200
+DEBUG = False
+
+S3_MULTIPART_THRESHOLD = 8 * 1024 * 1024
+S3_MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+S3_MAX_CONCURRENCY = 10  # Parts of one multipart upload sent at once
+S3_MAX_ATTEMPTS = int(os.environ.get('S3_MAX_ATTEMPTS', 5))  # Including the first try
+S3_CONNECT_TIMEOUT = 5
+S3_READ_TIMEOUT = 60
+S3_GZIP_LEVEL = 6
+ARTIFACT_UPLOAD_WORKERS = int(os.environ.get('ARTIFACT_UPLOAD_WORKERS', 16))
+
+# Ensure directories exist
+os.makedirs(DATA_DIRECTORY, exist_ok=True)
+
+# List options
+CLASS_LIST = [
+    "Barbarian",
+    "Bard",
+    "Cleric",
+    "Druid",
+    "Fighter",
+    "Monk",
+    "Paladin",
+    "Ranger",
+    "Rogue",
+    "Sorcerer",
+    "Warlock",
+    "Wizard"
+]
+RACE_LIST = [
+    "Dragonborn",
+    "Dwarf",
+    "Elf",
+    "Gnome",
+    "Half-Elf",
+    "Half-Orc",
+    "Halfling",
+    "Human",
+    "Tiefling",
+    "Aarakocra",
+    "Aasimar",
+    "Bugbear",
+    "Firbolg",
+    "Goblin",
+    "Goliath",
+    "Hobgoblin",
+    "Kenku",
+    "Kobold",
+    "Lizardfolk",
+    "Orc",
+    "Tabaxi",
+    "Triton",
+    "Yuan-ti Pureblood",
+    "Genasi",
+    "Changeling",
+    "Kalashtar",
+    "Shifter",
+    "Warforged",
+    "Centaur",
+    "Loxodon",
+    "Minotaur",
+    "Simic Hybrid",
+    "Vedalken",
+    "Verdan",
+    "Leonin",
+    "Satyr"
+]
@@ -0,0 +1,122 @@
+"""
+Layout of the character sheet form.
+
+The page renders these sections instead of spelling out every widget, so a
+section's widgets only exist while the user has it open.
+"""
+from typing import NamedTuple
+
+SKILLS = ["Acrobatics", "Animal Handling", "Arcana", "Athletics", "Deception", "History", "Insight", "Intimidation", "Investigation", "Medicine", "Nature", "Perception", "Performance", "Persuasion", "Religion", "Sleight of Hand", "Stealth", "Survival"]
+
+
+class FormField(NamedTuple):
+    key: str
+    label: str
+    multiline: bool = False
+
+
+class FormSection(NamedTuple):
+    title: str
+    fields: tuple
+    columns: int = 1
+
+
+def skill_key(skill: str) -> str:
+    """
+    Get the character sheet key for a skill.
+
+    Args:
+        skill (str): The skill name, e.g. "Sleight of Hand".
+
+    Returns:
+        str: The sheet key, e.g. "skills_sleight_of_hand".
+    """
+    return f"skills_{skill.lower().replace(' ', '_')}"
+
+
+# Always shown at the top of the form
+HEADER_SECTION = FormSection("Character", (
+    FormField('level', "Level (Recommended)"),
+    FormField('name', "Character Name (Recommended)"),
+    FormField('description', "Description (Recommended)", multiline=True),
+))
+
+FORM_SECTIONS = (
+    FormSection("Basic Info", (
+        FormField('pronouns', "Pronouns"),
+        FormField('age', "Age"),
+        FormField('orientation', "Orientation"),
+        FormField('height', "Height"),
+        FormField('race', "Race"),
+        FormField('weight', "Weight"),
+        FormField('class', "Class"),
+        FormField('eyes', "Eyes"),
+        FormField('alignment', "Alignment"),
+        FormField('skin', "Skin"),
+        FormField('background', "Background"),
+        FormField('hair', "Hair"),
+        FormField('experience_points', "Experience Points"),
+    ), columns=2),
+    FormSection("Stats", (
+        FormField('armor_class', "Armor Class"),
+        FormField('hit_points', "Hit Points"),
+        FormField('speed', "Speed"),
+        FormField('strength', "Strength"),
+        FormField('dexterity', "Dexterity"),
+        FormField('constitution', "Constitution"),
+        FormField('intelligence', "Intelligence"),
+        FormField('wisdom', "Wisdom"),
+        FormField('charisma', "Charisma"),
+        FormField('passive_wisdom_perception', "Passive Wisdom (Perception)"),
+        FormField('inspiration', "Inspiration"),
+        FormField('proficiency_bonus', "Proficiency Bonus"),
+    ), columns=6),
+    FormSection("Saving Throws", (
+        FormField('strength_save', "Strength"),
+        FormField('dexterity_save', "Dexterity"),
+        FormField('constitution_save', "Constitution"),
+        FormField('intelligence_save', "Intelligence"),
+        FormField('wisdom_save', "Wisdom"),
+        FormField('charisma_save', "Charisma"),
+    ), columns=6),
+    FormSection("Skills", tuple(FormField(skill_key(skill), skill) for skill in SKILLS), columns=4),
+    FormSection("Character Traits", (
+        FormField('personality_traits', "Personality Traits", multiline=True),
+        FormField('ideals', "Ideals", multiline=True),
+        FormField('bonds', "Bonds", multiline=True),
+        FormField('flaws', "Flaws", multiline=True),
+    )),
+    FormSection("Attacks and Spellcasting", (
+        FormField('attacks_spellcasting', "Details", multiline=True),
+    )),
+    FormSection("Proficiencies and Languages", (
+        FormField('languages', "Languages"),
+        FormField('proficiencies', "Proficiencies"),
+    )),
+    FormSection("Equipment", (
+        FormField('equipment', "Details", multiline=True),
+    )),
+    FormSection("Features and Traits", (
+        FormField('features_traits', "Details", multiline=True),
+    )),
+    FormSection("Allies and Organizations", (
+        FormField('allies_organizations', "Details", multiline=True),
+    )),
+    FormSection("Spellcasting", (
+        FormField('spellcasting_ability', "Spellcasting Ability"),
+        FormField('spell_save_dc', "Spell Save DC"),
+        FormField('spell_attack_bonus', "Spell Attack Bonus"),
+    ), columns=3),
+    FormSection("Spells Known", tuple(
+        FormField(f'{level}_level_spells', f"Level {level} Spells", multiline=True) for level in range(1, 10)
+    )),
+    FormSection("Character Appearance", (
+        FormField('character_appearance', "Details", multiline=True),
+    )),
+    FormSection("Character Backstory", (
+        FormField('character_backstory', "Details", multiline=True),
+    )),
+    FormSection("Treasure", (
+        FormField('treasure', "Details", multiline=True),
+    )),
+)
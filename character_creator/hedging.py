@@ -0,0 +1,278 @@
+"""
+Hedged chat completions, to cut the tail latency of character generation.
+
+A few completions take far longer than the median. With hedging on, a
+request that hasn't finished by the HEDGE_PERCENTILE of recent latency gets
+an identical second request, sent to HEDGE_FALLBACK_MODEL if one is set.
+The first response that passes validation wins and the other request is
+cancelled. If neither passes, the first one to finish is used and goes
+through the usual repairs.
+
+The extra cost is bounded: at most HEDGE_MAX_RATIO of recent requests are
+hedged, and nothing is hedged while the chat rate limiter has callers
+queued, since a second request would only add to the backlog.
+
+Example:
+    result = hedged_call(
+        lambda model, hedge, cancelled: request(model, cancelled),
+        accept=lambda result: is_valid(result),
+        executor=executor
+    )
+"""
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import wait, FIRST_COMPLETED
+from character_creator.config import (
+    CHAT_MODEL, HEDGE_CHAT_REQUESTS, HEDGE_PERCENTILE, HEDGE_FALLBACK_MODEL, HEDGE_MAX_RATIO,
+    HEDGE_MIN_SAMPLES, HEDGE_WINDOW
+)
+from character_creator.metrics import metrics, Histogram
+from character_creator.ratelimit import chat_limiter
+
+
+class HedgeCancelled(BaseException):
+    """
+    Raised inside a request that's no longer wanted, such as the loser of a
+    hedged race, to stop it.
+
+    Like `asyncio.CancelledError` it isn't an Exception, so it's neither
+    retried nor counted as a failure.
+    """
+
+
+class HedgePolicy:
+    """
+    Decides when a request should be hedged, from the recent latency of
+    unhedged requests and how many requests were hedged lately.
+    """
+
+    def __init__(self, enabled: bool = HEDGE_CHAT_REQUESTS, percentile: float = HEDGE_PERCENTILE,
+                 max_ratio: float = HEDGE_MAX_RATIO, fallback_model: str = HEDGE_FALLBACK_MODEL,
+                 min_samples: int = HEDGE_MIN_SAMPLES, window: int = HEDGE_WINDOW):
+        """
+        Args:
+            enabled (bool, optional): Whether to hedge at all. Defaults to HEDGE_CHAT_REQUESTS.
+            percentile (float, optional): The latency percentile to hedge at, between 0 and 100. Defaults to HEDGE_PERCENTILE.
+            max_ratio (float, optional): The most hedges per request, over the last `window` requests. Defaults to HEDGE_MAX_RATIO.
+            fallback_model (str, optional): The model hedges are sent to, None for the same model. Defaults to HEDGE_FALLBACK_MODEL.
+            min_samples (int, optional): Requests to time before hedging starts. Defaults to HEDGE_MIN_SAMPLES.
+            window (int, optional): How many recent requests the latency and ratio are taken over. Defaults to HEDGE_WINDOW.
+        """
+        self.enabled = enabled
+        self.percentile = percentile
+        self.max_ratio = max_ratio
+        self.fallback_model = fallback_model
+        self.min_samples = min_samples
+        self._latency = Histogram(max_samples=window)
+        self._hedged = deque(maxlen=window)
+        self._in_flight_hedges = 0
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        """
+        Get how long to wait for the first request before hedging it.
+
+        Returns:
+            float: The delay in seconds, or None not to hedge this request.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            if len(self._latency.samples) < self.min_samples:
+                return None
+            return self._latency.percentile(self.percentile)
+
+    def observe(self, seconds: float) -> None:
+        """
+        Record how long a first request took.
+
+        Args:
+            seconds (float): The request's latency.
+        """
+        with self._lock:
+            self._latency.observe(seconds)
+
+    def start_hedge(self) -> bool:
+        """
+        Claim a hedge for a request that's running late, if the budget allows.
+
+        Returns:
+            bool: Whether to send the hedge; if so, `finish(True)` must follow.
+        """
+        if chat_limiter.stats()["queued"]:
+            metrics.increment("hedges_skipped_total", reason="queued")
+            return False
+        with self._lock:
+            hedges = sum(self._hedged) + self._in_flight_hedges + 1
+            if hedges > self.max_ratio * (len(self._hedged) + 1):
+                metrics.increment("hedges_skipped_total", reason="ratio")
+                return False
+            self._in_flight_hedges += 1
+            return True
+
+    def finish(self, hedged: bool) -> None:
+        """
+        Count a finished request towards the hedge ratio.
+
+        Args:
+            hedged (bool): Whether it was hedged.
+        """
+        with self._lock:
+            self._hedged.append(hedged)
+            if hedged:
+                self._in_flight_hedges -= 1
+
+    def stats(self) -> dict:
+        """
+        Get the policy's current state, for the metrics page.
+
+        Returns:
+            dict: The current hedge delay in seconds (None before there are enough samples)
+                  and the share of recent requests that were hedged.
+        """
+        delay = self.delay()
+        with self._lock:
+            ratio = sum(self._hedged) / len(self._hedged) if self._hedged else 0
+        return {"delay": delay, "ratio": ratio}
+
+
+def outcome(name: str, future, accept) -> tuple:
+    """
+    Describe how a finished request of a hedged race went.
+
+    Args:
+        name (str): "primary" or "hedge".
+        future: The request's finished concurrent future or asyncio task.
+        accept (callable): Whether a result is good enough to win.
+
+    Returns:
+        Tuple[str, object, BaseException, bool]: The name, the result, the error and whether the result was accepted.
+    """
+    error = future.exception()
+    if error is not None:
+        return name, None, error, False
+    return name, future.result(), None, accept(future.result())
+
+
+def pick_winner(outcomes: list):
+    """
+    Pick the result to use from the finished requests of a hedged race.
+
+    The first accepted result wins; if none was accepted, the first result
+    goes on to the usual repairs.
+
+    Args:
+        outcomes (list): `outcome()` tuples in the order the requests finished.
+
+    Returns:
+        The result.
+
+    Raises:
+        BaseException: The first error, if every request failed.
+    """
+    winners = [finished for finished in outcomes if finished[3]] or [finished for finished in outcomes if finished[2] is None]
+    if not winners:
+        raise outcomes[0][2]
+    name, result, _, accepted = winners[0]
+    metrics.increment("hedged_requests_total", winner=name if accepted else "none")
+    return result
+
+
+def hedged_call(attempt, accept, executor, policy: HedgePolicy = None, cancelled: threading.Event = None):
+    """
+    Make a request from a thread, hedging it if it runs late.
+
+    Args:
+        attempt (callable): Makes the request, taking (model, hedge, cancelled): whether this is the hedge,
+                            and a threading.Event the request checks, raising HedgeCancelled once it's set.
+        accept (callable): Whether a result is good enough to win.
+        executor (ThreadPoolExecutor): Runs the requests while this thread waits on them.
+        policy (HedgePolicy, optional): Decides when to hedge. Defaults to the shared chat policy.
+        cancelled (threading.Event, optional): Set by the caller to stop both requests. It's also set once
+                                               the race is decided, to stop the loser. Defaults to a new Event.
+
+    Returns:
+        The winning result.
+    """
+    policy = policy or chat_hedge_policy
+    cancelled = cancelled if cancelled is not None else threading.Event()
+    delay = policy.delay()
+    start = time.monotonic()
+    if delay is None:
+        result = attempt(CHAT_MODEL, False, cancelled)
+        policy.observe(time.monotonic() - start)
+        policy.finish(False)
+        return result
+
+    primary = executor.submit(attempt, CHAT_MODEL, False, cancelled)
+    # A primary stopped by a winning hedge is timed up to then, so the slowest requests aren't left out
+    primary.add_done_callback(lambda future: policy.observe(time.monotonic() - start))
+    done, _ = wait([primary], timeout=delay)
+    if done or not policy.start_hedge():
+        policy.finish(False)
+        return primary.result()
+
+    print(f"Chat request still running after {delay:.1f}s, hedging")
+    hedge = executor.submit(attempt, policy.fallback_model or CHAT_MODEL, True, cancelled)
+    names = {primary: "primary", hedge: "hedge"}
+    outcomes, pending = [], set(names)
+    try:
+        while pending and not any(accepted for *_, accepted in outcomes):
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            outcomes += [outcome(names[future], future, accept) for future in sorted(done, key=lambda future: names[future] != "primary")]
+    finally:
+        # Stop the loser
+        cancelled.set()
+        policy.finish(True)
+    return pick_winner(outcomes)
+
+
+async def hedged_call_async(attempt, accept, policy: HedgePolicy = None):
+    """
+    Make a request from an event loop, hedging it if it runs late.
+
+    Args:
+        attempt (callable): Coroutine function making the request, taking (model, hedge): whether this is the hedge.
+        accept (callable): Whether a result is good enough to win.
+        policy (HedgePolicy, optional): Decides when to hedge. Defaults to the shared chat policy.
+
+    Returns:
+        The winning result.
+    """
+    policy = policy or chat_hedge_policy
+    delay = policy.delay()
+    start = time.monotonic()
+    if delay is None:
+        result = await attempt(CHAT_MODEL, False)
+        policy.observe(time.monotonic() - start)
+        policy.finish(False)
+        return result
+
+    primary = asyncio.ensure_future(attempt(CHAT_MODEL, False))
+    primary.add_done_callback(lambda task: policy.observe(time.monotonic() - start))
+    names = {primary: "primary"}
+    hedged = False
+    try:
+        done, _ = await asyncio.wait([primary], timeout=delay)
+        if done or not policy.start_hedge():
+            return await primary
+
+        print(f"Chat request still running after {delay:.1f}s, hedging")
+        hedged = True
+        names[asyncio.ensure_future(attempt(policy.fallback_model or CHAT_MODEL, True))] = "hedge"
+        outcomes, pending = [], set(names)
+        while pending and not any(accepted for *_, accepted in outcomes):
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            outcomes += [outcome(names[task], task, accept) for task in sorted(done, key=lambda task: names[task] != "primary")]
+        return pick_winner(outcomes)
+    finally:
+        # Stop the loser, or both requests if our caller gave up
+        for task in names:
+            task.cancel()
+        policy.finish(hedged)
+
+
+# Process-wide shared policy, so every session's requests feed one latency window and ratio
+chat_hedge_policy = HedgePolicy()
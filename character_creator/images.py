@@ -0,0 +1,194 @@
+import io
+import hashlib
+import threading
+from collections import OrderedDict
+from PIL import Image
+from character_creator.config import PORTRAIT_DISPLAY_PX, PORTRAIT_DISPLAY_FORMAT, PORTRAIT_DISPLAY_QUALITY, DISPLAY_CACHE_MAX_BYTES
+
+MM_PER_INCH = 25.4
+PRINT_DPI = 200
+PRINT_JPEG_QUALITY = 85
+# Pillow format and MIME type for each display derivative file extension
+DISPLAY_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpg": ("JPEG", "image/jpeg"),
+}
+
+
+def make_derivative(image_bytes: bytes, max_px: int, image_format: str = "JPEG", quality: int = PRINT_JPEG_QUALITY) -> bytes:
+    """
+    Downsample an image and re-encode it.
+
+    Images already smaller than `max_px` are only re-encoded, never upscaled.
+
+    Args:
+        image_bytes (bytes): The encoded source image.
+        max_px (int): The maximum width and height of the derivative, in pixels.
+        image_format (str, optional): The Pillow format to encode to. Defaults to "JPEG".
+        quality (int, optional): The encoder quality. Defaults to PRINT_JPEG_QUALITY.
+
+    Returns:
+        bytes: The encoded derivative.
+    """
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        image.thumbnail((max_px, max_px), Image.LANCZOS)
+        if image_format == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+        output = io.BytesIO()
+        image.save(output, format=image_format, quality=quality, optimize=True)
+    return output.getvalue()
+
+
+def print_size_px(width_mm: float, dpi: int = PRINT_DPI) -> int:
+    """
+    Convert a printed width to pixels.
+
+    Args:
+        width_mm (float): The printed width in millimetres.
+        dpi (int, optional): The print resolution. Defaults to PRINT_DPI.
+
+    Returns:
+        int: The width in pixels.
+    """
+    return round(width_mm / MM_PER_INCH * dpi)
+
+
+class DerivativeCache:
+    """
+    Small LRU cache of image derivatives, keyed on the source image digest.
+
+    Keeping the digest rather than the source bytes as the key means the cache
+    only holds on to the (small) derivatives. Thread-safe.
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, image_bytes: bytes, max_px: int, image_format: str = "JPEG", quality: int = PRINT_JPEG_QUALITY) -> bytes:
+        """
+        Get a derivative of an image, creating it on a miss.
+
+        Args:
+            image_bytes (bytes): The encoded source image.
+            max_px (int): The maximum width and height of the derivative, in pixels.
+            image_format (str, optional): The Pillow format to encode to. Defaults to "JPEG".
+            quality (int, optional): The encoder quality. Defaults to PRINT_JPEG_QUALITY.
+
+        Returns:
+            bytes: The encoded derivative.
+        """
+        key = (hashlib.sha256(image_bytes).hexdigest(), max_px, image_format, quality)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        derivative = make_derivative(image_bytes, max_px, image_format, quality)
+        with self._lock:
+            self._entries[key] = derivative
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return derivative
+
+    def clear(self) -> None:
+        """
+        Drop every cached derivative.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+derivative_cache = DerivativeCache()
+
+
+def print_derivative(image_bytes: bytes, width_mm: float, dpi: int = PRINT_DPI) -> bytes:
+    """
+    Get a print-resolution JPEG of an image for embedding in a PDF.
+
+    Args:
+        image_bytes (bytes): The encoded source image.
+        width_mm (float): The width of the image on the page, in millimetres.
+        dpi (int, optional): The print resolution. Defaults to PRINT_DPI.
+
+    Returns:
+        bytes: The JPEG derivative.
+    """
+    return derivative_cache.get(image_bytes, print_size_px(width_mm, dpi))
+
+
+def display_content_type() -> str:
+    """
+    Get the MIME type of the display derivatives.
+
+    Returns:
+        str: The MIME type, e.g. "image/webp".
+    """
+    return DISPLAY_FORMATS[PORTRAIT_DISPLAY_FORMAT][1]
+
+
+def display_derivative(image_bytes: bytes) -> bytes:
+    """
+    Get a screen-sized copy of an image for showing in the app.
+
+    Args:
+        image_bytes (bytes): The encoded source image.
+
+    Returns:
+        bytes: The derivative, in PORTRAIT_DISPLAY_FORMAT.
+    """
+    return derivative_cache.get(image_bytes, PORTRAIT_DISPLAY_PX, DISPLAY_FORMATS[PORTRAIT_DISPLAY_FORMAT][0], PORTRAIT_DISPLAY_QUALITY)
+
+
+class DisplayImageCache:
+    """
+    LRU cache of display-sized image bytes, keyed on the URL they're served from.
+
+    Lets the app show a freshly generated portrait from memory instead of
+    going back to S3 for it. Bounded by total size rather than entry count.
+    Thread-safe.
+    """
+
+    def __init__(self, max_bytes: int = DISPLAY_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> bytes:
+        """
+        Get the cached bytes for a URL.
+
+        Args:
+            url (str): The image URL.
+
+        Returns:
+            bytes: The image, or None if it isn't cached.
+        """
+        with self._lock:
+            if url not in self._entries:
+                return None
+            self._entries.move_to_end(url)
+            return self._entries[url]
+
+    def put(self, url: str, data: bytes) -> None:
+        """
+        Cache the bytes for a URL, evicting the least recently used images to make room.
+
+        Args:
+            url (str): The image URL.
+            data (bytes): The image.
+        """
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if url in self._entries:
+                self.size -= len(self._entries.pop(url))
+            self._entries[url] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+display_cache = DisplayImageCache()
@@ -0,0 +1,428 @@
+"""
+Local index of generated characters.
+
+Characters only live in S3 under `sheets/{character_id}/`, which can't be
+searched or listed quickly. Every generated character is also recorded in a
+small SQLite database, so the gallery can filter and page through them in
+milliseconds. The index can be rebuilt from the bucket, or from a local copy
+of it, at any time.
+
+Examples:
+    python -m character_creator.index
+    python -m character_creator.index --directory ./bucket_copy
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import functools
+import threading
+from typing import NamedTuple
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from character_creator.config import CHARACTER_INDEX_FILE, S3_BUCKET_NAME, CLOUDFRONT_URL
+from character_creator.clients import get_s3_client
+from character_creator.storage import decode_json_body, is_character_sheet_key, portrait_display_s3_key
+from character_creator.validation import parse_int
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS characters (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    class TEXT NOT NULL,
+    race TEXT NOT NULL,
+    level INTEGER,
+    sheet_url TEXT,
+    pdf_url TEXT,
+    portrait_urls TEXT NOT NULL DEFAULT '[]',
+    display_urls TEXT NOT NULL DEFAULT '[]',
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS characters_by_created ON characters (created, id);
+CREATE INDEX IF NOT EXISTS characters_by_class ON characters (class, created, id);
+CREATE INDEX IF NOT EXISTS characters_by_race ON characters (race, created, id);
+"""
+COLUMNS = "id, name, class, race, level, sheet_url, pdf_url, portrait_urls, display_urls, created, updated"
+# Columns added since the table was first created, for indexes made by older versions
+MIGRATIONS = {
+    "display_urls": "ALTER TABLE characters ADD COLUMN display_urls TEXT NOT NULL DEFAULT '[]'",
+}
+
+
+class CharacterRecord(NamedTuple):
+    """
+    A generated character as listed in the index.
+    """
+    id: str
+    name: str
+    character_class: str
+    race: str
+    level: int
+    sheet_url: str
+    pdf_url: str
+    portrait_urls: list
+    display_urls: list  # Display-sized copies of the portraits, None where there isn't one
+    created: float
+    updated: float
+
+
+class CharacterPage(NamedTuple):
+    """
+    One page of index query results, newest first.
+    """
+    records: list
+    next_cursor: tuple  # Pass back to `query` for the next page; None on the last page
+
+
+class CharacterIndex:
+    """
+    Thread-safe SQLite index of generated characters.
+
+    One connection is shared by every thread, opened on first use in WAL
+    mode so readers never wait for the generator's writes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Called with the lock held
+        if self._connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(characters)")}
+            for column, migration in MIGRATIONS.items():
+                if column not in columns:
+                    connection.execute(migration)
+            self._connection = connection
+        return self._connection
+
+    def upsert(self, character_id: str, character: dict, sheet_url: str = None, pdf_url: str = None,
+               portrait_urls: list = None, display_urls: list = None, created: float = None, updated: float = None) -> None:
+        """
+        Add a character to the index, or update it.
+
+        URLs that aren't given keep their indexed value, and so does the
+        creation time of a character that's already indexed.
+
+        Args:
+            character_id (str): The character ID.
+            character (dict): The character data.
+            sheet_url (str, optional): URL of the character's JSON. Defaults to None.
+            pdf_url (str, optional): URL of the character's PDF. Defaults to None.
+            portrait_urls (list, optional): URLs of the character's portraits. Defaults to None.
+            display_urls (list, optional): URLs of the portraits' display-sized copies, None where there isn't one. Defaults to None.
+            created (float, optional): When the character was created. Defaults to now.
+            updated (float, optional): When the character was last saved. Defaults to now.
+        """
+        now = time.time()
+        row = (
+            character_id,
+            str(character.get("name", "")),
+            str(character.get("class", "")),
+            str(character.get("race", "")),
+            parse_int(character.get("level")),
+            sheet_url,
+            pdf_url,
+            None if portrait_urls is None else json.dumps(portrait_urls),
+            None if display_urls is None else json.dumps(display_urls),
+            created if created is not None else now,
+            updated if updated is not None else now,
+        )
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    f"""
+                    INSERT INTO characters ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, COALESCE(?, '[]'), COALESCE(?, '[]'), ?, ?)
+                    ON CONFLICT (id) DO UPDATE SET
+                        name = excluded.name,
+                        class = excluded.class,
+                        race = excluded.race,
+                        level = excluded.level,
+                        sheet_url = COALESCE(?, sheet_url),
+                        pdf_url = COALESCE(?, pdf_url),
+                        portrait_urls = COALESCE(?, portrait_urls),
+                        display_urls = COALESCE(?, display_urls),
+                        updated = excluded.updated
+                    """,
+                    row + (sheet_url, pdf_url, row[7], row[8])
+                )
+
+    def get(self, character_id: str) -> CharacterRecord:
+        """
+        Look up one character.
+
+        Args:
+            character_id (str): The character ID.
+
+        Returns:
+            CharacterRecord: The character, or None if it isn't indexed.
+        """
+        with self._lock:
+            row = self._connect().execute(f"SELECT {COLUMNS} FROM characters WHERE id = ?", (character_id,)).fetchone()
+        return None if row is None else self._record(row)
+
+    def query(self, name: str = None, character_class: str = None, race: str = None, min_level: int = None,
+              max_level: int = None, ids: list = None, limit: int = 24, cursor: tuple = None) -> CharacterPage:
+        """
+        List characters, newest first, with optional filters.
+
+        Pages are keyed on the last row of the previous page rather than an
+        offset, so every page is one index range scan however deep it is.
+
+        Args:
+            name (str, optional): Only characters whose name contains this, ignoring case. Defaults to None.
+            character_class (str, optional): Only characters of this class. Defaults to None.
+            race (str, optional): Only characters of this race. Defaults to None.
+            min_level (int, optional): Only characters of at least this level. Defaults to None.
+            max_level (int, optional): Only characters of at most this level. Defaults to None.
+            ids (list, optional): Only characters with these IDs. Defaults to None.
+            limit (int, optional): The page size. Defaults to 24.
+            cursor (tuple, optional): The `next_cursor` of the previous page. Defaults to None, the first page.
+
+        Returns:
+            CharacterPage: The page of characters.
+        """
+        where, params = self._filters(name, character_class, race, min_level, max_level, ids)
+        if cursor is not None:
+            where.append("(created, id) < (?, ?)")
+            params.extend(cursor)
+        sql = f"SELECT {COLUMNS} FROM characters"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created DESC, id DESC LIMIT ?"
+        with self._lock:
+            rows = self._connect().execute(sql, params + [limit + 1]).fetchall()
+        records = [self._record(row) for row in rows[:limit]]
+        next_cursor = (records[-1].created, records[-1].id) if len(rows) > limit else None
+        return CharacterPage(records, next_cursor)
+
+    def count(self, name: str = None, character_class: str = None, race: str = None, min_level: int = None,
+              max_level: int = None, ids: list = None) -> int:
+        """
+        Count the characters matching the filters.
+
+        Args:
+            name (str, optional): Only characters whose name contains this, ignoring case. Defaults to None.
+            character_class (str, optional): Only characters of this class. Defaults to None.
+            race (str, optional): Only characters of this race. Defaults to None.
+            min_level (int, optional): Only characters of at least this level. Defaults to None.
+            max_level (int, optional): Only characters of at most this level. Defaults to None.
+            ids (list, optional): Only characters with these IDs. Defaults to None.
+
+        Returns:
+            int: The number of matching characters.
+        """
+        where, params = self._filters(name, character_class, race, min_level, max_level, ids)
+        sql = "SELECT COUNT(*) FROM characters" + (" WHERE " + " AND ".join(where) if where else "")
+        with self._lock:
+            return self._connect().execute(sql, params).fetchone()[0]
+
+    def options(self, column: str) -> list:
+        """
+        List the distinct values of a filterable column.
+
+        Args:
+            column (str): "class" or "race".
+
+        Returns:
+            list: The values, sorted.
+        """
+        if column not in ("class", "race"):
+            raise ValueError(f"Can't list options for {column}")
+        with self._lock:
+            rows = self._connect().execute(f"SELECT DISTINCT {column} FROM characters WHERE {column} != '' ORDER BY {column}").fetchall()
+        return [row[0] for row in rows]
+
+    def _filters(self, name, character_class, race, min_level, max_level, ids) -> tuple:
+        where, params = [], []
+        if name:
+            escaped = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            where.append("name LIKE ? ESCAPE '\\'")
+            params.append(f"%{escaped}%")
+        if character_class:
+            where.append("class = ?")
+            params.append(character_class)
+        if race:
+            where.append("race = ?")
+            params.append(race)
+        if min_level is not None:
+            where.append("level >= ?")
+            params.append(min_level)
+        if max_level is not None:
+            where.append("level <= ?")
+            params.append(max_level)
+        if ids is not None:
+            where.append(f"id IN ({', '.join('?' * len(ids))})" if ids else "0")
+            params.extend(ids)
+        return where, params
+
+    def _record(self, row: tuple) -> CharacterRecord:
+        return CharacterRecord(*row[:7], json.loads(row[7]), json.loads(row[8]), *row[9:])
+
+    def backfill(self, objects: list, read, max_workers: int = 16) -> int:
+        """
+        Index every character found in a listing of the bucket.
+
+        Objects are grouped by their `sheets/{character_id}/` folder; each
+        character needs its final `{name}.json`, and its PDF, portraits and
+        their display-sized copies are picked up when present. Characters already indexed are updated.
+
+        Args:
+            objects (list): (key, last modified timestamp) pairs for the objects under `sheets/`.
+            read (callable): Returns the bytes of the object with the given key.
+            max_workers (int, optional): How many sheets to read at once. Defaults to 16.
+
+        Returns:
+            int: The number of characters indexed.
+        """
+        folders = defaultdict(list)
+        for key, modified in objects:
+            parts = key.split("/")
+            if len(parts) == 3 and parts[0] == "sheets":
+                folders[parts[1]].append((parts[2], key, modified))
+
+        def index_folder(character_id, files):
+            sheets = [key for _, key, _ in files if is_character_sheet_key(key)]
+            if not sheets:
+                return False
+            character = decode_json_body(read(sheets[0]))
+            pdfs = [key for filename, key, _ in files if filename.endswith(".pdf")]
+            keys = {key for _, key, _ in files}
+            portraits = sorted(
+                (parse_int(filename[len("portrait_"):-len(".png")]) or 0, key)
+                for filename, key, _ in files if filename.startswith("portrait_") and filename.endswith(".png")
+            )
+            display_keys = [portrait_display_s3_key(character_id, portrait_num) for portrait_num, _ in portraits]
+            modified = [modified for _, _, modified in files]
+            self.upsert(
+                character_id,
+                character,
+                sheet_url=f"{CLOUDFRONT_URL}/{sheets[0]}",
+                pdf_url=f"{CLOUDFRONT_URL}/{pdfs[0]}".replace(" ", "%20") if pdfs else None,
+                portrait_urls=[f"{CLOUDFRONT_URL}/{key}" for _, key in portraits],
+                display_urls=[f"{CLOUDFRONT_URL}/{key}" if key in keys else None for key in display_keys],
+                created=min(modified),
+                updated=max(modified),
+            )
+            return True
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return sum(executor.map(lambda folder: index_folder(*folder), folders.items()))
+
+
+def s3_objects(prefix: str = "sheets/") -> list:
+    """
+    List the objects in the bucket.
+
+    Args:
+        prefix (str, optional): The S3 prefix to list. Defaults to "sheets/".
+
+    Returns:
+        list: (key, last modified timestamp) pairs.
+    """
+    objects = []
+    for page in get_s3_client().get_paginator("list_objects_v2").paginate(Bucket=S3_BUCKET_NAME, Prefix=prefix):
+        for item in page.get("Contents", []):
+            objects.append((item["Key"], item["LastModified"].timestamp()))
+    return objects
+
+
+def read_s3_object(s3_key: str) -> bytes:
+    """
+    Download an object from the bucket.
+
+    Args:
+        s3_key (str): The object's key.
+
+    Returns:
+        bytes: The object body.
+    """
+    return get_s3_client().get_object(Bucket=S3_BUCKET_NAME, Key=s3_key)["Body"].read()
+
+
+def directory_objects(directory: str) -> list:
+    """
+    List the objects in a local copy of the bucket, e.g. made with `aws s3 sync`.
+
+    Args:
+        directory (str): The directory holding the `sheets/` folder.
+
+    Returns:
+        list: (key, last modified timestamp) pairs, keys relative to the directory.
+    """
+    objects = []
+    for root, _, filenames in os.walk(os.path.join(directory, "sheets")):
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            objects.append((os.path.relpath(path, directory).replace(os.sep, "/"), os.path.getmtime(path)))
+    return objects
+
+
+def read_file(directory: str, key: str) -> bytes:
+    """
+    Read an object from a local copy of the bucket.
+
+    Args:
+        directory (str): The directory holding the `sheets/` folder.
+        key (str): The object's key.
+
+    Returns:
+        bytes: The file's contents.
+    """
+    with open(os.path.join(directory, key), "rb") as f:
+        return f.read()
+
+
+def parse_args(argv: list = None) -> argparse.Namespace:
+    """
+    Parse the command line arguments.
+
+    Args:
+        argv (list, optional): The arguments to parse. Defaults to sys.argv[1:].
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(prog="python -m character_creator.index", description="Index every character already saved to S3.")
+    parser.add_argument("--directory", help="Read a local copy of the bucket from this directory instead of S3.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Sheets read at once (default: 16).")
+    return parser.parse_args(argv)
+
+
+def main(argv: list = None) -> int:
+    """
+    Entry point for the backfill CLI.
+
+    Args:
+        argv (list, optional): The arguments to parse. Defaults to sys.argv[1:].
+
+    Returns:
+        int: The process exit code.
+    """
+    args = parse_args(argv)
+    start = time.perf_counter()
+    if args.directory:
+        indexed = character_index.backfill(
+            directory_objects(args.directory), functools.partial(read_file, args.directory), max_workers=args.concurrency
+        )
+    else:
+        indexed = character_index.backfill(s3_objects(), read_s3_object, max_workers=args.concurrency)
+    print(f"Indexed {indexed} characters into {character_index.path} in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return 0
+
+
+character_index = CharacterIndex(CHARACTER_INDEX_FILE)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""
+Background generation jobs.
+
+Streamlit sessions submit a generation and get a job ID back straight away;
+the work runs on a shared worker pool and its progress is written to a job
+store the page polls. Jobs outlive the session that submitted them, so a
+dropped websocket or a page change doesn't lose the result, and the pool
+size rather than the number of open browsers bounds how many generations
+run at once.
+"""
+import copy
+import time
+import threading
+from uuid import uuid4
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+from character_creator.config import JOB_WORKERS, JOB_RETENTION_SECONDS
+from character_creator.pipeline import generate_character
+from character_creator.sheet import CharacterSheet
+from character_creator.warm_pool import warm_pool, is_empty_character
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class Job:
+    """
+    The state of one generation job.
+    """
+
+    def __init__(self, job_id: str):
+        self.id = job_id
+        self.status = QUEUED
+        self.stage = "Waiting for a free worker..."
+        self.fields = {}
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in (QUEUED, RUNNING)
+
+    def expired(self, retention_seconds: int, now: float) -> bool:
+        return self.finished is not None and self.finished < now - retention_seconds
+
+
+class JobStore:
+    """
+    Thread-safe store of job state, written by workers and read by pages.
+
+    Finished jobs are kept for `retention_seconds` so a session that comes
+    back late, or reconnects with the job ID from its URL, can still pick up
+    its result. After that they expire, whether or not they were collected.
+    """
+
+    def __init__(self, retention_seconds: int = JOB_RETENTION_SECONDS):
+        self.retention_seconds = retention_seconds
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self) -> Job:
+        """
+        Create a new queued job.
+
+        Returns:
+            Job: The new job.
+        """
+        job = Job(str(uuid4()))
+        with self._lock:
+            self._purge()
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Job:
+        """
+        Get a snapshot of a job.
+
+        Args:
+            job_id (str): The job ID.
+
+        Returns:
+            Job: A copy of the job's current state, or None if it's unknown or expired.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.expired(self.retention_seconds, time.time()):
+                return None
+            return self._snapshot(job)
+
+    def update(self, job_id: str, **changes) -> None:
+        """
+        Update a job's state.
+
+        Args:
+            job_id (str): The job ID.
+            **changes: Attributes to set, e.g. status or stage.
+        """
+        with self._lock:
+            job = self._jobs[job_id]
+            for name, value in changes.items():
+                setattr(job, name, value)
+            if not job.active and job.finished is None:
+                job.finished = time.time()
+
+    def add_field(self, job_id: str, key: str, value) -> None:
+        """
+        Record a streamed character field.
+
+        Args:
+            job_id (str): The job ID.
+            key (str): The field name.
+            value: The field value.
+        """
+        with self._lock:
+            self._jobs[job_id].fields[key] = value
+
+    def counts(self) -> dict:
+        """
+        Count the jobs in each status.
+
+        Returns:
+            dict: Status to number of jobs.
+        """
+        with self._lock:
+            counts = dict.fromkeys((QUEUED, RUNNING, DONE, FAILED), 0)
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return counts
+
+    def _snapshot(self, job: Job) -> Job:
+        snapshot = copy.copy(job)
+        snapshot.fields = dict(job.fields)
+        return snapshot
+
+    def _purge(self) -> None:
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items() if job.expired(self.retention_seconds, now)]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+class JobQueue:
+    """
+    Runs generation jobs on a fixed-size worker pool.
+    """
+
+    def __init__(self, store: JobStore, max_workers: int = JOB_WORKERS):
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="generation")
+        self._cancel_events = {}
+        self._lock = threading.Lock()
+
+    def submit(self, character: Mapping, stream_fields: bool = False, **kwargs) -> str:
+        """
+        Queue a character generation.
+
+        A completely empty sheet is served straight from the warm pool when it
+        has a character ready, finishing the job immediately.
+
+        Args:
+            character (Mapping): The (possibly partial) character sheet, a CharacterSheet or dict.
+            stream_fields (bool, optional): Whether to record each field as it's generated. Defaults to False.
+            **kwargs: Passed on to generate_character, e.g. num_portraits or previous.
+
+        Returns:
+            str: The job ID to poll.
+        """
+        job = self.store.create()
+        if is_empty_character(character):
+            result = warm_pool.take(kwargs.get("num_portraits", 1))
+            if result is not None:
+                self.store.update(job.id, status=DONE, stage="Done", result=result)
+                return job.id
+        with self._lock:
+            self._cancel_events[job.id] = threading.Event()
+        # Sheets are immutable, so this snapshots a dict but passes a sheet through as is
+        self._executor.submit(self._run, job.id, CharacterSheet.from_dict(character), stream_fields, kwargs)
+        return job.id
+
+    def cancel(self, job_id: str) -> None:
+        """
+        Give up on a job. Its ChatGPT request is stopped unless another job is waiting on the same one.
+
+        Args:
+            job_id (str): The job ID.
+        """
+        with self._lock:
+            cancelled = self._cancel_events.get(job_id)
+        if cancelled is not None:
+            cancelled.set()
+
+    def _run(self, job_id: str, character: CharacterSheet, stream_fields: bool, kwargs: dict) -> None:
+        with self._lock:
+            cancelled = self._cancel_events[job_id]
+        try:
+            if cancelled.is_set():
+                raise CancelledError()
+            self.store.update(job_id, status=RUNNING, stage="Starting...")
+            on_field = (lambda key, value: self.store.add_field(job_id, key, value)) if stream_fields else None
+            result = generate_character(
+                character,
+                on_field=on_field,
+                on_progress=lambda stage: self.store.update(job_id, stage=stage),
+                cancelled=cancelled,
+                **kwargs
+            )
+        except CancelledError:
+            self.store.update(job_id, status=FAILED, error="Character generation was cancelled.")
+            return
+        except Exception as e:
+            print(f"Generation job {job_id} failed: {e}")
+            self.store.update(job_id, status=FAILED, error=str(e))
+            return
+        finally:
+            with self._lock:
+                del self._cancel_events[job_id]
+        self.store.update(job_id, status=DONE, stage="Done", result=result)
+
+job_store = JobStore()
+job_queue = JobQueue(job_store)
@@ -0,0 +1,235 @@
+"""
+In-process metrics for the generation pipeline.
+
+Stages are timed with `metrics.span(stage)` into a latency histogram per
+stage, and OpenAI token usage is counted per stage. Everything can be
+exported in the Prometheus text format or summarised as percentiles.
+
+Example:
+    with metrics.span("chat_completion"):
+        response = client.chat.completions.create(...)
+    metrics.record_usage("chat_completion", response.usage)
+"""
+import time
+import bisect
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+METRICS_PREFIX = "character_creator"
+# Pipeline stages range from milliseconds (prompt build) to minutes (chat completion)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+TOKEN_KINDS = ("prompt_tokens", "completion_tokens")
+
+
+class Histogram:
+    """
+    Prometheus-style cumulative histogram that also keeps the most recent
+    samples, so percentiles can be computed exactly over a sliding window.
+    """
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS, max_samples: int = 1024):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=max_samples)
+
+    def observe(self, value: float) -> None:
+        """
+        Record one observation.
+
+        Args:
+            value (float): The observed value.
+        """
+        idx = bisect.bisect_left(self.buckets, value)
+        if idx < len(self.buckets):
+            self.bucket_counts[idx] += 1
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+
+    def percentile(self, q: float) -> float:
+        """
+        Nearest-rank percentile of the recent samples.
+
+        Args:
+            q (float): The percentile, between 0 and 100.
+
+        Returns:
+            float: The percentile, or None if nothing has been observed.
+        """
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        rank = max(1, -(-len(ordered) * q // 100))
+        return ordered[int(rank) - 1]
+
+
+def format_labels(labels: tuple) -> str:
+    """
+    Format a label set for the Prometheus text format.
+
+    Args:
+        labels (tuple): Sorted (name, value) pairs.
+
+    Returns:
+        str: e.g. '{stage="pdf_render"}', or '' for no labels.
+    """
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store of labelled counters and histograms.
+    """
+
+    def __init__(self, prefix: str = METRICS_PREFIX):
+        self.prefix = prefix
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, amount: float = 1, **labels) -> None:
+        """
+        Add to a counter.
+
+        Args:
+            name (str): The metric name, without the prefix.
+            amount (float, optional): How much to add. Defaults to 1.
+            **labels: The metric's labels.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """
+        Record an observation in a histogram.
+
+        Args:
+            name (str): The metric name, without the prefix.
+            value (float): The observed value.
+            **labels: The metric's labels.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, stage: str):
+        """
+        Time a pipeline stage. Failures are counted as stage errors and re-raised; cancellations aren't failures.
+
+        Args:
+            stage (str): The stage name, e.g. "chat_completion".
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.increment("stage_errors_total", stage=stage)
+            raise
+        finally:
+            self.observe("stage_duration_seconds", time.perf_counter() - start, stage=stage)
+
+    def record_usage(self, stage: str, usage) -> None:
+        """
+        Count the tokens used by an OpenAI response.
+
+        Args:
+            stage (str): The stage that made the request.
+            usage: The response's `usage` object; ignored if None.
+        """
+        if usage is None:
+            return
+        for kind in TOKEN_KINDS:
+            self.increment("openai_tokens_total", getattr(usage, kind, 0) or 0, stage=stage, kind=kind.split("_")[0])
+
+    def counter_value(self, name: str, **labels) -> float:
+        """
+        Get a counter's current value.
+
+        Args:
+            name (str): The metric name, without the prefix.
+            **labels: The metric's labels.
+
+        Returns:
+            float: The value, 0 if it was never incremented.
+        """
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def stage_summary(self) -> list:
+        """
+        Summarise the stage latencies.
+
+        Returns:
+            list: One dict per stage with its count, error count, mean and p50/p95/p99 in seconds.
+        """
+        rows = []
+        with self._lock:
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                if name != "stage_duration_seconds":
+                    continue
+                stage = dict(labels)["stage"]
+                rows.append({
+                    "stage": stage,
+                    "count": histogram.count,
+                    "errors": self._counters.get(("stage_errors_total", (("stage", stage),)), 0),
+                    "mean": histogram.sum / histogram.count,
+                    "p50": histogram.percentile(50),
+                    "p95": histogram.percentile(95),
+                    "p99": histogram.percentile(99),
+                })
+        return rows
+
+    def export_prometheus(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics text.
+        """
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                metric = f"{self.prefix}_{name}"
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} counter")
+                    typed.add(metric)
+                lines.append(f"{metric}{format_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                metric = f"{self.prefix}_{name}"
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} histogram")
+                    typed.add(metric)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{format_labels(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{metric}_bucket{format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{metric}_sum{format_labels(labels)} {histogram.sum}")
+                lines.append(f"{metric}_count{format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """
+        Drop every recorded metric.
+        """
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+metrics = MetricsRegistry()
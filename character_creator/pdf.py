@@ -0,0 +1,320 @@
+"""
+PDF character sheets.
+
+The sheet's static layout (section headers, labels, fonts and the grid
+positions of every field) is compiled once, at import, into
+CHARACTER_SHEET_LAYOUT. Rendering a sheet only walks that layout and
+overlays the character's values, so many sheets can be drawn into one
+document as cheaply as into one each.
+"""
+import io
+from typing import NamedTuple
+from concurrent.futures import Future
+from fpdf import FPDF
+from fpdf.enums import XPos, YPos
+from character_creator.config import PORTRAIT_WIDTH
+from character_creator.images import print_derivative
+from character_creator.metrics import metrics
+from character_creator.storage import upload_bytes_to_s3, pdf_s3_key
+
+HEADER_COLOR = (100, 100, 100)  # Dark gray
+NAME_FONT = ("helvetica", "B", 24)
+HEADER_FONT = ("helvetica", "B", 18)
+LABEL_FONT = ("helvetica", "B", 12)
+VALUE_FONT = ("helvetica", "", 12)
+ROW_HEIGHT = 8
+# Baseline of a line of 12pt text centred in a row, as FPDF.cell() places it
+TEXT_BASELINE = 0.5 * ROW_HEIGHT + 0.3 * 12 * 25.4 / 72
+LEFT_MARGIN = 10  # FPDF's default, in mm
+
+
+class LayoutField(NamedTuple):
+    """
+    Where one character field goes on the sheet.
+    """
+    key: str
+    label: str
+    label_x: float  # Where the right-aligned label text starts
+    value_x: float  # Left edge of the value's cell
+    value_width: float
+
+
+class LayoutSection(NamedTuple):
+    """
+    A titled section of the sheet: its header and its rows of fields.
+    """
+    title: str  # None for no header
+    space_before: float
+    rows: tuple  # Tuples of LayoutField, one per row
+
+
+def field_label(name: str) -> str:
+    """
+    Format a field label the way the sheet shows it.
+
+    Args:
+        name (str): The field key or name.
+
+    Returns:
+        str: The label, e.g. "Armor class:".
+    """
+    return f"{name.replace('_', ' ').capitalize()}:"
+
+
+def layout_field(measure: FPDF, key: str, name: str, x: float, label_width: float, value_width: float) -> LayoutField:
+    """
+    Place a field, right-aligning its label in a cell of `label_width`.
+
+    Args:
+        measure (FPDF): A document set to the label font, for measuring text.
+        key (str): The character field key.
+        name (str): The name to label it with.
+        x (float): The left edge of the label's cell.
+        label_width (float): The width of the label's cell.
+        value_width (float): The width of the value's cell.
+
+    Returns:
+        LayoutField: The field's position.
+    """
+    label = field_label(name)
+    label_x = x + label_width - measure.c_margin - measure.get_string_width(label)
+    return LayoutField(key, label, label_x, x + label_width, value_width)
+
+
+def grid_rows(measure: FPDF, fields: list) -> tuple:
+    """
+    Lay short fields out two to a row.
+
+    Args:
+        measure (FPDF): A document set to the label font, for measuring text.
+        fields (list): (key, label name) pairs.
+
+    Returns:
+        tuple: The rows of LayoutFields.
+    """
+    cells = [
+        layout_field(measure, key, name, LEFT_MARGIN + (idx % 2) * 90, 45, 45)
+        for idx, (key, name) in enumerate(fields)
+    ]
+    return tuple(tuple(cells[idx:idx + 2]) for idx in range(0, len(cells), 2))
+
+
+def full_rows(measure: FPDF, fields: list) -> tuple:
+    """
+    Lay long fields out one to a row, across the page.
+
+    Args:
+        measure (FPDF): A document set to the label font, for measuring text.
+        fields (list): (key, label name) pairs.
+
+    Returns:
+        tuple: The rows of LayoutFields.
+    """
+    return tuple((layout_field(measure, key, name, LEFT_MARGIN, 50, 140),) for key, name in fields)
+
+
+def compile_layout() -> tuple:
+    """
+    Build the character sheet layout.
+
+    Returns:
+        tuple: The LayoutSections, in page order.
+    """
+    measure = FPDF()
+    measure.set_font(*LABEL_FONT)
+    skills = ["Acrobatics", "Animal Handling", "Arcana", "Athletics", "Deception", "History", "Insight", "Intimidation", "Investigation", "Medicine", "Nature", "Perception", "Performance", "Persuasion", "Religion", "Sleight of Hand", "Stealth", "Survival"]
+    basic_info_keys = ['level', 'pronouns', 'orientation', 'race', 'class', 'alignment', 'background', 'age', 'height', 'weight', 'eyes', 'skin', 'hair', 'experience_points']
+    stats_keys = ['armor_class', 'hit_points', 'speed', 'strength', 'dexterity', 'constitution', 'intelligence', 'wisdom', 'charisma', 'passive_wisdom_perception', 'inspiration', 'proficiency_bonus']
+    throws_keys = ['strength_save', 'dexterity_save', 'constitution_save', 'intelligence_save', 'wisdom_save', 'charisma_save']
+    trait_keys = ['personality_traits', 'ideals', 'bonds', 'flaws', 'character_appearance', 'character_backstory']
+    return (
+        LayoutSection(None, 0, full_rows(measure, [("description", "description")])),
+        LayoutSection("Basic Info", 0, grid_rows(measure, [(key, key) for key in basic_info_keys])),
+        LayoutSection("Character Stats", 10, grid_rows(measure, [(key, key) for key in stats_keys])),
+        LayoutSection("Saving Throws", 10, grid_rows(measure, [(key, key) for key in throws_keys])),
+        LayoutSection("Skills", 10, grid_rows(measure, [(f"skills_{skill.lower().replace(' ', '_')}", skill) for skill in skills])),
+        LayoutSection("Proficiencies & Languages", 10, full_rows(measure, [("languages", "Languages"), ("proficiencies", "Proficiencies")])),
+        LayoutSection("Character Traits", 10, full_rows(measure, [(key, key) for key in trait_keys])),
+        LayoutSection("Features & Traits", 10, full_rows(measure, [("features_traits", "Features & Traits")])),
+        LayoutSection("Equipment & Treasure", 10, full_rows(measure, [("equipment", "Equipment"), ("treasure", "Treasure")])),
+        LayoutSection("Attacks & Spellcasting", 10, full_rows(measure, [
+            ("attacks_spellcasting", "Details"),
+            ("spellcasting_ability", "Spellcasting Ability"),
+            ("spell_save_dc", "Spell Save DC"),
+            ("spell_attack_bonus", "Spell Attack Bonus"),
+        ])),
+        LayoutSection("Spells Known", 10, full_rows(measure, [(f"{level}_level_spells", f"{level} Level Spells") for level in range(1, 10)])),
+    )
+
+
+CHARACTER_SHEET_LAYOUT = compile_layout()
+
+
+def use_font(pdf: FPDF, font: tuple) -> None:
+    """
+    Switch fonts, skipping the (surprisingly slow) call when nothing changes.
+
+    Args:
+        pdf (FPDF): The document.
+        font (tuple): (family, style, size).
+    """
+    if (pdf.font_family, pdf.font_style, pdf.font_size_pt) != font:
+        pdf.set_font(*font)
+
+
+def draw_row(pdf: FPDF, row: tuple, character: dict) -> None:
+    """
+    Draw one row of fields, leaving the cursor at the start of the next row.
+
+    Labels and values that fit on one line are placed directly at their
+    precomputed positions, which is far cheaper than FPDF.cell(); only longer
+    values go through line breaking.
+
+    Args:
+        pdf (FPDF): The document.
+        row (tuple): The row's LayoutFields.
+        character (dict): The character data, already made safe for the core fonts.
+    """
+    if pdf.get_y() + ROW_HEIGHT > pdf.page_break_trigger:
+        pdf.add_page()
+    page, y = pdf.page, pdf.get_y()
+    baseline = y + TEXT_BASELINE
+
+    use_font(pdf, LABEL_FONT)
+    for field in row:
+        pdf.text(field.label_x, baseline, field.label)
+
+    use_font(pdf, VALUE_FONT)
+    bottom = (page, y + ROW_HEIGHT)
+    for field in row:
+        value = character[field.key]
+        if "\n" not in value and pdf.get_string_width(value) <= field.value_width - 2 * pdf.c_margin:
+            if value:
+                pdf.text(field.value_x + pdf.c_margin, baseline, value)
+            continue
+        pdf.page = page
+        pdf.set_xy(field.value_x, y)
+        pdf.multi_cell(field.value_width, ROW_HEIGHT, text=value, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        # Long values can run onto the next page
+        bottom = max(bottom, (pdf.page, pdf.get_y()))
+    pdf.page = bottom[0]
+    pdf.set_xy(pdf.l_margin, bottom[1])
+
+
+def draw_character_sheet(pdf: FPDF, character: dict, portraits: list) -> None:
+    """
+    Draw a character sheet into a document, starting on a new page.
+
+    Space for the portraits is reserved up front and the text sections are laid
+    out before the portraits are placed, so portraits that are still being
+    generated can be passed in as futures. Portraits are embedded from their
+    in-memory bytes as print-resolution JPEGs.
+
+    Args:
+        pdf (FPDF): The document.
+        character (dict): The character data to be used in the character sheet.
+        portraits (list): List of Portrait tuples for the character portraits, or futures resolving to them.
+    """
+    # Make sure all values of character are strings the PDF core fonts can encode
+    character = {k: v if isinstance(v, str) and v.isascii() else str(v).encode("latin-1", "replace").decode("latin-1") for k, v in character.items()}
+    for level in range(1, 10):
+        character[f"{level}_level_spells"] = character.get(f"{level}_level_spells") or "N/A"
+
+    pdf.add_page()
+
+    # Character Name as Header
+    use_font(pdf, NAME_FONT)
+    pdf.cell(0, 20, text=character['name'], align='C', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    # Portraits: reserve a centered slot for each one, they are placed in once the text is laid out
+    portrait_slots = []
+    for _ in portraits:
+        if pdf.get_y() + PORTRAIT_WIDTH > pdf.page_break_trigger:
+            pdf.add_page()
+        portrait_slots.append((pdf.page, pdf.get_y()))
+        pdf.ln(PORTRAIT_WIDTH + 5)
+
+    for section in CHARACTER_SHEET_LAYOUT:
+        if section.title:
+            if section.space_before:
+                pdf.ln(section.space_before)
+            pdf.set_fill_color(*HEADER_COLOR)
+            use_font(pdf, HEADER_FONT)
+            pdf.cell(0, 10, text=section.title, fill=True, align='L', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        for row in section.rows:
+            draw_row(pdf, row, character)
+
+    # Place the portraits into their reserved slots as they arrive
+    last_page = pdf.page
+    for portrait, (page, y) in zip(portraits, portrait_slots):
+        try:
+            if isinstance(portrait, Future):
+                with metrics.span("portrait_wait"):
+                    portrait = portrait.result()
+            pdf.page = page
+            pdf.image(io.BytesIO(print_derivative(portrait.data, PORTRAIT_WIDTH)), x=60, y=y, w=PORTRAIT_WIDTH, h=PORTRAIT_WIDTH)
+        except Exception as e:
+            print(f"Error adding portrait to PDF: {e}")
+    pdf.page = last_page
+
+
+def render_pdf_character_sheet(character: dict, portraits: list) -> bytes:
+    """
+    Render a PDF character sheet based on the provided character data.
+
+    Args:
+        character (dict): The character data to be used in the character sheet.
+        portraits (list): List of Portrait tuples for the character portraits, or futures resolving to them.
+
+    Returns:
+        bytes: The rendered PDF.
+    """
+    pdf = FPDF()
+    draw_character_sheet(pdf, character, portraits)
+    return bytes(pdf.output())
+
+
+def render_party_packet(characters: list, portraits: list = None, output=None) -> bytes:
+    """
+    Render many characters into one PDF, each starting on a new page.
+
+    The whole packet is laid out in a single pass and written out once, and a
+    portrait shared between characters is only embedded once.
+
+    Args:
+        characters (list): The characters' data.
+        portraits (list, optional): One list of Portrait tuples or futures per character. Defaults to no portraits.
+        output (optional): A binary file-like object to stream the PDF to. Defaults to None.
+
+    Returns:
+        bytes: The rendered PDF, or None if it was written to `output`.
+    """
+    pdf = FPDF()
+    with metrics.span("pdf_packet_render"):
+        for idx, character in enumerate(characters):
+            draw_character_sheet(pdf, character, portraits[idx] if portraits else [])
+    if output is None:
+        return bytes(pdf.output())
+    pdf.output(output)
+    return None
+
+
+def create_pdf_character_sheet(character_id: str, character: dict, portraits: list, writer=None) -> str:
+    """
+    Create a PDF character sheet and upload it to S3.
+
+    Args:
+        character_id (str): The ID of the character for filename generation.
+        character (dict): The character data to be used in the character sheet.
+        portraits (list): List of Portrait tuples for the character portraits, or futures resolving to them.
+        writer (ArtifactWriter, optional): Batches the upload with the character's other objects. Defaults to None.
+
+    Returns:
+        str: The URL for the uploaded file.
+    """
+    s3_key = pdf_s3_key(character_id, character)
+    with metrics.span("pdf_render"):
+        pdf_bytes = render_pdf_character_sheet(character, portraits)
+    if writer is not None:
+        return writer.put(s3_key, pdf_bytes, "application/pdf")
+    return upload_bytes_to_s3(pdf_bytes, s3_key, "application/pdf")
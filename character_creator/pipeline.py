@@ -0,0 +1,720 @@
+import sys
+import copy
+import json
+import random
+import threading
+from uuid import uuid4
+from functools import lru_cache
+from typing import NamedTuple
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+from character_creator.config import (
+    CHAT_MODEL, MAX_TOKENS, PROMPT_EXAMPLES, REPAIR_ATTEMPTS,
+    REPAIR_TOKENS_PER_FIELD, RESPONSE_CACHE_DIRECTORY, RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_TTL_SECONDS, PORTRAIT_WORKERS, OPENAI_MAX_CONCURRENCY, CLASS_LIST, RACE_LIST, DEBUG
+)
+from character_creator.clients import get_openai_client, get_http_session
+from character_creator.cache import ResponseCache, make_cache_key
+from character_creator.metrics import metrics
+from character_creator.ratelimit import chat_limiter, image_limiter
+from character_creator.hedging import HedgeCancelled, chat_hedge_policy, hedged_call
+from character_creator.singleflight import SingleFlight
+from character_creator.templates import CharacterTemplates, template_registry
+from character_creator.sheet import CharacterSheet
+from character_creator.streaming import IncrementalJSONObjectParser
+from character_creator.prompts import PromptAssembler
+from character_creator.storage import (
+    upload_bytes_to_s3, character_json_s3_key, character_json_bytes, portrait_s3_key, portrait_display_s3_key, s3_url
+)
+from character_creator.images import display_derivative, display_content_type, display_cache
+from character_creator.artifacts import ArtifactWriter
+from character_creator.index import character_index
+from character_creator.validation import check_character_sheet
+from character_creator.pdf import create_pdf_character_sheet
+
+# Process-wide shared state, reused across Streamlit sessions and CLI workers
+response_cache = ResponseCache(
+    RESPONSE_CACHE_DIRECTORY,
+    max_disk_bytes=RESPONSE_CACHE_MAX_BYTES,
+    ttl_seconds=RESPONSE_CACHE_TTL_SECONDS
+)
+portrait_executor = ThreadPoolExecutor(max_workers=PORTRAIT_WORKERS, thread_name_prefix="portrait")
+# Hedged chat requests run here, two per generation at most
+hedge_executor = ThreadPoolExecutor(max_workers=2 * OPENAI_MAX_CONCURRENCY, thread_name_prefix="hedge")
+character_flight = SingleFlight("character_data")
+portrait_flight = SingleFlight("portrait")
+
+
+class Portrait(NamedTuple):
+    """
+    A generated portrait: where it was uploaded, the image itself and its display-sized copy.
+    """
+    url: str
+    data: bytes
+    display_url: str = None
+
+
+def character_name_to_id(character_name: str) -> str:
+    """
+    Convert a character name to a unique ID.
+
+    Args:
+        character_name (str): The name of the character.
+
+    Returns:
+        str: The unique ID of the character.
+    """
+
+    return character_name.replace(" ", "_").lower() + "_" + str(uuid4())
+
+
+def get_character_age() -> int:
+    """
+    Generate a weighted random age for a character between 0 and 500 years old.
+
+    Returns:
+        int: The age of the character.
+    """
+    age_weights = [0.07, 0.1, 0.43, 0.2, 0.1, 0.05, 0.05]
+    age_choices = [
+        random.randint(1, 13), random.randint(13, 17), random.randint(18, 35),
+        random.randint(36, 50), random.randint(50, 120), random.randint(121, 1000),
+        random.randint(1001, sys.maxsize)
+    ]
+    age = random.choices(age_choices, weights=age_weights)[0]
+    return age
+
+
+def get_character_templates() -> CharacterTemplates:
+    """
+    Get the parsed character examples, reloaded only when the file changes.
+
+    Returns:
+        CharacterTemplates: The validated, read-only examples snapshot.
+    """
+    return template_registry.get()
+
+
+def get_character_examples() -> tuple:
+    """
+    Get the character examples from character_examples.json.
+
+    Returns:
+        tuple: Read-only character examples, the sheet template first.
+    """
+    return get_character_templates().examples
+
+
+def default_character() -> dict:
+    """
+    Returns a default character object with all fields set to empty strings.
+
+    Returns:
+        dict: A new default character object.
+    """
+    return dict.fromkeys(get_character_templates().keys, "")
+
+
+@lru_cache(maxsize=4)
+def get_prompt_assembler(examples_digest: str) -> PromptAssembler:
+    """
+    Get the prompt assembler for the current character examples file.
+
+    Args:
+        examples_digest (str): Hash of the examples file, so edits to it rebuild the assembler.
+
+    Returns:
+        PromptAssembler: The shared prompt assembler.
+    """
+    return PromptAssembler(get_character_templates().examples, k=PROMPT_EXAMPLES, model=CHAT_MODEL)
+
+
+def character_cache_key(character: dict) -> str:
+    """
+    Build the response cache key for a character generation request.
+
+    Args:
+        character (dict): Dictionary containing character attributes.
+
+    Returns:
+        str: The cache key for the request.
+    """
+    return make_cache_key(character, get_character_templates().digest, CHAT_MODEL, MAX_TOKENS)
+
+
+def get_character_data(character: dict, use_cache: bool = True, on_field=None, cancelled: threading.Event = None,
+                       cache_key: str = None) -> dict:
+    """
+    Query the ChatGPT API to fill out missing character data based on provided data.
+
+    When `on_field` is given the completion is streamed and `on_field(key, value)` is
+    called for each top-level field as soon as it has been generated. The returned
+    character is the same either way. Identical requests that arrive while one is
+    already in flight share its completion instead of making their own, and the
+    completion is stopped if every one of them is cancelled.
+    
+    Args:
+        character (dict): Dictionary containing character attributes.
+        use_cache (bool, optional): Whether to serve a previously generated sheet for the same input. Defaults to True.
+        on_field (callable, optional): Callback for each completed field, enables streaming. Defaults to None.
+        cancelled (threading.Event, optional): Set to give up on the request, raising CancelledError. Defaults to None.
+        cache_key (str, optional): The response cache key. Defaults to the key of `character`; pass the key of
+            the sheet as submitted when random defaults have been rolled into it.
+
+    Returns:
+        dict: The generated character sheet.
+    """
+    cache_key = cache_key or character_cache_key(character)
+    if use_cache:
+        cached = response_cache.get(cache_key)
+        metrics.increment("response_cache_lookups_total", result="miss" if cached is None else "hit")
+        if cached is not None:
+            if DEBUG:
+                print(f"Response cache hit: {cache_key}")
+            if on_field:
+                for key, value in cached.items():
+                    on_field(key, value)
+            return cached
+
+    requested = []
+
+    def request(flight_cancelled):
+        requested.append(True)
+        result = request_character_data(character, on_field, flight_cancelled)
+        response_cache.set(cache_key, result)
+        return result
+
+    # A request that skips the cache mustn't be handed a completion meant for one that didn't
+    result = character_flight.do((cache_key, use_cache), request, cancelled)
+    if on_field and not requested:
+        # Another session's request was streaming, so report all the fields now
+        for key, value in result.items():
+            on_field(key, value)
+    # The result is shared with any coalesced callers, so never hand it out directly
+    return copy.deepcopy(result)
+
+
+def request_character_data(character: dict, on_field=None, cancelled: threading.Event = None) -> dict:
+    """
+    Make the ChatGPT request that fills out a character sheet.
+
+    Args:
+        character (dict): Dictionary containing character attributes.
+        on_field (callable, optional): Callback for each completed field, enables streaming. Defaults to None.
+        cancelled (threading.Event, optional): Set to stop the request, raising HedgeCancelled. Defaults to None.
+
+    Returns:
+        dict: The generated character sheet.
+    """
+    with metrics.span("prompt_build"):
+        prompt_assembler = get_prompt_assembler(get_character_templates().digest)
+        messages = prompt_assembler.build_messages(character)
+    prompt_tokens = prompt_assembler.count_tokens(messages)
+    if DEBUG:
+        print(f"Prompt input tokens: {prompt_tokens}")
+        print(f"Messages: {json.dumps(messages)}")
+    if chat_hedge_policy.enabled:
+        return hedged_character_data(messages, on_field, prompt_tokens + MAX_TOKENS, cancelled)
+    if on_field:
+        return stream_character_data(messages, on_field, prompt_tokens + MAX_TOKENS, cancelled=cancelled)
+
+    def request():
+        if cancelled is not None and cancelled.is_set():
+            raise HedgeCancelled()
+        with metrics.span("chat_completion"):
+            return get_openai_client().chat.completions.create(
+                model=CHAT_MODEL,
+                messages=messages,
+                max_tokens=MAX_TOKENS,
+                response_format={ "type": "json_object" }
+            )
+
+    response = chat_limiter.call(request, tokens=prompt_tokens + MAX_TOKENS)
+    metrics.record_usage("chat_completion", response.usage)
+    if DEBUG:
+        print(f"Response: {json.dumps(response)}")
+        print(f"Response for response.choices[0].message.content: {response.choices[0].message.content}")
+    result = json.loads(response.choices[0].message.content)
+    if DEBUG:
+        print(f"Result: {json.dumps(result)}")
+    return result
+
+
+def repair_character_data(character: dict, errors: list) -> dict:
+    """
+    Ask ChatGPT to regenerate only the fields that failed validation.
+
+    Args:
+        character (dict): The character sheet with some invalid fields.
+        errors (list): FieldError tuples for the offending fields.
+
+    Returns:
+        dict: The character sheet with the regenerated fields merged in.
+    """
+    prompt_assembler = get_prompt_assembler(get_character_templates().digest)
+    messages = prompt_assembler.build_repair_messages(character, errors)
+    prompt_tokens = prompt_assembler.count_tokens(messages)
+    if DEBUG:
+        print(f"Repair prompt input tokens: {prompt_tokens}")
+
+    invalid_keys = {error.key for error in errors}
+    max_tokens = min(MAX_TOKENS, REPAIR_TOKENS_PER_FIELD * len(invalid_keys))
+
+    def request():
+        with metrics.span("repair"):
+            return get_openai_client().chat.completions.create(
+                model=CHAT_MODEL,
+                messages=messages,
+                max_tokens=max_tokens,
+                response_format={ "type": "json_object" }
+            )
+
+    response = chat_limiter.call(request, tokens=prompt_tokens + max_tokens)
+    metrics.record_usage("repair", response.usage)
+    if DEBUG:
+        print(f"Repair response content: {response.choices[0].message.content}")
+    repaired = json.loads(response.choices[0].message.content)
+
+    # Only accept the fields we asked for
+    character = character.copy()
+    character.update({key: value for key, value in repaired.items() if key in invalid_keys})
+    return character
+
+
+def passes_validation(character: dict) -> bool:
+    """
+    Check whether a generated character sheet is valid as it stands, without repairs.
+
+    Args:
+        character (dict): The character sheet; left unchanged.
+
+    Returns:
+        bool: True if the sheet has no errors once its derived fields are fixed.
+    """
+    errors, _ = check_character_sheet(copy.deepcopy(character))
+    return not errors
+
+
+def hedged_character_data(messages: list, on_field=None, tokens: int = MAX_TOKENS, cancelled: threading.Event = None) -> dict:
+    """
+    Stream a character sheet completion, hedging it with a second request if it runs late.
+
+    Both requests are streamed so the loser can be stopped part way. Only
+    the first request reports its fields as they close; if the hedge wins,
+    all of its fields are reported once it's done.
+
+    Args:
+        messages (list): The chat messages to send.
+        on_field (callable, optional): Called with (key, value) for each completed top-level field. Defaults to None.
+        tokens (int, optional): The most tokens the completion can use, prompt included. Defaults to MAX_TOKENS.
+        cancelled (threading.Event, optional): Set to stop both requests, raising HedgeCancelled. Defaults to None.
+
+    Returns:
+        dict: The first character sheet to pass validation, or the first to finish if neither does.
+    """
+    hedge_results = []
+
+    def attempt(model, hedge, cancelled):
+        result = stream_character_data(messages, None if hedge else on_field, tokens, model, cancelled)
+        if hedge:
+            hedge_results.append(result)
+        return result
+
+    result = hedged_call(attempt, passes_validation, hedge_executor, cancelled=cancelled)
+    if on_field and any(result is hedge_result for hedge_result in hedge_results):
+        for key, value in result.items():
+            on_field(key, value)
+    return result
+
+
+def stream_character_data(messages: list, on_field=None, tokens: int = MAX_TOKENS, model: str = CHAT_MODEL,
+                          cancelled: threading.Event = None) -> dict:
+    """
+    Stream a character sheet completion, reporting each field as soon as it closes.
+
+    The rate limiter slot is held until the stream is consumed. If the
+    stream is retried, fields already reported are reported again.
+
+    Args:
+        messages (list): The chat messages to send.
+        on_field (callable, optional): Called with (key, value) for each completed top-level field. Defaults to None.
+        tokens (int, optional): The most tokens the completion can use, prompt included. Defaults to MAX_TOKENS.
+        model (str, optional): The chat model. Defaults to CHAT_MODEL.
+        cancelled (threading.Event, optional): Set to stop the completion part way, raising HedgeCancelled. Defaults to None.
+
+    Returns:
+        dict: The complete character sheet, parsed from the full response text.
+    """
+    def request():
+        parser, usage = IncrementalJSONObjectParser(), None
+        if cancelled is not None and cancelled.is_set():
+            raise HedgeCancelled()
+        with metrics.span("chat_completion"):
+            stream = get_openai_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=MAX_TOKENS,
+                response_format={ "type": "json_object" },
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            for chunk in stream:
+                if cancelled is not None and cancelled.is_set():
+                    # Closing the connection stops the completion, so no more of it is billed
+                    stream.close()
+                    raise HedgeCancelled()
+                # The usage arrives on a final chunk with no choices
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                for key, value in parser.feed(chunk.choices[0].delta.content):
+                    if on_field:
+                        on_field(key, value)
+        return parser, usage
+
+    parser, usage = chat_limiter.call(request, tokens=tokens, usage=lambda outcome: outcome[1])
+    metrics.record_usage("chat_completion", usage)
+    result = parser.result()
+    if DEBUG:
+        print(f"Streamed response content: {parser.buffer}")
+        print(f"Result: {json.dumps(result)}")
+    return result
+
+
+def save_dalle_image_to_s3(image_url: str, character_id: str, portrait_num: int, writer: ArtifactWriter = None) -> Portrait:
+    """
+    Saves the DALL·E generated image to the S3.
+
+    The image bytes are kept so the PDF renderer doesn't have to fetch them again.
+
+    Args:
+        image_url (str): URL of the image generated by DALL·E.
+        character_id (str): ID of the character to be used in filename.
+        portrait_num (int): The number of the portrait for this character.
+        writer (ArtifactWriter, optional): Batches the upload with the character's other objects. Defaults to None.
+
+    Returns:
+        Portrait: The URL for the uploaded file and the image bytes.
+    """
+    with metrics.span("image_download"):
+        response = get_http_session().get(image_url)
+        response.raise_for_status()
+
+    return save_portrait(response.content, character_id, portrait_num, writer)
+
+
+def save_portrait(image: bytes, character_id: str, portrait_num: int, writer: ArtifactWriter = None) -> Portrait:
+    """
+    Saves a portrait to S3 along with a display-sized copy for the app.
+
+    The display copy is also kept in memory so the form can show it without
+    fetching it back.
+
+    Args:
+        image (bytes): The full resolution PNG.
+        character_id (str): ID of the character to be used in filename.
+        portrait_num (int): The number of the portrait for this character.
+        writer (ArtifactWriter, optional): Batches the uploads with the character's other objects. Defaults to None.
+
+    Returns:
+        Portrait: The URLs for the uploaded files and the image bytes.
+    """
+    with metrics.span("display_derivative"):
+        display_image = display_derivative(image)
+
+    uploads = [
+        (portrait_s3_key(character_id, portrait_num), image, "image/png"),
+        (portrait_display_s3_key(character_id, portrait_num), display_image, display_content_type()),
+    ]
+    if writer is not None:
+        cloudfront_url, display_url = [writer.put(s3_key, data, content_type) for s3_key, data, content_type in uploads]
+    else:
+        cloudfront_url, display_url = [upload_bytes_to_s3(data, s3_key, content_type) for s3_key, data, content_type in uploads]
+
+    display_cache.put(display_url, display_image)
+    return Portrait(cloudfront_url, image, display_url)
+
+
+def generate_portrait(prompt: str, character_id: str, portrait_num: int, writer: ArtifactWriter = None) -> Portrait:
+    """
+    Generate a portrait based on the prompt using DALL-E and save it to S3.
+    
+    Args:
+        prompt (str): The prompt for DALL-E to generate an image.
+        character_id (str): The ID of the character for filename generation.
+        portrait_num (int): The number of the portrait for this character.
+        writer (ArtifactWriter, optional): Batches the upload with the character's other objects. Defaults to None.
+
+    Returns:
+        Portrait: The URL where the portrait is saved and the image bytes.
+    """
+    def request():
+        with metrics.span("image_generation"):
+            return get_openai_client().images.generate(
+                model="dall-e-3",
+                prompt=prompt,
+                size="1024x1024",
+                quality="hd",
+                n=1,
+            )
+
+    # Coalesced sheets share a portrait prompt, so share the DALL·E call too
+    response = portrait_flight.do((prompt, portrait_num), lambda cancelled: image_limiter.call(request))
+
+    image_url = response.data[0].url
+    
+    return save_dalle_image_to_s3(image_url, character_id, portrait_num, writer)
+
+
+class GenerationError(Exception):
+    """
+    Raised when a character can't be generated.
+    """
+
+
+class GenerationResult(NamedTuple):
+    """
+    Everything produced for one generated character.
+    """
+    character_id: str
+    character: dict
+    portrait_urls: list
+    display_urls: list  # Display-sized copies of the portraits, None where one couldn't be saved
+    pdf_url: str
+    errors: list
+    manifest_url: str = None
+    sheet_url: str = None
+
+
+def index_character(result: GenerationResult) -> None:
+    """
+    Record a generated character in the local index for the gallery.
+
+    Args:
+        result (GenerationResult): The generated character.
+    """
+    character_index.upsert(result.character_id, result.character, sheet_url=result.sheet_url, pdf_url=result.pdf_url,
+                           portrait_urls=result.portrait_urls, display_urls=result.display_urls)
+
+
+def fill_random_defaults(character: dict) -> dict:
+    """
+    Roll random age, level, class and race for a mostly empty character sheet.
+
+    Only applies when the whole sheet is empty, or when some of those main
+    fields are empty and nothing else has been filled in.
+
+    Args:
+        character (dict): The character sheet, updated in place.
+
+    Returns:
+        dict: The character sheet.
+    """
+    main_keys = ["age", "level", "class", "race"]
+
+    all_fields_empty = all(value == "" for value in character.values())
+    some_main_fields_empty = any(character[key] == "" for key in main_keys)
+    all_non_main_fields_empty = all(character[key] == "" for key in character.keys() if key not in main_keys)
+
+    # If any of the main keys are empty, set some random defaults
+    if all_fields_empty or (some_main_fields_empty and all_non_main_fields_empty):
+        for key in main_keys:
+            if character[key] == "":
+                if key == "age":
+                    character[key] = get_character_age()
+                elif key == "level":
+                    character[key] = random.randint(1, 20)
+                elif key == "class":
+                    character[key] = random.choice(CLASS_LIST)
+                elif key == "race":
+                    character[key] = random.choice(RACE_LIST)
+    return character
+
+
+def complete_character(character: dict, use_cache: bool = True, on_field=None, cancelled: threading.Event = None,
+                       cache_key: str = None) -> dict:
+    """
+    Fill out a character sheet with ChatGPT, then validate it and repair any broken fields.
+
+    Args:
+        character (dict): The (possibly partial) character sheet.
+        use_cache (bool, optional): Whether to serve a previously generated sheet for the same input. Defaults to True.
+        on_field (callable, optional): Callback for each completed field, enables streaming. Defaults to None.
+        cancelled (threading.Event, optional): Set to give up on the ChatGPT request, raising CancelledError. Defaults to None.
+        cache_key (str, optional): The response cache key. Defaults to the key of `character`; pass the key of
+            the sheet as submitted when random defaults have been rolled into it.
+
+    Returns:
+        dict: The validated character sheet.
+
+    Raises:
+        GenerationError: If the sheet is still invalid after the repair attempts.
+    """
+    # Get character data from API, then munge and validate it
+    cache_key = cache_key or character_cache_key(character)
+    character = get_character_data(character, use_cache=use_cache, on_field=on_field, cancelled=cancelled, cache_key=cache_key)
+    with metrics.span("validation"):
+        errors, character = check_character_sheet(character)
+
+    # Regenerate only the offending fields if something breaks
+    repairs = 0
+    for idx in range(REPAIR_ATTEMPTS):
+        if not errors:
+            break
+        if DEBUG:
+            print(f"Repairing fields: {[error.key for error in errors]}")
+        metrics.increment("repair_attempts_total")
+        repairs += 1
+        character = repair_character_data(character, errors)
+        with metrics.span("validation"):
+            errors, character = check_character_sheet(character)
+
+    if errors:
+        # Never serve an invalid sheet from the cache again
+        metrics.increment("character_sheets_total", outcome="invalid")
+        response_cache.discard(cache_key)
+        raise GenerationError(f"Error validating character sheet: {errors[0].message}")
+    metrics.increment("character_sheets_total", outcome="repaired" if repairs else "valid")
+    response_cache.set(cache_key, character)
+    return character
+
+
+def apply_upload_failures(failures: dict, sheet_key: str, portraits: list, pdf_url: str, errors: list) -> tuple:
+    """
+    Account for the character's objects that couldn't be uploaded.
+
+    Args:
+        failures (dict): The S3 key of every failed upload mapped to its exception.
+        sheet_key (str): The S3 key of the final character JSON.
+        portraits (list): The generated Portrait tuples.
+        pdf_url (str): The URL of the PDF sheet.
+        errors (list): Non-fatal errors, appended to.
+
+    Returns:
+        Tuple[str, list, str]: The JSON sheet URL (None if it wasn't saved), the portraits
+                               that were saved, and the PDF URL.
+
+    Raises:
+        GenerationError: If the PDF couldn't be uploaded.
+    """
+    failed_urls = {s3_url(key).replace(" ", "%20"): e for key, e in failures.items()}
+    if pdf_url in failed_urls:
+        raise GenerationError(f"Error generating PDF: {str(failed_urls[pdf_url])}") from failed_urls[pdf_url]
+
+    saved_portraits = []
+    for portrait in portraits:
+        if portrait.url in failed_urls:
+            errors.append(f"Error generating portrait: {str(failed_urls.pop(portrait.url))}")
+            failed_urls.pop(portrait.display_url, None)
+            continue
+        if portrait.display_url in failed_urls:
+            # The app falls back to the full resolution portrait
+            errors.append(f"Error saving portrait preview: {str(failed_urls.pop(portrait.display_url))}")
+            portrait = portrait._replace(display_url=None)
+        saved_portraits.append(portrait)
+    for e in failed_urls.values():
+        errors.append(f"Error saving character data: {str(e)}")
+
+    sheet_url = None if sheet_key in failures else s3_url(sheet_key)
+    return sheet_url, saved_portraits, pdf_url
+
+
+@metrics.span("generate_character")
+def generate_character(character: Mapping, num_portraits: int = 1, use_cache: bool = True,
+                       previous: Mapping = None, on_field=None, on_progress=None,
+                       cancelled: threading.Event = None, index: bool = True) -> GenerationResult:
+    """
+    Run the whole generation pipeline for one character: sheet, portraits, PDF and saves.
+
+    Args:
+        character (Mapping): The (possibly partial) character sheet, a CharacterSheet or dict.
+        num_portraits (int, optional): How many portraits to generate. Defaults to 1.
+        use_cache (bool, optional): Whether to serve a previously generated sheet for the same input. Defaults to True.
+        previous (Mapping, optional): The last generated sheet; a complete sheet is only regenerated if it differs. Defaults to None.
+        on_field (callable, optional): Callback for each completed field, enables streaming. Defaults to None.
+        on_progress (callable, optional): Called with a short description of each stage as it starts. Defaults to None.
+        cancelled (threading.Event, optional): Set to give up while the character data is still being generated. Defaults to None.
+        index (bool, optional): Whether to add the character to the gallery index; see `index_character`. Defaults to True.
+
+    Returns:
+        GenerationResult: The generated character and its artifacts.
+
+    Raises:
+        GenerationError: If the character sheet or the PDF can't be generated.
+    """
+    def progress(stage):
+        if on_progress:
+            on_progress(stage)
+
+    errors = []
+    sheet = CharacterSheet.from_dict(character)
+    # A sheet edited from `previous` only compares its edited fields
+    character_sheet_changed = previous is not None and bool(sheet.diff(previous))
+    # Key the cache on the sheet as submitted: the random roll would make every empty sheet a miss,
+    # and a hit brings back the age, level, class and race rolled the first time
+    cache_key = character_cache_key(sheet.to_dict())
+    character = fill_random_defaults(sheet.to_dict())
+
+    # Generate the character if any data is missing
+    progress('Generating character data...')
+    some_values_missing = any(value == "" for value in character.values())
+    unprocessed = character
+    if some_values_missing or character_sheet_changed:
+        try:
+            character = complete_character(character, use_cache=use_cache, on_field=on_field, cancelled=cancelled, cache_key=cache_key)
+        except (GenerationError, CancelledError):
+            raise
+        except Exception as e:
+            raise GenerationError(f"Error generating character data: {str(e)}") from e
+
+    # Generate the character ID
+    character_id = character_name_to_id(character['name'])
+    # Every object goes up in the background; nothing waits on S3 until the end
+    writer = ArtifactWriter(character_id)
+    writer.put(character_json_s3_key(character_id, unprocessed, unprocessed=True),
+               character_json_bytes(character_id, unprocessed), "application/json", compress=True)
+
+    progress('Generating PDF character sheet...')
+    portraits = []
+    try:
+        # Generate portraits in parallel, one DALL·E request each
+        portrait_futures = []
+        portrait_prompt = character.get("portrait_prompt", "")
+        if not portrait_prompt:
+            errors.append("No portrait prompt provided. Skipping portrait generation.")
+        else:
+            portrait_futures = [
+                portrait_executor.submit(generate_portrait, portrait_prompt, character_id, portrait_num, writer)
+                for portrait_num in range(1, num_portraits + 1)
+            ]
+
+        # Create PDF character sheet and save, laying it out while the portraits are in flight
+        pdf_url = create_pdf_character_sheet(character_id, character, portrait_futures, writer).replace(" ", "%20")
+
+        for future in portrait_futures:
+            try:
+                portraits.append(future.result())
+            except Exception as e:
+                errors.append(f"Error generating portrait: {str(e)}")
+    except Exception as e:
+        raise GenerationError(f"Error generating PDF: {str(e)}") from e
+
+    # Save the character data to a JSON file, then wait for all of the uploads at once
+    progress('Saving character data...')
+    sheet_key = character_json_s3_key(character_id, character)
+    writer.put(sheet_key, character_json_bytes(character_id, character), "application/json", compress=True)
+    with metrics.span("character_save"):
+        manifest_url, failures = writer.finish()
+    sheet_url, portraits, pdf_url = apply_upload_failures(failures, sheet_key, portraits, pdf_url, errors)
+    portrait_urls = [portrait.url for portrait in portraits]
+    display_urls = [portrait.display_url for portrait in portraits]
+    result = GenerationResult(character_id, character, portrait_urls, display_urls, pdf_url, errors, manifest_url, sheet_url)
+
+    # Record it in the local index for the gallery
+    if index:
+        try:
+            index_character(result)
+        except Exception as e:
+            errors.append(f"Error indexing character: {str(e)}")
+    return result
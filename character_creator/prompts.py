@@ -0,0 +1,176 @@
+import json
+
+try:
+    import tiktoken
+except ImportError:  # Token counts fall back to an estimate
+    tiktoken = None
+
+SYSTEM_PROMPTS = [
+    "You are a dedicated assistant specializing in D&D character creation.",
+    "Users will provide incomplete character sheets in JSON format. Complete them by filling in missing details, ensuring no keys have empty values except sometimes N/A. Characters should be both unique and playable within D&D 5e rules.",
+    "Ensure all generated stats strictly adhere to D&D 5e rules for the specified level, class, and race of the character. Mark any fields that don't make sense for the given character's level, race, or class with N/A.",
+    "Provide a 'portrait_prompt' for each character. This prompt should be a detailed, evocative description tailored for DALL-E to visualize the character.",
+]
+INSTRUCTION_PROMPT = "Fill out D&D 5e character sheets for me, ensuring stats are accurate for the character's level, class, and race--or N/A if not appropriate. Do not alter the age, level, class, or race fields if non-empty. Populate or mark spell fields as N/A based on the character's class and level. Skip any spells that aren't appropriate for the given character's level, class, or race according to D&D 5e rules. Make sure the JSON is valid."
+EXAMPLE_PROMPT = "Craft another unique character sheet for me, ensuring stats align with D&D 5e rules and paying special attention to the portrait prompt."
+REPAIR_PROMPT = "Here is JSON for a D&D 5e character sheet:{character}\n\nThese fields are missing or invalid:{errors}\n\nReply with a JSON object containing only these keys, with values that follow D&D 5e rules and are consistent with the rest of the sheet. Use this template for what each key means:{template}"
+CHARACTER_PROMPT = "Here is JSON for an incomplete character sheet:{character}\n\nFill it out for me, ensuring stats align with D&D 5e rules and logically matches the incomplete character sheet's non-empty fields. Make sure numeric fields parse to int."
+
+# Tokens the chat format adds around every message
+TOKENS_PER_MESSAGE = 4
+
+
+def compact_json(data) -> str:
+    """
+    Serialize data as compact JSON.
+
+    Args:
+        data: The JSON-serializable data.
+
+    Returns:
+        str: JSON without insignificant whitespace.
+    """
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def parse_level(level) -> int:
+    """
+    Parse a character level, tolerating blanks and junk.
+
+    Args:
+        level: The level value from a character sheet.
+
+    Returns:
+        int: The level, or None if it is not a number.
+    """
+    try:
+        return int(str(level).strip())
+    except ValueError:
+        return None
+
+
+class PromptAssembler:
+    """
+    Builds chat prompts from a precompiled set of few-shot examples.
+
+    The examples are serialized once. Every prompt starts with the same
+    byte-stable prefix (system prompts, the sheet template and the
+    instructions) so provider-side prompt caching can hit, followed by the
+    `k` examples that best match the requested class, race and level.
+    """
+
+    def __init__(self, examples: list, k: int = 2, model: str = "gpt-4-turbo-preview"):
+        self.k = k
+        self.model = model
+        self.template = dict(examples[0])
+        self.examples = [compact_json(dict(example)) for example in examples[1:]]
+        self.index = [
+            (str(example.get("class", "")).lower(), str(example.get("race", "")).lower(), parse_level(example.get("level")))
+            for example in examples[1:]
+        ]
+        self.prefix = tuple(
+            [{"role": "system", "content": prompt} for prompt in SYSTEM_PROMPTS]
+            + [{"role": "system", "content": f"Use the following character sheet template as a guide:\n\n{compact_json(self.template)}"}]
+            + [{"role": "user", "content": INSTRUCTION_PROMPT}]
+        )
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+
+    def select_examples(self, character: dict) -> list:
+        """
+        Pick the examples most similar to the requested character.
+
+        Class matches outweigh race matches, which outweigh level distance.
+        Ties keep file order so the same request always gets the same prompt.
+
+        Args:
+            character (dict): The (possibly partial) character sheet.
+
+        Returns:
+            list: Indexes into the compiled examples, best match first.
+        """
+        character_class = str(character.get("class", "")).strip().lower()
+        race = str(character.get("race", "")).strip().lower()
+        level = parse_level(character.get("level"))
+
+        def score(idx):
+            example_class, example_race, example_level = self.index[idx]
+            similarity = 0.0
+            if character_class and character_class == example_class:
+                similarity += 4
+            if race and race == example_race:
+                similarity += 2
+            if level is not None and example_level is not None:
+                similarity += 1 - min(abs(level - example_level), 20) / 20
+            return (-similarity, idx)
+
+        return sorted(range(len(self.examples)), key=score)[:self.k]
+
+    def build_messages(self, character: dict) -> list:
+        """
+        Build the chat messages for a character generation request.
+
+        Args:
+            character (dict): The (possibly partial) character sheet.
+
+        Returns:
+            list: The chat messages.
+        """
+        messages = [dict(message) for message in self.prefix]
+        for position, idx in enumerate(self.select_examples(character)):
+            if position:
+                messages.append({"role": "user", "content": EXAMPLE_PROMPT})
+            messages.append({"role": "assistant", "content": self.examples[idx]})
+        messages.append({"role": "user", "content": CHARACTER_PROMPT.format(character=compact_json(character))})
+        return messages
+
+    def count_tokens(self, messages: list) -> int:
+        """
+        Count the input tokens of a chat request.
+
+        Uses tiktoken when it is installed and a four-characters-per-token
+        estimate otherwise.
+
+        Args:
+            messages (list): The chat messages.
+
+        Returns:
+            int: The (estimated) number of input tokens.
+        """
+        tokens = 0
+        for message in messages:
+            if self._encoding is not None:
+                tokens += len(self._encoding.encode(message["content"]))
+            else:
+                tokens += len(message["content"]) // 4 + 1
+            tokens += TOKENS_PER_MESSAGE
+        return tokens
+
+    def build_repair_messages(self, character: dict, errors: list) -> list:
+        """
+        Build the chat messages asking for replacements of just the broken fields.
+
+        Args:
+            character (dict): The character sheet, including the broken fields.
+            errors (list): FieldError tuples for the fields to regenerate.
+
+        Returns:
+            list: The chat messages.
+        """
+        invalid_keys = {error.key for error in errors}
+        valid_fields = {key: value for key, value in character.items() if key not in invalid_keys}
+        template = {key: self.template.get(key, "") for key in sorted(invalid_keys)}
+        problems = {error.key: error.message for error in errors}
+        return [
+            {"role": "system", "content": SYSTEM_PROMPTS[0]},
+            {"role": "system", "content": SYSTEM_PROMPTS[2]},
+            {"role": "user", "content": REPAIR_PROMPT.format(
+                character=compact_json(valid_fields),
+                errors=compact_json(problems),
+                template=compact_json(template)
+            )},
+        ]
@@ -0,0 +1,446 @@
+"""
+Process-wide rate limiting for OpenAI calls.
+
+Every Streamlit session, batch worker and warm pool thread goes through the
+same limiter for each endpoint, so between them they stay inside the
+account's limits instead of each finding them with a 429. A limiter has:
+
+- Token buckets for requests and tokens per minute. A call reserves its
+  prompt plus MAX_TOKENS up front; once the response reports its actual
+  usage the difference is refunded (or charged).
+- A first-come, first-served queue, so a big request isn't starved by a
+  stream of small ones and callers wait their turn rather than racing.
+- An adaptive concurrency limit: it creeps up while latency stays near
+  its long-run average, and backs off multiplicatively when latency climbs or
+  the API answers 429.
+- Retries. A 429 pauses every caller for as long as the `retry-after` or
+  `x-ratelimit-reset-*` headers say; dropped connections and 5xx
+  responses are retried with exponential backoff by the caller alone.
+
+Past saturation callers queue, so throughput levels off at the account's
+limit instead of collapsing into errors.
+
+Example:
+    response = chat_limiter.call(
+        lambda: client.chat.completions.create(...),
+        tokens=prompt_tokens + MAX_TOKENS
+    )
+"""
+import re
+import time
+import random
+import asyncio
+import threading
+from typing import NamedTuple
+from email.utils import parsedate_to_datetime
+import openai
+from character_creator.config import (
+    OPENAI_CHAT_RPM, OPENAI_CHAT_TPM, OPENAI_IMAGE_RPM, OPENAI_MAX_CONCURRENCY, OPENAI_MAX_RETRIES
+)
+from character_creator.metrics import metrics
+
+BURST_SECONDS = 1  # OpenAI enforces per-minute limits over windows as short as a second
+LATENCY_TOLERANCE = 2.0  # Back off once recent latency is this many times the long-run average
+MAX_PAUSE_SECONDS = 60
+BACKOFF_BASE_SECONDS = 0.5
+ASYNC_POLL_SECONDS = 0.02
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+
+def parse_duration(value: str) -> float:
+    """
+    Parse a reset duration in the format of OpenAI's rate limit headers.
+
+    Args:
+        value (str): The duration, e.g. "20ms", "1.5s" or "6m0s".
+
+    Returns:
+        float: The duration in seconds, or None if it can't be parsed.
+    """
+    parts = DURATION_PART.findall(value or "")
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def retry_after_seconds(headers) -> float:
+    """
+    Work out how long a 429 response asks us to wait.
+
+    Args:
+        headers: The response headers.
+
+    Returns:
+        float: The wait in seconds, or None if the response gives no hint.
+    """
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    if headers.get("retry-after"):
+        try:
+            return float(headers["retry-after"])
+        except ValueError:
+            try:
+                return parsedate_to_datetime(headers["retry-after"]).timestamp() - time.time()
+            except (TypeError, ValueError):
+                pass
+    # Otherwise wait for whichever budget ran out to reset
+    resets = [
+        parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+        for kind in ("requests", "tokens")
+        if headers.get(f"x-ratelimit-remaining-{kind}") == "0"
+    ]
+    resets = [reset for reset in resets if reset is not None]
+    return max(resets) if resets else None
+
+
+def usage_of(result):
+    """
+    Default usage extractor: the `usage` of an OpenAI response, if it has one.
+
+    Args:
+        result: What the limited call returned.
+
+    Returns:
+        The usage object, or None.
+    """
+    return getattr(result, "usage", None)
+
+
+class TokenBucket:
+    """
+    A budget of `per_minute` units that refills continuously.
+
+    The bucket holds at most BURST_SECONDS worth of budget. Its level can go
+    negative when a call turns out to use more than it reserved, and that
+    debt is paid off before anything else is admitted. A budget of 0 or less
+    is unlimited. Not thread-safe; the RateLimiter's lock guards it.
+    """
+
+    def __init__(self, per_minute: float):
+        self.rate = max(per_minute, 0) / 60
+        self.capacity = self.rate * BURST_SECONDS
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """
+        Get how long until `amount` units are available.
+
+        Args:
+            amount (float): The units needed.
+            now (float): The current `time.monotonic()`.
+
+        Returns:
+            float: Seconds to wait, 0 if they're available now.
+        """
+        if not self.rate:
+            return 0
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        # A call bigger than the whole burst would otherwise never fit
+        amount = min(amount, self.capacity)
+        return max(0, (amount - self.level) / self.rate)
+
+    def take(self, amount: float) -> None:
+        """
+        Spend units, or refund them if `amount` is negative.
+
+        Args:
+            amount (float): The units to spend.
+        """
+        if self.rate:
+            self.level = min(self.capacity, self.level - amount)
+
+
+class Permit(NamedTuple):
+    """
+    An admitted call's reservation, handed back on release.
+    """
+    tokens: int
+    started: float
+
+
+class RateLimiter:
+    """
+    Shared request, token and concurrency budget for one OpenAI endpoint.
+
+    Safe to use from threads and event loops at the same time; async
+    callers poll for their turn instead of blocking the loop.
+    """
+
+    def __init__(self, name: str, requests_per_minute: float, tokens_per_minute: float = 0,
+                 max_concurrency: int = OPENAI_MAX_CONCURRENCY, min_concurrency: int = 1,
+                 max_retries: int = OPENAI_MAX_RETRIES):
+        """
+        Args:
+            name (str): The limiter's name, used as a metrics label.
+            requests_per_minute (float): The request budget, 0 for unlimited.
+            tokens_per_minute (float, optional): The token budget, 0 for unlimited. Defaults to 0.
+            max_concurrency (int, optional): The most calls in flight at once. Defaults to OPENAI_MAX_CONCURRENCY.
+            min_concurrency (int, optional): The fewest calls in flight the limit backs off to. Defaults to 1.
+            max_retries (int, optional): Retries per call for 429s and transient errors. Defaults to OPENAI_MAX_RETRIES.
+        """
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max(max_concurrency, min_concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_retries = max_retries
+        # Start halfway and let the observed latency move it
+        self.concurrency_limit = max(min_concurrency, self.max_concurrency / 2)
+        self._active = 0
+        self._next_ticket = 0
+        self._serving = 0
+        self._abandoned = set()
+        self._paused_until = 0
+        self._recent_latency = None
+        self._average_latency = None
+        self._completions_since_decrease = 0
+        self._condition = threading.Condition()
+
+    def _admission_delay(self, ticket: int, tokens: int) -> float:
+        """
+        Admit the caller holding `ticket` if it's their turn and the budgets allow. Call with the lock held.
+
+        Returns:
+            float: 0 once admitted, else how long to wait before trying again (None to wait for a release).
+        """
+        while self._serving in self._abandoned:
+            self._abandoned.discard(self._serving)
+            self._serving += 1
+        if ticket != self._serving:
+            return None
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._active >= int(self.concurrency_limit):
+            return None
+        delay = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+        if delay:
+            return delay
+
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        self._active += 1
+        self._serving += 1
+        self._condition.notify_all()
+        return 0
+
+    def _take_ticket(self) -> int:
+        with self._condition:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            return ticket
+
+    def _abandon(self, ticket: int) -> None:
+        with self._condition:
+            if ticket >= self._serving:
+                self._abandoned.add(ticket)
+                self._condition.notify_all()
+
+    def acquire(self, tokens: int = 0) -> Permit:
+        """
+        Wait for this caller's turn and budget, blocking the thread.
+
+        Args:
+            tokens (int, optional): The tokens the call may use. Defaults to 0.
+
+        Returns:
+            Permit: The reservation, to pass to `release()`.
+        """
+        start = time.monotonic()
+        ticket = self._take_ticket()
+        try:
+            with self._condition:
+                while True:
+                    delay = self._admission_delay(ticket, tokens)
+                    if delay == 0:
+                        break
+                    self._condition.wait(delay)
+        except BaseException:
+            self._abandon(ticket)
+            raise
+        return self._admitted(tokens, start)
+
+    async def acquire_async(self, tokens: int = 0) -> Permit:
+        """
+        Wait for this caller's turn and budget without blocking the event loop.
+
+        Args:
+            tokens (int, optional): The tokens the call may use. Defaults to 0.
+
+        Returns:
+            Permit: The reservation, to pass to `release()`.
+        """
+        start = time.monotonic()
+        ticket = self._take_ticket()
+        try:
+            while True:
+                with self._condition:
+                    delay = self._admission_delay(ticket, tokens)
+                if delay == 0:
+                    break
+                await asyncio.sleep(min(delay or ASYNC_POLL_SECONDS, ASYNC_POLL_SECONDS * 10))
+        except BaseException:
+            self._abandon(ticket)
+            raise
+        return self._admitted(tokens, start)
+
+    def _admitted(self, tokens: int, start: float) -> Permit:
+        now = time.monotonic()
+        metrics.observe("rate_limit_wait_seconds", now - start, limiter=self.name)
+        return Permit(tokens, now)
+
+    def release(self, permit: Permit, usage=None, failed: bool = False) -> None:
+        """
+        Give back a call's concurrency slot and settle its token reservation.
+
+        Args:
+            permit (Permit): The reservation from `acquire()`.
+            usage (optional): The response's usage object, to charge the actual tokens. Defaults to None.
+            failed (bool, optional): Whether the call failed, which refunds its tokens. Defaults to False.
+        """
+        latency = time.monotonic() - permit.started
+        with self._condition:
+            self._active -= 1
+            if failed:
+                self.tokens.take(-permit.tokens)
+            elif usage is not None:
+                self.tokens.take((getattr(usage, "total_tokens", 0) or 0) - permit.tokens)
+                # Chat latency grows with the completion, so compare time per generated token
+                latency /= max(1, getattr(usage, "completion_tokens", 0) or 0)
+            if not failed:
+                self._observe_latency(latency)
+            self._condition.notify_all()
+
+    def _observe_latency(self, latency: float) -> None:
+        if self._average_latency is None:
+            self._recent_latency = self._average_latency = latency
+        self._recent_latency += 0.3 * (latency - self._recent_latency)
+        self._average_latency += 0.02 * (latency - self._average_latency)
+        self._completions_since_decrease += 1
+        if self._recent_latency > self._average_latency * LATENCY_TOLERANCE:
+            self._decrease_concurrency(0.9)
+        else:
+            self.concurrency_limit = min(self.max_concurrency, self.concurrency_limit + 1 / self.concurrency_limit)
+
+    def _decrease_concurrency(self, factor: float) -> None:
+        # Back off at most once per round of in-flight calls, which all saw the same conditions
+        if self._completions_since_decrease >= self.concurrency_limit:
+            self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit * factor)
+            self._completions_since_decrease = 0
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """
+        Decide whether a failed call should be retried, and how long its caller should wait first.
+
+        Returns:
+            float: Seconds to wait before queueing again, or None to give up.
+        """
+        if not isinstance(error, RETRYABLE_ERRORS) or attempt >= self.max_retries:
+            return None
+        backoff = random.uniform(0.5, 1) * min(MAX_PAUSE_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt)
+        if not isinstance(error, openai.RateLimitError):
+            metrics.increment("rate_limit_retries_total", limiter=self.name, reason="error")
+            return backoff
+        if getattr(error, "code", None) == "insufficient_quota":
+            return None
+
+        # Throttled: everyone waits, not just this caller
+        hint = retry_after_seconds(error.response.headers)
+        pause = min(MAX_PAUSE_SECONDS, backoff if hint is None else hint)
+        print(f"OpenAI {self.name} rate limit hit, pausing for {pause:.1f}s")
+        metrics.increment("rate_limit_retries_total", limiter=self.name, reason="throttled")
+        with self._condition:
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            self._completions_since_decrease = max(self._completions_since_decrease, self.concurrency_limit)
+            self._decrease_concurrency(0.5)
+            self._condition.notify_all()
+        return 0
+
+    def call(self, func, tokens: int = 0, usage=usage_of):
+        """
+        Make a rate limited call from a thread, retrying 429s and transient errors.
+
+        Args:
+            func (callable): The call, taking no arguments. Streams must be consumed inside it.
+            tokens (int, optional): The most tokens the call can use: prompt plus max_tokens. Defaults to 0.
+            usage (callable, optional): Gets the usage object from the call's result. Defaults to `usage_of`.
+
+        Returns:
+            The call's result.
+        """
+        attempt = 0
+        while True:
+            permit = self.acquire(tokens)
+            try:
+                result = func()
+            except Exception as e:
+                self.release(permit, failed=True)
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self.release(permit, failed=True)
+                raise
+            self.release(permit, usage(result))
+            return result
+
+    async def call_async(self, func, tokens: int = 0, usage=usage_of):
+        """
+        Make a rate limited call from an event loop, retrying 429s and transient errors.
+
+        Args:
+            func (callable): Coroutine function for the call, taking no arguments. Streams must be consumed inside it.
+            tokens (int, optional): The most tokens the call can use: prompt plus max_tokens. Defaults to 0.
+            usage (callable, optional): Gets the usage object from the call's result. Defaults to `usage_of`.
+
+        Returns:
+            The call's result.
+        """
+        attempt = 0
+        while True:
+            permit = await self.acquire_async(tokens)
+            try:
+                result = await func()
+            except Exception as e:
+                self.release(permit, failed=True)
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.release(permit, failed=True)
+                raise
+            self.release(permit, usage(result))
+            return result
+
+    def stats(self) -> dict:
+        """
+        Get the limiter's current state, for the metrics page.
+
+        Returns:
+            dict: Calls in flight and queued, the concurrency limit, and seconds left of any 429 pause.
+        """
+        with self._condition:
+            return {
+                "active": self._active,
+                "queued": self._next_ticket - self._serving - len(self._abandoned),
+                "concurrency_limit": int(self.concurrency_limit),
+                "paused_seconds": max(0, self._paused_until - time.monotonic()),
+            }
+
+
+# Process-wide shared limiters; DALL·E has an images-per-minute limit but no token budget
+chat_limiter = RateLimiter("chat", OPENAI_CHAT_RPM, OPENAI_CHAT_TPM)
+image_limiter = RateLimiter("image", OPENAI_IMAGE_RPM)
@@ -0,0 +1,225 @@
+"""
+Compact, immutable character sheet model.
+
+A CharacterSheet stores its values in a tuple laid out by a schema shared
+with every other sheet of the same shape, so a sheet costs one small object
+plus its strings instead of a 78-entry dict. Edits are copy-on-write: they
+return a new sheet that shares every unchanged value and remembers which
+fields changed, so diffing an edit against its parent only looks at those.
+"""
+import json
+import weakref
+from functools import lru_cache
+from collections.abc import Mapping
+from character_creator.templates import template_registry
+
+
+class SheetSchema:
+    """
+    The ordered field names of a character sheet, and each field's position.
+    """
+    __slots__ = ("keys", "index")
+
+    def __init__(self, keys: tuple):
+        self.keys = keys
+        self.index = {key: idx for idx, key in enumerate(keys)}
+
+    def __reduce__(self):
+        return (schema_for, (self.keys,))
+
+
+@lru_cache(maxsize=32)
+def schema_for(keys: tuple) -> SheetSchema:
+    """
+    Get the shared schema for a set of field names.
+
+    Args:
+        keys (tuple): The field names, in order.
+
+    Returns:
+        SheetSchema: The schema, shared by every sheet with these fields.
+    """
+    return SheetSchema(keys)
+
+
+def template_schema() -> SheetSchema:
+    """
+    Get the schema of the character examples' sheet template.
+
+    Returns:
+        SheetSchema: The template's schema.
+    """
+    return schema_for(template_registry.get().keys)
+
+
+def as_text(value) -> str:
+    """
+    Coerce a sheet value to text, the one type every field has.
+
+    Args:
+        value: The raw value, e.g. an int level from the model.
+
+    Returns:
+        str: The value as a string, blank for None.
+    """
+    if isinstance(value, str):
+        return value
+    return "" if value is None else str(value)
+
+
+class CharacterSheet(Mapping):
+    """
+    An immutable character sheet that reads like a dict.
+
+    Use `replace()` to edit and `diff()` to find what changed.
+    """
+    __slots__ = ("schema", "_values", "_parent", "_changed", "__weakref__")
+
+    def __init__(self, schema: SheetSchema, values: tuple, parent: "CharacterSheet" = None, changed: frozenset = frozenset()):
+        self.schema = schema
+        self._values = values
+        # Only a weak reference, so chains of edits don't keep every old sheet alive
+        self._parent = weakref.ref(parent) if parent is not None else None
+        self._changed = changed
+
+    @classmethod
+    def empty(cls) -> "CharacterSheet":
+        """
+        Make a blank sheet with the template's fields.
+
+        Returns:
+            CharacterSheet: A sheet with every field set to "".
+        """
+        schema = template_schema()
+        return cls(schema, ("",) * len(schema.keys))
+
+    @classmethod
+    def from_dict(cls, data: Mapping) -> "CharacterSheet":
+        """
+        Build a sheet from a dict, e.g. a parsed model response.
+
+        Template fields come first in template order, missing ones blank;
+        any extra fields are kept after them.
+
+        Args:
+            data (Mapping): The character data.
+
+        Returns:
+            CharacterSheet: The sheet.
+        """
+        if isinstance(data, CharacterSheet):
+            return data
+        template = template_schema()
+        extra = tuple(key for key in data if key not in template.index)
+        schema = schema_for(template.keys + extra) if extra else template
+        return cls(schema, tuple(as_text(data.get(key)) for key in schema.keys))
+
+    @classmethod
+    def from_json(cls, text) -> "CharacterSheet":
+        """
+        Parse a sheet from JSON.
+
+        Args:
+            text (str | bytes): A JSON object.
+
+        Returns:
+            CharacterSheet: The sheet.
+        """
+        return cls.from_dict(json.loads(text))
+
+    def __getitem__(self, key: str) -> str:
+        return self._values[self.schema.index[key]]
+
+    def __iter__(self):
+        return iter(self.schema.keys)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __contains__(self, key) -> bool:
+        return key in self.schema.index
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, CharacterSheet) and other.schema is self.schema:
+            return other._values == self._values
+        return super().__eq__(other)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"CharacterSheet(name={self.get('name', '')!r}, fields={len(self)})"
+
+    def __reduce__(self):
+        return (CharacterSheet, (self.schema, self._values))
+
+    def to_dict(self) -> dict:
+        """
+        Convert the sheet to a plain dict.
+
+        Returns:
+            dict: A new, mutable dict of the sheet.
+        """
+        return dict(zip(self.schema.keys, self._values))
+
+    def to_json(self) -> str:
+        """
+        Serialize the sheet.
+
+        Returns:
+            str: The sheet as a JSON object.
+        """
+        return json.dumps(self.to_dict())
+
+    def replace(self, changes: Mapping) -> "CharacterSheet":
+        """
+        Make an edited copy of the sheet.
+
+        Values that are unchanged are shared with this sheet, and if nothing
+        actually changes this sheet itself is returned.
+
+        Args:
+            changes (Mapping): Field names to their new values.
+
+        Returns:
+            CharacterSheet: The edited sheet.
+        """
+        schema = self.schema
+        new_keys = tuple(key for key in changes if key not in schema.index)
+        if new_keys:
+            schema = schema_for(schema.keys + new_keys)
+        values = list(self._values) + [""] * len(new_keys)
+        changed = set()
+        for key, value in changes.items():
+            idx = schema.index[key]
+            value = as_text(value)
+            if values[idx] != value:
+                values[idx] = value
+                changed.add(idx)
+        if not changed:
+            return self
+        return CharacterSheet(schema, tuple(values), parent=self, changed=frozenset(changed))
+
+    def diff(self, other: Mapping) -> dict:
+        """
+        Find the fields whose values differ from another sheet.
+
+        Diffing an edit against the sheet it was made from only compares the
+        edited fields; anything else is compared field by field.
+
+        Args:
+            other (Mapping): The sheet (or dict) to compare with.
+
+        Returns:
+            dict: Field names to this sheet's value, for every field that differs.
+        """
+        if other is self:
+            return {}
+        if self._parent is not None and self._parent() is other:
+            return {self.schema.keys[idx]: self._values[idx] for idx in self._changed}
+        if isinstance(other, CharacterSheet) and other._parent is not None and other._parent() is self:
+            return {other.schema.keys[idx]: self.get(other.schema.keys[idx], "") for idx in other._changed}
+        return {
+            key: value for key, value in zip(self.schema.keys, self._values)
+            if value != as_text(other.get(key))
+        }
+
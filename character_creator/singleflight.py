@@ -0,0 +1,130 @@
+"""
+In-flight request coalescing.
+
+When identical requests arrive while one is already running, the later ones
+wait for the running call and share its result (or its exception) instead
+of making their own upstream call. Once a call finishes it's forgotten, so
+this never serves stale results; that is the response cache's job.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future, CancelledError, TimeoutError
+from character_creator.metrics import metrics
+
+# How often a waiting caller checks whether it has given up
+CANCEL_POLL_SECONDS = 0.1
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls made from threads.
+
+    The upstream call runs on its own thread while every caller waits for
+    it, and they all get the same result object, so results must be treated
+    as read-only. A caller can give up by setting the Event it passed in;
+    once every caller has, the call's own cancel Event is set so it can stop.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, cancelled: threading.Event = None):
+        """
+        Run `func`, or wait for the identical call already in flight.
+
+        Args:
+            key: Identifies identical calls; must be hashable.
+            func (callable): The call to make, taking a threading.Event that's set once every caller has given up.
+            cancelled (threading.Event, optional): Set by this caller to stop waiting. Defaults to None.
+
+        Returns:
+            The call's result.
+
+        Raises:
+            CancelledError: If `cancelled` was set before the call finished.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = {"future": Future(), "cancelled": threading.Event(), "waiters": 0}
+                threading.Thread(target=self._run, args=(key, call, func), name=f"{self.name}-flight", daemon=True).start()
+            else:
+                metrics.increment("coalesced_requests_total", flight=self.name)
+            call["waiters"] += 1
+
+        try:
+            while cancelled is not None and not cancelled.is_set():
+                try:
+                    return call["future"].result(timeout=CANCEL_POLL_SECONDS)
+                except TimeoutError:
+                    continue
+            if cancelled is not None:
+                raise CancelledError()
+            return call["future"].result()
+        finally:
+            with self._lock:
+                call["waiters"] -= 1
+                if not call["waiters"] and not call["future"].done():
+                    self._forget(key, call)
+                    call["cancelled"].set()
+
+    def _run(self, key, call: dict, func) -> None:
+        try:
+            call["future"].set_result(func(call["cancelled"]))
+        except BaseException as e:
+            call["future"].set_exception(e)
+        finally:
+            with self._lock:
+                self._forget(key, call)
+
+    def _forget(self, key, call: dict) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+
+class AsyncSingleFlight:
+    """
+    Coalesces identical concurrent calls made from coroutines.
+
+    The upstream call runs as its own task that every caller awaits. If all
+    of the callers are cancelled before it finishes, the upstream task is
+    cancelled too. Must be used from a single event loop.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+
+    async def do(self, key, func):
+        """
+        Await `func()`, or the identical call already in flight.
+
+        Args:
+            key: Identifies identical calls; must be hashable.
+            func (callable): Coroutine function to call, taking no arguments.
+
+        Returns:
+            The call's result.
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = {"task": asyncio.ensure_future(func()), "waiters": 0}
+            call["task"].add_done_callback(lambda task: self._forget(key, call))
+        else:
+            metrics.increment("coalesced_requests_total", flight=self.name)
+
+        call["waiters"] += 1
+        try:
+            # Shield so one waiter being cancelled doesn't cancel the call for the others
+            return await asyncio.shield(call["task"])
+        finally:
+            call["waiters"] -= 1
+            if not call["waiters"] and not call["task"].done():
+                self._forget(key, call)
+                call["task"].cancel()
+
+    def _forget(self, key, call: dict) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
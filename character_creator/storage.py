@@ -0,0 +1,222 @@
+import io
+import gzip
+import json
+from character_creator.config import S3_BUCKET_NAME, CLOUDFRONT_URL, S3_MULTIPART_THRESHOLD, S3_GZIP_LEVEL, PORTRAIT_DISPLAY_FORMAT
+from character_creator.clients import get_s3_client, s3_transfer_config
+from character_creator.metrics import metrics
+
+UNPROCESSED_FILENAME = "_unprocessed.json"
+MANIFEST_FILENAME = "_manifest.json"
+
+
+def s3_url(s3_key: str) -> str:
+    """
+    Get the CloudFront URL an S3 object is served from.
+
+    Args:
+        s3_key (str): The object's key.
+
+    Returns:
+        str: The URL.
+    """
+    return f"{CLOUDFRONT_URL}/{s3_key}"
+
+
+def compress_body(data: bytes) -> bytes:
+    """
+    Gzip an object body for upload with `ContentEncoding: gzip`.
+
+    Args:
+        data (bytes): The body.
+
+    Returns:
+        bytes: The compressed body, byte-for-byte the same for the same input.
+    """
+    return gzip.compress(data, compresslevel=S3_GZIP_LEVEL, mtime=0)
+
+
+def decode_json_body(data: bytes):
+    """
+    Parse a JSON object body, whether or not it was stored gzip-encoded.
+
+    CloudFront and browsers decode gzip bodies themselves, but S3 clients
+    hand back the stored bytes.
+
+    Args:
+        data (bytes): The body.
+
+    Returns:
+        The parsed JSON.
+    """
+    if data[:2] == b"\x1f\x8b":
+        data = gzip.decompress(data)
+    return json.loads(data)
+
+
+def upload_stream_to_s3(stream, s3_key: str, content_type: str, content_encoding: str = None) -> str:
+    """
+    Uploads a readable stream to S3 without touching local disk.
+
+    Large objects are sent as multipart uploads.
+
+    Args:
+        stream: A binary file-like object to read the object body from.
+        s3_key (str): The desired S3 key (path) for the uploaded file.
+        content_type (str): The MIME type of the object.
+        content_encoding (str, optional): The body's Content-Encoding, e.g. "gzip". Defaults to None.
+
+    Returns:
+        str: The CloudFront URL of the file.
+    """
+    extra_args = {"ContentType": content_type}
+    if content_encoding:
+        extra_args["ContentEncoding"] = content_encoding
+    with metrics.span("s3_upload"):
+        get_s3_client().upload_fileobj(
+            stream, S3_BUCKET_NAME, s3_key,
+            ExtraArgs=extra_args,
+            Config=s3_transfer_config
+        )
+    return s3_url(s3_key)
+
+
+def upload_bytes_to_s3(data: bytes, s3_key: str, content_type: str, content_encoding: str = None) -> str:
+    """
+    Uploads an in-memory object to S3.
+
+    Objects below the multipart threshold, which is nearly all of them, go
+    up in a single PUT; the transfer manager's thread pool only pays off for
+    multipart uploads.
+
+    Args:
+        data (bytes): The object body.
+        s3_key (str): The desired S3 key (path) for the uploaded file.
+        content_type (str): The MIME type of the object.
+        content_encoding (str, optional): The body's Content-Encoding, e.g. "gzip". Defaults to None.
+
+    Returns:
+        str: The CloudFront URL of the file.
+    """
+    if len(data) >= S3_MULTIPART_THRESHOLD:
+        return upload_stream_to_s3(io.BytesIO(data), s3_key, content_type, content_encoding)
+
+    extra_args = {"ContentEncoding": content_encoding} if content_encoding else {}
+    with metrics.span("s3_upload"):
+        get_s3_client().put_object(Bucket=S3_BUCKET_NAME, Key=s3_key, Body=data, ContentType=content_type, **extra_args)
+    return s3_url(s3_key)
+
+
+def character_json_s3_key(character_id: str, character: dict, unprocessed: bool = False) -> str:
+    """
+    Get the S3 key for a character's JSON.
+
+    Args:
+        character_id (str): The character ID.
+        character (dict): The character data.
+        unprocessed (bool, optional): Whether or not the character is unprocessed. Defaults to False.
+
+    Returns:
+        str: The S3 key.
+    """
+    if unprocessed:
+        return f"sheets/{character_id}/{UNPROCESSED_FILENAME}"
+    return f"sheets/{character_id}/{character['name']}.json"
+
+
+def portrait_s3_key(character_id: str, portrait_num: int) -> str:
+    """
+    Get the S3 key for one of a character's portraits.
+
+    Args:
+        character_id (str): The character ID.
+        portrait_num (int): The number of the portrait.
+
+    Returns:
+        str: The S3 key.
+    """
+    return f"sheets/{character_id}/portrait_{portrait_num}.png"
+
+
+def portrait_display_s3_key(character_id: str, portrait_num: int) -> str:
+    """
+    Get the S3 key for the display-sized copy of one of a character's portraits.
+
+    Args:
+        character_id (str): The character ID.
+        portrait_num (int): The number of the portrait.
+
+    Returns:
+        str: The S3 key.
+    """
+    return f"sheets/{character_id}/portrait_{portrait_num}_display.{PORTRAIT_DISPLAY_FORMAT}"
+
+
+def pdf_s3_key(character_id: str, character: dict) -> str:
+    """
+    Get the S3 key for a character's PDF sheet.
+
+    Args:
+        character_id (str): The character ID.
+        character (dict): The character data.
+
+    Returns:
+        str: The S3 key.
+    """
+    return f"sheets/{character_id}/{character['name']}.pdf"
+
+
+def manifest_s3_key(character_id: str) -> str:
+    """
+    Get the S3 key for the manifest listing a character's objects.
+
+    Args:
+        character_id (str): The character ID.
+
+    Returns:
+        str: The S3 key.
+    """
+    return f"sheets/{character_id}/{MANIFEST_FILENAME}"
+
+
+def is_character_sheet_key(s3_key: str) -> bool:
+    """
+    Check whether an S3 key is a character's final JSON sheet.
+
+    Args:
+        s3_key (str): The object's key.
+
+    Returns:
+        bool: True for `sheets/{character_id}/{name}.json`.
+    """
+    filename = s3_key.rsplit("/", 1)[-1]
+    return s3_key.endswith(".json") and filename not in (UNPROCESSED_FILENAME, MANIFEST_FILENAME)
+
+
+def character_json_bytes(character_id: str, character: dict) -> bytes:
+    """
+    Serialize a character, tagged with its ID, for saving.
+
+    Args:
+        character_id (str): The character ID.
+        character (dict): The character data.
+
+    Returns:
+        bytes: The UTF-8 encoded JSON.
+    """
+    return json.dumps({**character, 'id': character_id}).encode("utf8")
+
+
+def save_character_json_to_s3(character_id: str, character: dict, unprocessed: bool = False) -> str:
+    """
+    Saves the character JSON to S3, gzip-encoded.
+
+    Args:
+        character_id (str): The character ID.
+        character (dict): The character data to save.
+        unprocessed (bool, optional): Whether or not the character is unprocessed. Defaults to False.
+
+    Returns:
+        str: The URL for the uploaded file.
+    """
+    s3_key = character_json_s3_key(character_id, character, unprocessed)
+    return upload_bytes_to_s3(compress_body(character_json_bytes(character_id, character)), s3_key, "application/json", "gzip")
@@ -0,0 +1,75 @@
+import json
+
+
+class IncrementalJSONObjectParser:
+    """
+    Incrementally parse a streamed JSON object, one top-level member at a time.
+
+    Feed the parser text chunks as they arrive and it returns every top-level
+    `key: value` pair whose value has been closed since the last call. Nested
+    objects and arrays are returned whole once their top-level member closes.
+    Each character is scanned exactly once.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.done = False
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._member_start = None
+
+    def feed(self, chunk: str) -> list:
+        """
+        Consume the next chunk of the streamed JSON text.
+
+        Args:
+            chunk (str): The next piece of the response.
+
+        Returns:
+            list: (key, value) tuples for the members completed by this chunk.
+        """
+        fields = []
+        self.buffer += chunk
+        buffer = self.buffer
+        for idx in range(self._position, len(buffer)):
+            char = buffer[idx]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._member_start = idx + 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    fields.extend(self._close_member(idx))
+                    self.done = True
+            elif char == "," and self._depth == 1:
+                fields.extend(self._close_member(idx))
+                self._member_start = idx + 1
+        self._position = len(buffer)
+        return fields
+
+    def _close_member(self, end: int) -> list:
+        member = self.buffer[self._member_start:end]
+        if not member.strip():
+            return []
+        return list(json.loads("{" + member + "}").items())
+
+    def result(self) -> dict:
+        """
+        Parse the complete response.
+
+        Returns:
+            dict: The fully parsed JSON object.
+        """
+        return json.loads(self.buffer)
@@ -0,0 +1,115 @@
+import os
+import json
+import hashlib
+import threading
+from types import MappingProxyType
+from typing import NamedTuple
+from character_creator.config import CHARACTER_EXAMPLES_FILE
+
+
+class TemplateSchemaError(ValueError):
+    """
+    Raised when the character examples file doesn't match the sheet schema.
+    """
+
+
+class CharacterTemplates(NamedTuple):
+    """
+    A parsed, validated snapshot of the character examples file.
+
+    `examples[0]` is the sheet template describing every field; the rest are
+    complete example characters. Every example is a read-only mapping.
+    """
+    examples: tuple
+    keys: tuple
+    digest: str
+    mtime_ns: int
+
+
+def freeze(value):
+    """
+    Make a parsed JSON value read-only.
+
+    Args:
+        value: The parsed JSON value.
+
+    Returns:
+        The value with dicts as read-only mappings and lists as tuples.
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def parse_character_templates(raw: bytes, mtime_ns: int = 0) -> CharacterTemplates:
+    """
+    Parse and validate the character examples file.
+
+    Args:
+        raw (bytes): The contents of the examples file.
+        mtime_ns (int, optional): The file's modification time. Defaults to 0.
+
+    Returns:
+        CharacterTemplates: The validated snapshot.
+
+    Raises:
+        TemplateSchemaError: If the examples don't share the template's keys or have non-string values.
+    """
+    examples = json.loads(raw)
+    if not isinstance(examples, list) or not examples or not all(isinstance(example, dict) for example in examples):
+        raise TemplateSchemaError("Character examples must be a non-empty list of objects")
+
+    keys = tuple(examples[0])
+    for idx, example in enumerate(examples):
+        if set(example) != set(keys):
+            missing = sorted(set(keys) - set(example))
+            extra = sorted(set(example) - set(keys))
+            raise TemplateSchemaError(f"Character example {idx} doesn't match the template: missing {missing}, extra {extra}")
+        for key, value in example.items():
+            if not isinstance(value, str):
+                raise TemplateSchemaError(f"Character example {idx} has a non-string value for {key}")
+
+    return CharacterTemplates(
+        examples=tuple(freeze(example) for example in examples),
+        keys=keys,
+        digest=hashlib.sha256(raw).hexdigest(),
+        mtime_ns=mtime_ns
+    )
+
+
+class TemplateRegistry:
+    """
+    Process-wide cache of the character examples file.
+
+    The file is parsed and validated once, then only re-read when its
+    modification time or size changes. Callers get immutable views, so the
+    shared snapshot can't be changed out from under other sessions.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._templates = None
+        self._stat = None
+        self._lock = threading.Lock()
+
+    def get(self) -> CharacterTemplates:
+        """
+        Get the current templates, reloading them if the file changed.
+
+        Returns:
+            CharacterTemplates: The validated snapshot.
+        """
+        stat = os.stat(self.file_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature != self._stat:
+            with self._lock:
+                if signature != self._stat:
+                    with open(self.file_path, "rb") as f:
+                        self._templates = parse_character_templates(f.read(), stat.st_mtime_ns)
+                    self._stat = signature
+        return self._templates
+
+
+template_registry = TemplateRegistry(CHARACTER_EXAMPLES_FILE)
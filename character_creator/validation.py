@@ -0,0 +1,212 @@
+from typing import NamedTuple
+
+# Experience points needed to reach each level, from level 1 to MAX_LEVEL
+EXPERIENCE_THRESHOLDS = (
+    0, 300, 900, 2700, 6500, 14000, 23000, 34000, 48000, 64000,
+    85000, 100000, 120000, 140000, 165000, 195000, 225000, 265000, 305000, 355000
+)
+MAX_LEVEL = len(EXPERIENCE_THRESHOLDS)
+
+# Proficiency bonus at each level, from level 1 to MAX_LEVEL
+PROFICIENCY_BONUSES = (2,) * 4 + (3,) * 4 + (4,) * 4 + (5,) * 4 + (6,) * 4
+
+ESSENTIAL_KEYS = (
+    "name", "level", "class", "strength", "dexterity", "constitution",
+    "intelligence", "wisdom", "charisma", "proficiency_bonus",
+    "armor_class", "hit_points", "speed"
+)
+ABILITY_KEYS = ("strength", "dexterity", "constitution", "intelligence", "wisdom", "charisma")
+SPELL_STAT_KEYS = ("spell_save_dc", "spellcasting_ability", "spell_attack_bonus")
+SPELL_LEVELS = range(1, 10)
+LOWEST_NINTH_LEVEL_SPELLCASTER = 17
+
+
+def calculate_modifier(score: int) -> int:
+    """
+    Calculate the ability modifier based on the ability score.
+
+    Args:
+        score (int): The ability score.
+
+    Returns:
+        int: The ability modifier.
+    """
+    return (score - 10) // 2
+
+
+def parse_int(value, ignore: str = None):
+    """
+    Parse a sheet value as an integer.
+
+    Args:
+        value: The raw value, usually a string.
+        ignore (str, optional): A character to remove from the value's text first, e.g. "," or "+". Defaults to None.
+
+    Returns:
+        int: The integer, or None if the value isn't one.
+    """
+    if ignore is not None:
+        value = str(value).replace(ignore, "")
+    try:
+        return int(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def experience_range(level: int) -> tuple:
+    """
+    Get the experience points a character of the given level can have.
+
+    Args:
+        level (int): The character level.
+
+    Returns:
+        Tuple[int, int]: The exclusive lower and inclusive upper bound (None above MAX_LEVEL),
+                         or None if the level has no range.
+    """
+    if level < 1:
+        return None
+    if level >= MAX_LEVEL:
+        return EXPERIENCE_THRESHOLDS[-1], None
+    return EXPERIENCE_THRESHOLDS[level - 1], EXPERIENCE_THRESHOLDS[level]
+
+
+def expected_proficiency(level: int) -> int:
+    """
+    Get the proficiency bonus for a character level.
+
+    Args:
+        level (int): The character level; out-of-range levels use the nearest valid one.
+
+    Returns:
+        int: The proficiency bonus.
+    """
+    return PROFICIENCY_BONUSES[min(max(level, 1), MAX_LEVEL) - 1]
+
+
+class FieldError(NamedTuple):
+    """
+    A character sheet field that failed validation.
+
+    `code` is one of "invalid_level", "invalid_experience_points", "missing_key",
+    "invalid_score", "invalid_armor_class" or "empty_value".
+    """
+    key: str
+    message: str
+    code: str
+
+
+def check_character_sheet(character: dict) -> tuple:
+    """
+    Validate and fix the character sheet, collecting every offending field.
+
+    Fields that can be derived from the rest of the sheet (experience points,
+    proficiency bonus, out-of-level spells, blank spell stats) are fixed in
+    place. Everything else that is missing or invalid is reported so only
+    those fields need to be regenerated.
+
+    `character_creator.audit.check_character_frame` applies the same rules to
+    a whole table of sheets at once; keep the two in step.
+
+    Args:
+        character (dict): The character data.
+
+    Returns:
+        Tuple[list, dict]: A list of FieldError for the offending fields, and the character data.
+    """
+    errors = []
+
+    # Validate level
+    level = parse_int(character.get('level'))
+    if level is None:
+        errors.append(FieldError('level', f"Character level is not a valid integer: {character.get('level')}", "invalid_level"))
+    elif level < 1:
+        character['level'] = "1"
+
+    # Check if any X_level_spell keys have an empty value
+    for key in character.keys():
+        if key.endswith("_level_spells"):
+            if character[key] == "":
+                character[key] = "N/A"
+
+    # Check if spell stats are empty
+    for key in SPELL_STAT_KEYS:
+        if character.get(key, "") == "":
+            character[key] = "N/A"
+
+    if level is not None:
+        # Verify experience points
+        experience_points = parse_int(character["experience_points"], ",") if "experience_points" in character else None
+        if experience_points is None:
+            errors.append(FieldError('experience_points', f"Experience points are not a valid integer: {character.get('experience_points')}", "invalid_experience_points"))
+        else:
+            bounds = experience_range(level)
+            if bounds is not None:
+                low, high = bounds
+                if experience_points <= low or (high is not None and experience_points > high):
+                    character["experience_points"] = low
+
+        # Clear all spells above the character's level
+        for spell_level in SPELL_LEVELS:
+            spell_key = f"{spell_level}_level_spells"
+            if spell_key in character and level < spell_level:
+                character[spell_key] = "N/A"
+
+        if level < LOWEST_NINTH_LEVEL_SPELLCASTER:
+            spell_key = "9_level_spells"
+            if character.get(spell_key) != "N/A":
+                character[spell_key] = "N/A"
+
+    # 1. Check for missing essential keys
+    for key in ESSENTIAL_KEYS:
+        if key not in character:
+            errors.append(FieldError(key, f"Missing essential key: {key}", "missing_key"))
+   
+    # 2. Ensure core stats are between 1 and 30
+    for key in ABILITY_KEYS:
+        if key not in character:
+            continue
+        score = parse_int(character[key])
+        if score is None or not 1 <= score <= 30:
+            errors.append(FieldError(key, f"Invalid value for {key}: {character[key]}", "invalid_score"))
+    
+    # 3. Ensure proficiency bonus is consistent with the character's level
+    if level is not None:
+        expected = expected_proficiency(level)
+        proficiency = parse_int(character['proficiency_bonus'], "+") if 'proficiency_bonus' in character else None
+        if proficiency != expected:
+            character['proficiency_bonus'] = f"+{expected}"
+            errors = [error for error in errors if error.key != 'proficiency_bonus']
+
+    # 4. Check Armor Class (basic check)
+    if 'armor_class' in character:
+        armor_class = parse_int(character['armor_class'])
+        if armor_class is None or not 10 <= armor_class <= 30:
+            errors.append(FieldError('armor_class', f"Invalid Armor Class: {character['armor_class']}", "invalid_armor_class"))
+
+    # Flag any fields that have empty values
+    invalid_keys = {error.key for error in errors}
+    for key in character.keys():
+        if character[key] == "" and key not in invalid_keys:
+            errors.append(FieldError(key, f"Empty value for {key}", "empty_value"))
+
+    return errors, character
+
+
+def validate_and_fix_character_sheet(character: dict) -> tuple:
+    """
+    Validate and fix the character sheet.
+
+    Args:
+        character (dict): The character data.
+
+    Returns:
+        Tuple[bool, str, dict]: A tuple containing the validation status, error message, and character data.
+    """
+    errors, character = check_character_sheet(character)
+    if errors:
+        return False, errors[0].message, character
+
+    # If all checks pass
+    return True, "Character sheet is valid!", character
+
@@ -0,0 +1,162 @@
+"""
+A pool of pre-generated random characters.
+
+Fully random characters are interchangeable, so instead of running the
+whole pipeline when someone submits an empty sheet, one is handed out from
+a pool generated ahead of time. The pool refills in the background whenever
+it drops to its low watermark, back up to its high watermark.
+
+Pool characters are only added to the gallery index when they're handed
+out, so the gallery never lists a character nobody received.
+"""
+import random
+import threading
+from collections import deque, Counter
+from concurrent.futures import ThreadPoolExecutor
+from character_creator.config import (
+    WARM_POOL_SIZE, WARM_POOL_LOW_WATERMARK, WARM_POOL_WORKERS, WARM_POOL_STRATIFY, WARM_POOL_RETRY_SECONDS,
+    WARM_POOL_MAX_RETRY_SECONDS, CLASS_LIST, RACE_LIST
+)
+from character_creator.metrics import metrics
+from character_creator.pipeline import GenerationResult, default_character, generate_character, index_character
+
+STRATA_OPTIONS = {"class": CLASS_LIST, "race": RACE_LIST}
+
+
+def is_empty_character(character: dict) -> bool:
+    """
+    Check whether nothing on a character sheet has been filled in.
+
+    Args:
+        character (dict): The character sheet.
+
+    Returns:
+        bool: True if every value is blank.
+    """
+    return all(str(value).strip() == "" for value in character.values())
+
+
+class WarmPool:
+    """
+    Keeps fully generated random characters ready to hand out.
+
+    With `stratify` set, each new character gets the class (and/or race)
+    least represented in the pool, so what's handed out stays varied.
+    Thread-safe; refills run on the pool's own workers so they never take
+    capacity from user-submitted jobs. A failed refill is retried with
+    exponential backoff, so the pool recovers from an outage on its own.
+    """
+
+    def __init__(self, high_watermark: int = WARM_POOL_SIZE, low_watermark: int = WARM_POOL_LOW_WATERMARK,
+                 max_workers: int = WARM_POOL_WORKERS, stratify: list = WARM_POOL_STRATIFY, num_portraits: int = 1):
+        self.high_watermark = high_watermark
+        self.low_watermark = min(low_watermark, high_watermark)
+        self.stratify = [key for key in stratify if key in STRATA_OPTIONS]
+        self.num_portraits = num_portraits
+        self._ready = deque()
+        self._pending = []
+        self._in_flight = 0
+        self._failures = 0
+        self._started = False
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="warm-pool") if high_watermark else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.high_watermark > 0
+
+    def start(self) -> None:
+        """
+        Fill the pool up to its high watermark the first time it's called.
+
+        Safe to call on every rerun; after the first fill the pool only
+        refills as characters are taken.
+        """
+        if not self.enabled or self._started:
+            return
+        self._started = True
+        self._refill(force=True)
+
+    def take(self, num_portraits: int = 1) -> GenerationResult:
+        """
+        Hand out a pre-generated random character.
+
+        Args:
+            num_portraits (int, optional): How many portraits the caller wants. Defaults to 1.
+
+        Returns:
+            GenerationResult: The character, or None if the pool can't serve this request.
+        """
+        if not self.enabled or num_portraits != self.num_portraits:
+            return None
+        with self._lock:
+            result = self._ready.popleft() if self._ready else None
+        metrics.increment("warm_pool_requests_total", result="miss" if result is None else "hit")
+        self._refill()
+        if result is not None:
+            try:
+                index_character(result)
+            except Exception as e:
+                result.errors.append(f"Error indexing character: {str(e)}")
+        return result
+
+    def stats(self) -> dict:
+        """
+        Report the pool's state.
+
+        Returns:
+            dict: Ready and in-flight counts, and the watermarks.
+        """
+        with self._lock:
+            return {
+                "ready": len(self._ready),
+                "in_flight": self._in_flight,
+                "low_watermark": self.low_watermark,
+                "high_watermark": self.high_watermark,
+            }
+
+    def _refill(self, force: bool = False) -> None:
+        with self._lock:
+            available = len(self._ready) + self._in_flight
+            if available > self.low_watermark and not force:
+                return
+            seeds = [self._next_seed() for _ in range(self.high_watermark - available)]
+            self._in_flight += len(seeds)
+        for seed in seeds:
+            self._executor.submit(self._generate, seed)
+
+    def _next_seed(self) -> dict:
+        # Called with the lock held; pending seeds count towards the strata too
+        character = default_character()
+        for key in self.stratify:
+            counts = Counter(result.character.get(key) for result in self._ready)
+            counts.update(seed[key] for seed in self._pending)
+            fewest = min(counts[option] for option in STRATA_OPTIONS[key])
+            character[key] = random.choice([option for option in STRATA_OPTIONS[key] if counts[option] == fewest])
+        self._pending.append(character)
+        return character
+
+    def _generate(self, seed: dict) -> None:
+        try:
+            result = generate_character(dict(seed), num_portraits=self.num_portraits, use_cache=False, index=False)
+        except Exception as e:
+            print(f"Error generating warm pool character: {e}")
+            result = None
+        # Only hand out characters that came through the pipeline cleanly
+        succeeded = result is not None and not result.errors
+        with self._lock:
+            self._in_flight -= 1
+            self._pending.remove(seed)
+            if succeeded:
+                self._ready.append(result)
+                self._failures = 0
+                return
+            self._failures += 1
+            delay = min(WARM_POOL_RETRY_SECONDS * 2 ** (self._failures - 1), WARM_POOL_MAX_RETRY_SECONDS)
+        print(f"Retrying warm pool refill in {delay}s")
+        retry = threading.Timer(delay, self._refill, kwargs={"force": True})
+        retry.daemon = True
+        retry.start()
+
+
+warm_pool = WarmPool()
@@ -0,0 +1,114 @@
+import hmac
+import pandas as pd
+import streamlit as st
+from character_creator.metrics import metrics
+from character_creator.config import JOB_WORKERS, ADMIN_TOKEN
+from character_creator.pipeline import response_cache
+from character_creator.jobs import job_store
+from character_creator.warm_pool import warm_pool
+from character_creator.ratelimit import chat_limiter, image_limiter
+from character_creator.hedging import chat_hedge_policy
+
+st.set_page_config(page_title="Metrics", page_icon="📈")
+st.sidebar.title("Metrics 📈")
+st.sidebar.write("Where the generation time goes, for this server process.")
+
+st.write("# Pipeline Metrics 📈")
+
+def is_admin() -> bool:
+    """
+    Checks the session for the admin token, taken from the page's `token` query parameter.
+
+    Returns:
+        bool: Whether the session may see the metrics.
+    """
+    if not ADMIN_TOKEN:
+        return False
+    token = st.query_params.get("token")
+    if token is not None and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        # Remembered so the page keeps working after the query parameter is dropped
+        st.session_state.admin = True
+    return st.session_state.get("admin", False)
+
+def stage_table() -> pd.DataFrame:
+    """
+    Builds a table of per-stage latency percentiles in milliseconds.
+
+    Returns:
+        pd.DataFrame: One row per pipeline stage.
+    """
+    stages = pd.DataFrame(metrics.stage_summary(), columns=["stage", "count", "errors", "mean", "p50", "p95", "p99"])
+    for column in ["mean", "p50", "p95", "p99"]:
+        stages[column] = (stages[column] * 1000).round(1)
+    return stages.rename(columns={column: f"{column} (ms)" for column in ["mean", "p50", "p95", "p99"]}).set_index("stage")
+
+def main():
+    """
+    Main function for the metrics page.
+    """
+    if st.button("Refresh"):
+        st.rerun()
+
+    sheets = {outcome: metrics.counter_value("character_sheets_total", outcome=outcome) for outcome in ["valid", "repaired", "invalid"]}
+    completed = sum(sheets.values())
+    cache_stats = response_cache.stats()
+
+    cols = st.columns(4)
+    cols[0].metric("Character sheets", int(completed))
+    cols[1].metric("Needed repair", f"{(sheets['repaired'] + sheets['invalid']) / completed:.0%}" if completed else "-")
+    cols[2].metric("Repair attempts", int(metrics.counter_value("repair_attempts_total")))
+    cols[3].metric("Response cache hit rate", f"{cache_stats['hit_rate']:.0%}")
+
+    jobs = job_store.counts()
+    st.caption(f"Generation jobs: {jobs['running']} running and {jobs['queued']} queued on {JOB_WORKERS} workers.")
+    if warm_pool.enabled:
+        pool = warm_pool.stats()
+        hits = metrics.counter_value("warm_pool_requests_total", result="hit")
+        misses = metrics.counter_value("warm_pool_requests_total", result="miss")
+        st.caption(
+            f"Warm pool: {pool['ready']} ready and {pool['in_flight']} generating "
+            f"(watermarks {pool['low_watermark']}/{pool['high_watermark']}), {int(hits)} served and {int(misses)} misses."
+        )
+
+    for limiter in [chat_limiter, image_limiter]:
+        limits = limiter.stats()
+        throttled = metrics.counter_value("rate_limit_retries_total", limiter=limiter.name, reason="throttled")
+        paused = f", paused for {limits['paused_seconds']:.0f}s" if limits["paused_seconds"] else ""
+        st.caption(
+            f"OpenAI {limiter.name} calls: {limits['active']} in flight (limit {limits['concurrency_limit']}) "
+            f"and {limits['queued']} queued, {int(throttled)} rate limited{paused}."
+        )
+
+    if chat_hedge_policy.enabled:
+        hedging = chat_hedge_policy.stats()
+        won = {winner: int(metrics.counter_value("hedged_requests_total", winner=winner)) for winner in ["primary", "hedge", "none"]}
+        delay = f"after {hedging['delay']:.1f}s" if hedging["delay"] is not None else "once enough requests have been timed"
+        st.caption(
+            f"Hedged chat requests: {hedging['ratio']:.0%} of recent requests hedged ({delay}), "
+            f"won by the hedge {won['hedge']} times and by the first request {won['primary']} times."
+        )
+
+    st.write("### Stage latency")
+    st.dataframe(stage_table(), use_container_width=True)
+
+    st.write("### Token usage")
+    tokens = pd.DataFrame(
+        [
+            {"stage": stage, "prompt": metrics.counter_value("openai_tokens_total", stage=stage, kind="prompt"),
+             "completion": metrics.counter_value("openai_tokens_total", stage=stage, kind="completion")}
+            for stage in ["chat_completion", "repair"]
+        ]
+    ).set_index("stage")
+    st.dataframe(tokens, use_container_width=True)
+
+    with st.expander("Prometheus export"):
+        exported = metrics.export_prometheus()
+        st.download_button("Download", exported, file_name="metrics.txt", mime="text/plain")
+        st.code(exported, language="text")
+
+
+if __name__ == "__main__":
+    if not is_admin():
+        st.error("This page is only available to administrators.")
+        st.stop()
+    main()
@@ -0,0 +1,94 @@
+import time
+import streamlit as st
+from character_creator.config import GALLERY_PAGE_SIZE
+from character_creator.index import character_index, CharacterRecord
+
+st.set_page_config(page_title="Character Gallery", page_icon="🖼️")
+st.sidebar.title("Character Gallery 🖼️")
+st.sidebar.write("Every character the creator has made.")
+
+st.write("# Character Gallery 🖼️")
+
+def gallery_filters() -> dict:
+    """
+    Renders the filter widgets.
+
+    Returns:
+        dict: The chosen filters, as keyword arguments for the index query.
+    """
+    cols = st.columns([2, 1, 1])
+    name = cols[0].text_input("Name")
+    character_class = cols[1].selectbox("Class", [""] + character_index.options("class"), format_func=lambda option: option or "Any")
+    race = cols[2].selectbox("Race", [""] + character_index.options("race"), format_func=lambda option: option or "Any")
+    min_level, max_level = st.slider("Level", 1, 20, (1, 20))
+    my_characters = st.session_state.get("my_characters", [])
+    only_mine = st.toggle("Only characters I made this session", disabled=not my_characters)
+    return {
+        "name": name.strip() or None,
+        "character_class": character_class or None,
+        "race": race or None,
+        # Leave the ends of the slider open so out-of-range levels still show up
+        "min_level": min_level if min_level > 1 else None,
+        "max_level": max_level if max_level < 20 else None,
+        "ids": my_characters if only_mine else None,
+    }
+
+def render_card(record: CharacterRecord) -> None:
+    """
+    Renders one character in the gallery grid.
+
+    Args:
+        record (CharacterRecord): The character to show.
+    """
+    portrait_url = record.portrait_urls[0] if record.portrait_urls else None
+    if portrait_url:
+        # The display-sized copy, falling back to the full PNG for characters made before there were any
+        display_url = record.display_urls[0] if record.display_urls else None
+        st.image(display_url or portrait_url, use_container_width=True)
+    st.markdown(f"**{record.name}**")
+    st.caption(" ".join(str(part) for part in [f"Level {record.level}" if record.level else "", record.race, record.character_class] if part))
+    # Markdown links break on the spaces in character names
+    links = [
+        f"[{label}]({url.replace(' ', '%20')})"
+        for label, url in [("Portrait", portrait_url), ("PDF", record.pdf_url), ("JSON", record.sheet_url)] if url
+    ]
+    st.markdown(" · ".join(links))
+
+def main():
+    """
+    Main function for the gallery page.
+    """
+    filters = gallery_filters()
+    # Start from the first page whenever the filters change
+    if st.session_state.get("gallery_filters") != filters:
+        st.session_state.gallery_filters = filters
+        st.session_state.gallery_cursors = [None]
+    cursors = st.session_state.gallery_cursors
+
+    start = time.perf_counter()
+    page = character_index.query(**filters, limit=GALLERY_PAGE_SIZE, cursor=cursors[-1])
+    total = character_index.count(**filters)
+    elapsed = time.perf_counter() - start
+
+    st.caption(f"{total} character{'' if total == 1 else 's'}, page {len(cursors)} of {max(1, -(-total // GALLERY_PAGE_SIZE))} (found in {elapsed * 1000:.1f} ms)")
+    if not page.records:
+        st.info("No characters found. Create one on the D&D Character Creator page!")
+        return
+
+    for row_start in range(0, len(page.records), 3):
+        cols = st.columns(3)
+        for col, record in zip(cols, page.records[row_start:row_start + 3]):
+            with col:
+                render_card(record)
+
+    cols = st.columns(2)
+    if cols[0].button("Previous page", disabled=len(cursors) == 1, use_container_width=True):
+        cursors.pop()
+        st.rerun()
+    if cols[1].button("Next page", disabled=page.next_cursor is None, use_container_width=True):
+        cursors.append(page.next_cursor)
+        st.rerun()
+
+
+if __name__ == "__main__":
+    main()